@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Order book message-apply benchmark
+
+Applies a synthetic stream of GDAX level-3 messages (open, change, match,
+done) to an ``OrderBasedBook`` using ``Decimal`` prices and sizes and using
+fixed-point integer units, and reports messages applied per second.
+
+Usage:
+    ./bench_book.py [options]
+
+Options:
+    -n --messages <count>   Number of messages to apply [default: 200000].
+    -p --publish <every>    Make a book every N messages [default: 50].
+    -d --depth <depth>      Depth of published books [default: 10].
+    -s --seed <seed>        Random seed [default: 7].
+"""
+
+import functools
+import random
+import time
+
+import docopt
+
+from convex.common import Side, make_price, make_qty
+from convex.common.price import PRICE_UNITS, QTY_UNITS
+from convex.market_data import OrderBasedBook
+
+
+def make_messages(count, seed):
+    """Generate ``count`` decoded GDAX messages around a mid of 4000."""
+    rng = random.Random(seed)
+    resting = {}  # order_id -> (side, price, size)
+    messages = []
+    next_id = 0
+    while len(messages) < count:
+        roll = rng.random()
+        if roll < 0.5 or len(resting) < 100:
+            side = rng.choice(('buy', 'sell'))
+            offset = rng.randint(1, 500)
+            cents = 400000 - offset if side == 'buy' else 400000 + offset
+            price = '{}.{:02d}'.format(cents // 100, cents % 100)
+            size = '{:.8f}'.format(rng.randint(1, 10 ** 9) / 1e8)
+            order_id = 'order-{}'.format(next_id)
+            next_id += 1
+            resting[order_id] = side, price, size
+            messages.append({'type': 'open', 'side': side, 'price': price,
+                             'order_id': order_id, 'remaining_size': size})
+            continue
+
+        order_id = rng.choice(list(resting)) if roll < 0.6 \
+            else next(iter(resting))
+        side, price, size = resting[order_id]
+        if roll < 0.7:
+            new_size = '{:.8f}'.format(float(size) / 2)
+            resting[order_id] = side, price, new_size
+            messages.append({'type': 'change', 'side': side, 'price': price,
+                             'order_id': order_id, 'new_size': new_size})
+        elif roll < 0.85:
+            del resting[order_id]
+            messages.append({'type': 'match', 'side': side, 'price': price,
+                             'maker_order_id': order_id, 'size': size})
+        else:
+            del resting[order_id]
+            messages.append({'type': 'done', 'side': side, 'price': price,
+                             'order_id': order_id})
+    return messages
+
+
+def apply_messages(book, messages, parse_price, parse_qty, publish, depth):
+    """Apply messages the way ``gdax.MDGateway`` handlers do."""
+    for i, m in enumerate(messages):
+        kind = m['type']
+        if kind == 'open':
+            book.add_order(side=Side.parse(m['side']),
+                           order_id=m['order_id'],
+                           price=parse_price(m['price']),
+                           qty=parse_qty(m['remaining_size']))
+        elif kind == 'change':
+            book.change_order(side=Side.parse(m['side']),
+                              order_id=m['order_id'],
+                              price=parse_price(m['price']),
+                              new_qty=parse_qty(m['new_size']))
+        elif kind == 'match':
+            book.match_order(side=Side.parse(m['side']),
+                             order_id=m['maker_order_id'],
+                             price=parse_price(m['price']),
+                             trade_qty=parse_qty(m['size']))
+        else:
+            book.remove_order(side=Side.parse(m['side']),
+                              order_id=m['order_id'],
+                              price=parse_price(m['price']))
+        if i % publish == 0:
+            book.make_book(i, depth=depth)
+
+
+def run(name, messages, publish, depth, make_book, parse_price, parse_qty):
+    book = make_book()
+    t0 = time.perf_counter()
+    apply_messages(book, messages, parse_price, parse_qty, publish, depth)
+    elapsed = time.perf_counter() - t0
+    print('{:<9} {:>10.0f} msgs/s  ({:.3f}s, {} resting orders)'.format(
+        name, len(messages) / elapsed, elapsed, book.order_count))
+    return book
+
+
+def main(args):
+    count = int(args['--messages'])
+    publish = max(int(args['--publish']), 1)
+    depth = int(args['--depth'])
+    messages = make_messages(count, int(args['--seed']))
+
+    decimal_book = run('decimal', messages, publish, depth,
+                       OrderBasedBook, make_price, make_qty)
+    fixed_book = run('fixed', messages, publish, depth,
+                     lambda: OrderBasedBook(price_units=PRICE_UNITS,
+                                            qty_units=QTY_UNITS),
+                     PRICE_UNITS.to_units, QTY_UNITS.to_units)
+    run('fixed+lru', messages, publish, depth,
+        lambda: OrderBasedBook(price_units=PRICE_UNITS, qty_units=QTY_UNITS),
+        functools.lru_cache(maxsize=4096)(PRICE_UNITS.to_units),
+        QTY_UNITS.to_units)
+
+    # Both representations must publish the same book.
+    def levels(book):
+        b = book.make_book(0, depth=depth)
+        return [(lvl.price, lvl.qty) for lvl in b.bids + b.asks]
+    assert levels(decimal_book) == levels(fixed_book)
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Update serialization benchmark
+
+Compares ``Update.dump`` with ``json`` and ``msgpack``, the format used by the
+recorder, against the binary ``market_data.codec`` encoding, reporting
+encode/decode time per update and encoded size. Decoding ``Update.dump``
+output only yields dicts of strings; ``dump+json book`` also turns them back
+into a ``Book`` of ``Level`` objects, like the codec does.
+
+Usage:
+    ./bench_codec.py [options]
+
+Options:
+    -n --updates <count>    Number of updates [default: 20000].
+    -d --depth <depth>      Levels per side [default: 10].
+    -t --trades <count>     Trades per update [default: 1].
+    -r --repeat <count>     Number of timed runs [default: 3].
+"""
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import datetime as dt
+from decimal import Decimal
+import random
+import time
+import uuid
+
+import docopt
+import msgpack
+
+from convex.common import Side
+from convex.common.instrument import make_btc_usd
+from convex.exchanges import ExchangeID
+from convex.market_data import Book, Level, Status, Trade, Update
+from convex.market_data.codec import decode_update, encode_update
+
+INSTRUMENT = make_btc_usd(ExchangeID.GDAX)
+
+
+def make_updates(count, depth, n_trades, seed=7):
+    rng = random.Random(seed)
+    now = dt.datetime.now(dt.timezone.utc)
+
+    def qty():
+        return Decimal('{:.8f}'.format(rng.randint(1, 10 ** 9) / 1e8))
+
+    updates = []
+    mid = 400000
+    for seq in range(count):
+        mid += rng.randint(-3, 3)
+        bids = [Level(Decimal(mid - i - 1) / 100, qty(), rng.randint(1, 9))
+                for i in range(depth)]
+        asks = [Level(Decimal(mid + i + 1) / 100, qty(), rng.randint(1, 9))
+                for i in range(depth)]
+        trades = [Trade(Side.BID, asks[0].price, qty(), seq,
+                        str(uuid.uuid4()), str(uuid.uuid4()), now)
+                  for _ in range(n_trades)]
+        updates.append(Update(INSTRUMENT, Book(seq, bids, asks),
+                              trades=trades, status=Status.OK,
+                              timestamp=now))
+    return updates
+
+
+def load_book(data):
+    """Rebuild ``Book`` from ``Update.dump`` output."""
+    book = data['book']
+
+    def levels(side):
+        return [Level(Decimal(lvl['price']), Decimal(lvl['qty']),
+                      lvl['orders'])
+                for lvl in side]
+    return Book(book['sequence'], levels(book['bids']), levels(book['asks']))
+
+
+def timed(func, items, repeat):
+    """Return outputs of ``func`` for items and best time of ``repeat``."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [func(item) for item in items]
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main(args):
+    count = int(args['--updates'])
+    depth = int(args['--depth'])
+    updates = make_updates(count, depth, int(args['--trades']))
+    repeat = int(args['--repeat'])
+
+    cases = (
+        ('dump+json',
+         lambda u: json.dumps(u.dump(depth=depth)).encode(),
+         json.loads),
+        ('dump+json book',
+         lambda u: json.dumps(u.dump(depth=depth)).encode(),
+         lambda b: load_book(json.loads(b))),
+        ('dump+msgpack',
+         lambda u: msgpack.packb(u.dump(depth=depth), use_bin_type=True),
+         lambda b: msgpack.unpackb(b, raw=False)),
+        ('codec', lambda u: encode_update(u, depth=depth), decode_update),
+        ('codec lazy', lambda u: encode_update(u, depth=depth),
+         lambda b: decode_update(b, lazy=True)),
+    )
+    print('{} updates, {} levels per side'.format(count, depth))
+    print('{:<14}{:>12}{:>12}{:>10}'.format(
+        'format', 'encode us', 'decode us', 'bytes'))
+    for name, encode, decode in cases:
+        encoded, enc_time = timed(encode, updates, repeat)
+        _, dec_time = timed(decode, encoded, repeat)
+        size = sum(map(len, encoded)) / count
+        print('{:<14}{:>12.1f}{:>12.1f}{:>10.0f}'.format(
+            name, enc_time / count * 1e6, dec_time / count * 1e6, size))
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
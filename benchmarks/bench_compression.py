@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Recorder compression benchmark
+
+Writes recorder JSON lines of synthetic updates compressed as they are
+written with ``CompressedWriter``, flushing every ``--flush`` updates, and
+compares it with writing the plain file and gzipping it afterwards at level
+9, as the recorder used to on rollover. Reports compression throughput in
+MB of input per second, total time including file I/O, and output size.
+
+Usage:
+    ./bench_compression.py [options]
+
+Options:
+    -n --updates <count>    Number of updates [default: 20000].
+    -d --depth <depth>      Levels per side [default: 10].
+    -f --flush <updates>    Updates between flush points [default: 1000].
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import docopt
+
+from convex.common.utils.compression import (
+    CompressedWriter, DEFAULT_LEVELS, EXTENSIONS, zstandard)
+
+from bench_codec import make_updates
+
+
+def gzip_after(lines, path):
+    t0 = time.perf_counter()
+    with open(path, 'wb') as f:
+        for line in lines:
+            f.write(line)
+    t1 = time.perf_counter()
+    with open(path, 'rb') as f_in:
+        with gzip.open(path + '.gz', 'wb', compresslevel=9) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    t2 = time.perf_counter()
+    return t2 - t1, t2 - t0, os.path.getsize(path + '.gz')
+
+
+def streaming(lines, path, codec, flush_every):
+    t0 = time.perf_counter()
+    with CompressedWriter(path, codec) as writer:
+        for i, line in enumerate(lines, 1):
+            writer.write(line)
+            if i % flush_every == 0:
+                writer.flush()
+    total = time.perf_counter() - t0
+    return writer.bytes_in / writer.throughput, total, writer.bytes_out
+
+
+def main(args):
+    depth = int(args['--depth'])
+    updates = make_updates(int(args['--updates']), depth, 1)
+    lines = [(json.dumps(u.dump(depth=depth)) + '\n').encode()
+             for u in updates]
+    size = sum(map(len, lines))
+    flush_every = int(args['--flush'])
+
+    codecs = ['gzip', 'lzma'] + (['zstd'] if zstandard is not None else [])
+    print('{} updates, {:.1f} MB of JSON'.format(len(lines), size / 1e6))
+    print('{:<20}{:>14}{:>12}{:>12}'.format(
+        'method', 'compress MB/s', 'total s', 'MB'))
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [('gzip -9 at rollover',
+                    gzip_after(lines, os.path.join(tmp, 'plain.json')))]
+        for codec in codecs:
+            path = os.path.join(tmp, 'stream.json' + EXTENSIONS[codec])
+            name = 'stream {} -{}'.format(codec, DEFAULT_LEVELS[codec])
+            results.append((name, streaming(lines, path, codec,
+                                            flush_every)))
+        for name, (seconds, total, out) in results:
+            print('{:<20}{:>14.1f}{:>12.2f}{:>12.2f}'.format(
+                name, size / seconds / 1e6, total, out / 1e6))
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
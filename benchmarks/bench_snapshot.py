@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""GDAX level-3 snapshot load benchmark
+
+Compares decoding a snapshot and building an ``OrderBasedBook`` one order
+at a time against ``gdax.SnapshotLoader`` on the raw JSON text, and reports
+the longest stretch the event loop is blocked by ``load_async``.
+
+A recorded snapshot can be saved with:
+    curl 'https://api.gdax.com/products/BTC-USD/book?level=3' > snapshot.json
+
+Usage:
+    ./bench_snapshot.py [options] [<snapshot>]
+
+Options:
+    -n --orders <count>     Orders per side for a synthetic snapshot
+                            [default: 20000].
+    -c --chunk <size>       Orders per chunk [default: 5000].
+    -r --repeat <count>     Number of timed runs [default: 3].
+"""
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import asyncio
+import random
+import time
+
+import docopt
+
+from convex.common import Side, make_price, make_qty
+from convex.exchanges.gdax.snapshot import SnapshotLoader
+from convex.market_data import OrderBasedBook
+
+
+def make_snapshot(orders_per_side, seed=7):
+    """Synthetic snapshot with a few orders per level around 4000."""
+    rng = random.Random(seed)
+
+    def side(sign):
+        orders, cents = [], 400000
+        while len(orders) < orders_per_side:
+            cents += sign * rng.randint(1, 3)
+            price = '{}.{:02d}'.format(cents // 100, cents % 100)
+            for _ in range(rng.randint(1, 6)):
+                size = '{:.8f}'.format(rng.randint(1, 10 ** 9) / 1e8)
+                orders.append([price, size, 'order-{}'.format(rng.random())])
+        return orders
+    return {'sequence': 1, 'bids': side(-1), 'asks': side(1)}
+
+
+def load_per_order(text):
+    """Baseline: decode the whole snapshot, then add every order
+    individually, parsing every field."""
+    snapshot = json.loads(text)
+    book = OrderBasedBook()
+    for side, orders in ((Side.BID, snapshot['bids']),
+                         (Side.ASK, snapshot['asks'])):
+        for price, size, order_id in orders:
+            book.add_order(side=side,
+                           order_id=order_id,
+                           price=make_price(price),
+                           qty=make_qty(size))
+    return book
+
+
+def max_stall(loader, text):
+    """Longest time the event loop is blocked by ``loader.load_async``, as
+    seen by a task running alongside it."""
+    loop = asyncio.new_event_loop()
+    longest = 0.0
+
+    async def watch():
+        nonlocal longest
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0, loop=loop)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    async def load():
+        watcher = asyncio.ensure_future(watch(), loop=loop)
+        await asyncio.sleep(0, loop=loop)
+        await loader.load_async(text, loop=loop)
+        watcher.cancel()
+
+    try:
+        loop.run_until_complete(load())
+    finally:
+        loop.close()
+    return longest
+
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(args):
+    if args['<snapshot>']:
+        with open(args['<snapshot>']) as f:
+            text = f.read()
+    else:
+        text = json.dumps(make_snapshot(int(args['--orders'])))
+    snapshot = json.loads(text)
+    orders = len(snapshot['bids']) + len(snapshot['asks'])
+    repeat = int(args['--repeat'])
+    loader = SnapshotLoader(chunk_size=int(args['--chunk']))
+
+    print('{} orders'.format(orders))
+    for name, func in (('per-order', load_per_order),
+                       ('loader', loader.load)):
+        elapsed = best_of(repeat, func, text)
+        print('{:<10} {:8.1f}ms  {:>10.0f} orders/s'.format(
+            name, elapsed * 1e3, orders / elapsed))
+    print('max loop stall with chunks of {}: {:.1f}ms'.format(
+        args['--chunk'], max_stall(loader, text) * 1e3))
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
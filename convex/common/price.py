@@ -5,3 +5,65 @@ _QTY_CONTEXT = decimal.Context(prec=16)
 
 make_price = _PRICE_CONTEXT.create_decimal
 make_qty = _QTY_CONTEXT.create_decimal
+
+
+class FixedPoint:
+    """Fixed-point conversion between decimal strings and integer units.
+
+    Integers are cheaper than ``Decimal`` to hash, compare and add, so the
+    book hot path can work in units and only convert back at the API edge.
+
+    >>> fp = FixedPoint(places=2)
+    >>> fp.to_units('1234.5')
+    123450
+    >>> fp.to_decimal(123450)
+    Decimal('1234.5')
+    """
+    __slots__ = '_places', '_scale', '_context'
+
+    def __init__(self, places, context=_PRICE_CONTEXT):
+        self._places = places
+        self._scale = decimal.Decimal(10 ** places)
+        self._context = context
+
+    @property
+    def places(self):
+        """Number of decimal places represented."""
+        return self._places
+
+    def to_units(self, value):
+        """Convert decimal string (or number) to integer units.
+
+        Raise ValueError if ``value`` has more precision than ``places``.
+        """
+        if not isinstance(value, str):
+            return self._number_to_units(value)
+        dot = value.find('.')
+        if dot >= 0 and len(value) - dot - 1 == self._places:
+            return int(value.replace('.', ''))  # GDAX pads sizes to 8 places.
+        whole, _, frac = value.partition('.')
+        if len(frac) > self._places:
+            frac, extra = frac[:self._places], frac[self._places:]
+            if extra.strip('0'):
+                raise ValueError(
+                    '\'{}\' exceeds {} decimal places'.format(
+                        value, self._places))
+        return int(whole + frac.ljust(self._places, '0'))
+
+    def _number_to_units(self, value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(value)
+        units, rest = divmod(value * self._scale, 1)
+        if rest:
+            raise ValueError('{} exceeds {} decimal places'.format(
+                value, self._places))
+        return int(units)
+
+    def to_decimal(self, units):
+        """Convert integer units to ``Decimal``."""
+        return self._context.divide(units, self._scale)
+
+
+#: GDAX quotes prices and sizes with at most 8 decimal places.
+PRICE_UNITS = FixedPoint(places=8, context=_PRICE_CONTEXT)
+QTY_UNITS = FixedPoint(places=8, context=_QTY_CONTEXT)
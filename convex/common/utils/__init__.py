@@ -1,6 +1,9 @@
 from .conversions import humanize_bytes, dehumanize_bytes
+from .stats import RateCounter, LatencyHistogram
 
 __all__ = [
     'humanize_bytes',
     'dehumanize_bytes',
+    'RateCounter',
+    'LatencyHistogram',
 ]
@@ -0,0 +1,185 @@
+import queue
+import threading
+
+import logbook
+
+log = logbook.Logger('Writer')
+
+_FLUSH = object()  # Queued to flush the file after the data before it.
+
+
+class BackgroundWriter:
+    """Binary file-like object writing to a file on a background thread.
+
+    ``write`` only queues data, so callers on an event loop never wait for
+    the filesystem. The writer thread joins queued chunks into writes of up
+    to ``batch_size`` bytes. When ``max_queued`` chunks are waiting, further
+    writes are dropped and counted; write whole records at once so a drop
+    never leaves a partial record behind. ``tell`` only counts accepted
+    chunks, so offsets taken from it stay valid.
+
+    A write failing on the thread is logged and counted, and sets
+    ``failed``. Later data would not land at its ``tell`` offset, so from
+    then on data still queued is discarded and counted in ``failed_bytes``,
+    and ``write`` accepts nothing and returns 0, as for a full queue.
+
+    ``flush`` and ``close`` are carried out by the writer thread once the
+    data queued before them is written; ``join`` waits for a closed writer
+    to finish.
+
+    Args:
+        file: Binary file-like object, only used by the writer thread from
+            now on.
+        max_queued (int): Chunks waiting to be written before dropping.
+        batch_size (int): Bytes joined into one write.
+        name (str): Writer thread name.
+        on_close (callable): Called without arguments on the writer thread
+            after the file is closed.
+    """
+    def __init__(self, file, max_queued=10000, batch_size=1024 * 1024,
+                 name='Writer', on_close=None):
+        if max_queued < 1:
+            raise ValueError('max_queued must be at least 1')
+        self._file = file
+        self._position = file.tell()
+        self._queue = queue.Queue(max_queued)
+        self._batch_size = batch_size
+        self._on_close = on_close
+        self._flush_requested = False
+        self._closing = False
+        self._max_queued = 0
+        self._dropped = 0
+        self._dropped_bytes = 0
+        self._failed = 0
+        self._failed_bytes = 0
+        self._write_failed = False
+        self._written = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self):
+        """Queue depth and high-water mark in chunks, chunks and bytes
+        dropped, failed batched writes and their bytes, bytes written and
+        number of batched writes.
+        """
+        return {
+            'queued': self._queue.qsize(),
+            'max_queued': self._max_queued,
+            'dropped': self._dropped,
+            'dropped_bytes': self._dropped_bytes,
+            'failed': self._failed,
+            'failed_bytes': self._failed_bytes,
+            'written': self._written,
+            'batches': self._batches,
+        }
+
+    @property
+    def closed(self):
+        return self._closing
+
+    @property
+    def failed(self):
+        """Whether a write failed, after which no more data is written."""
+        return self._write_failed
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        """Queue data, return number of bytes accepted."""
+        if self._closing:
+            raise ValueError('write to closed BackgroundWriter')
+        if self._write_failed:
+            self._dropped += 1
+            self._dropped_bytes += len(data)
+            return 0
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self._dropped += 1
+            self._dropped_bytes += len(data)
+            return 0
+        depth = self._queue.qsize()
+        if depth > self._max_queued:
+            self._max_queued = depth
+        self._position += len(data)
+        return len(data)
+
+    def flush(self):
+        """Flush the file after the data queued so far is written."""
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            # The thread is busy and flushes after its current batch.
+            self._flush_requested = True
+
+    def close(self):
+        """Close the file after queued data is written, without waiting."""
+        if self._closing:
+            return
+        self._closing = True
+        self.flush()  # Wakes the thread.
+
+    def join(self, timeout=None):
+        """Wait for the writer thread of a closed writer to finish."""
+        self._thread.join(timeout)
+
+    def _run(self):
+        get, get_nowait = self._queue.get, self._queue.get_nowait
+        while True:
+            batch = []
+            size = 0
+            flush = False
+            item = get()
+            while True:
+                if item is _FLUSH:
+                    flush = True
+                    break
+                batch.append(item)
+                size += len(item)
+                if size >= self._batch_size:
+                    break
+                try:
+                    item = get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch, size)
+            if flush or self._flush_requested:
+                self._flush_requested = False
+                self._flush_file()
+            if self._closing and self._queue.empty():
+                break
+        try:
+            self._file.close()
+        except Exception:
+            log.exception('Closing {} failed', self._file)
+        if self._on_close is not None:
+            try:
+                self._on_close()
+            except Exception:
+                log.exception('Close callback of {} failed', self._file)
+
+    def _write_batch(self, batch, size):
+        if self._write_failed:
+            self._failed_bytes += size
+            return
+        try:
+            self._file.write(b''.join(batch))
+        except Exception:
+            log.exception('Writing {} bytes failed', size)
+            self._write_failed = True
+            self._failed += 1
+            self._failed_bytes += size
+            return
+        self._written += size
+        self._batches += 1
+
+    def _flush_file(self):
+        try:
+            self._file.flush()
+        except Exception:
+            log.exception('Flushing {} failed', self._file)
@@ -0,0 +1,193 @@
+"""Streaming compression of recorded files.
+
+``CompressedWriter`` compresses data as it is written instead of compressing
+a finished file. Each ``flush`` ends the current gzip member, xz stream or
+zstd frame, so everything written up to the last flush can be read back even
+if the writer dies before closing the file. Concatenated members are read as
+one file by ``open_compressed``, ``gzip``/``lzma`` and the command line tools.
+
+zstd needs the optional ``zstandard`` package.
+"""
+
+import gzip
+import lzma
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {
+    'gzip': '.gz',
+    'lzma': '.xz',
+    'zstd': '.zst',
+}
+
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'lzma': 6,
+    'zstd': 3,
+}
+
+
+def _make_compressor(codec, level):
+    if codec == 'gzip':
+        # wbits 31 writes a gzip header and trailer.
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if codec == 'lzma':
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=level)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd compression needs the zstandard package')
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError('Unsupported compression: {}'.format(codec))
+
+
+def compression_of(path):
+    """Return codec implied by path's extension, ``None`` if uncompressed."""
+    for codec, ext in EXTENSIONS.items():
+        if path.endswith(ext):
+            return codec
+    return None
+
+
+class _GzipReader(gzip.GzipFile):
+    """Gzip reader also closing the file it reads from."""
+    def __init__(self, file):
+        gzip.GzipFile.__init__(self, fileobj=file, mode='rb')
+        self._source = file
+
+    def close(self):
+        try:
+            gzip.GzipFile.close(self)
+        finally:
+            self._source.close()
+
+
+class _LzmaReader(lzma.LZMAFile):
+    """xz reader also closing the file it reads from."""
+    def __init__(self, file):
+        lzma.LZMAFile.__init__(self, file)
+        self._source = file
+
+    def close(self):
+        try:
+            lzma.LZMAFile.close(self)
+        finally:
+            self._source.close()
+
+
+def open_compressed(path, offset=0):
+    """Open file for reading binary data, decompressing it if its extension
+    is one of ``EXTENSIONS``.
+
+    Args:
+        path (str): File to read.
+        offset (int): File offset to start reading at; for compressed files
+            the start of a member.
+    """
+    codec = compression_of(path)
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError('zstd compression needs the zstandard package')
+    file = open(path, 'rb')
+    file.seek(offset)
+    if codec == 'gzip':
+        return _GzipReader(file)
+    if codec == 'lzma':
+        return _LzmaReader(file)
+    if codec == 'zstd':
+        dctx = zstandard.ZstdDecompressor()
+        return dctx.stream_reader(file, read_across_frames=True,
+                                  closefd=True)
+    return file
+
+
+class CompressedWriter:
+    """Binary file-like object compressing data as it is written.
+
+    Args:
+        path (str): Output file, truncated if it exists.
+        codec (str): ``'gzip'``, ``'lzma'`` or ``'zstd'``.
+        level (int): Compression level, ``DEFAULT_LEVELS`` if ``None``.
+    """
+    def __init__(self, path, codec='gzip', level=None):
+        self._codec = codec
+        self._level = DEFAULT_LEVELS.get(codec) if level is None else level
+        self._compressor = _make_compressor(codec, self._level)
+        self._file = open(path, 'wb')
+        self._member_bytes = 0  # Uncompressed bytes in the current member.
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._seconds = 0.0
+
+    @property
+    def codec(self):
+        return self._codec
+
+    @property
+    def bytes_in(self):
+        """Uncompressed bytes written."""
+        return self._bytes_in
+
+    @property
+    def bytes_out(self):
+        """Compressed bytes produced."""
+        return self._bytes_out
+
+    @property
+    def ratio(self):
+        """Uncompressed to compressed size."""
+        return self._bytes_in / self._bytes_out if self._bytes_out else 0.0
+
+    @property
+    def throughput(self):
+        """Uncompressed bytes compressed per second of compression time."""
+        return self._bytes_in / self._seconds if self._seconds else 0.0
+
+    def tell(self):
+        return self._bytes_in
+
+    def write(self, data):
+        t0 = time.perf_counter()
+        if self._compressor is None:
+            self._compressor = _make_compressor(self._codec, self._level)
+        out = self._compressor.compress(data)
+        self._seconds += time.perf_counter() - t0
+        self._member_bytes += len(data)
+        self._bytes_in += len(data)
+        if out:
+            self._write_out(out)
+        return len(data)
+
+    def flush(self):
+        """End the current member and flush it to the file."""
+        if self._member_bytes:
+            t0 = time.perf_counter()
+            out = self._compressor.flush()
+            self._seconds += time.perf_counter() - t0
+            self._write_out(out)
+            self._compressor = None  # Next write starts a new member.
+            self._member_bytes = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def _write_out(self, data):
+        self._file.write(data)
+        self._bytes_out += len(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,80 @@
+import time
+
+
+class RateCounter:
+    """Event counter which can report its rate.
+
+    ``count`` is a plain attribute so hot paths can increment it directly.
+    """
+    __slots__ = 'count', '_last_count', '_last_time'
+
+    def __init__(self):
+        self.count = 0
+        self._last_count = 0
+        self._last_time = time.monotonic()
+
+    def rate(self):
+        """Events per second since the previous call to ``rate``."""
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        events = self.count - self._last_count
+        self._last_time, self._last_count = now, self.count
+        return events / elapsed if elapsed > 0 else 0.0
+
+
+class LatencyHistogram:
+    """Histogram of latencies with power-of-two microsecond buckets.
+
+    Bucket ``i`` counts latencies in ``[2**(i-1), 2**i)`` microseconds.
+    """
+    __slots__ = '_buckets', '_count', '_max'
+
+    def __init__(self, buckets=32):
+        self._buckets = [0] * buckets
+        self._count = 0
+        self._max = 0.0
+
+    @property
+    def count(self):
+        """Number of recorded latencies."""
+        return self._count
+
+    @property
+    def max(self):
+        """Largest recorded latency in seconds."""
+        return self._max
+
+    def record(self, seconds):
+        """Record latency given in seconds."""
+        micros = int(seconds * 1e6)
+        idx = min(max(micros, 0).bit_length(), len(self._buckets) - 1)
+        self._buckets[idx] += 1
+        self._count += 1
+        if seconds > self._max:
+            self._max = seconds
+
+    def percentile(self, pct):
+        """Upper bound, in seconds, of the bucket holding percentile ``pct``.
+        """
+        if not self._count:
+            return 0.0
+        target = self._count * pct / 100
+        seen = 0
+        for idx, n in enumerate(self._buckets):
+            seen += n
+            if seen >= target:
+                return (1 << idx) / 1e6
+        return self._max
+
+    def reset(self):
+        self._buckets = [0] * len(self._buckets)
+        self._count = 0
+        self._max = 0.0
+
+    def summary(self):
+        """Return p50/p99/max latencies in microseconds as a string."""
+        return 'p50<{:.0f}us p99<{:.0f}us max={:.0f}us n={}'.format(
+            self.percentile(50) * 1e6,
+            self.percentile(99) * 1e6,
+            self._max * 1e6,
+            self._count)
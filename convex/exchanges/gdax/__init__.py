@@ -1,4 +1,5 @@
 from .market_data import MDGateway
 from .order_entry import OrderEntryGateway
+from .replay import ReplayGateway
 
-__all__ = 'MDGateway', 'OrderEntryGateway'
+__all__ = 'MDGateway', 'OrderEntryGateway', 'ReplayGateway'
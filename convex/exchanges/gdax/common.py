@@ -1,5 +1,31 @@
+import datetime as dt
+
+import dateutil.parser as du_parser
+
 GDAX_SYMBOL_FORMAT = '{inst.base_currency}-{inst.quote_currency}'
 
+_UTC = dt.timezone.utc
+
 
 def make_symbol(instrument):
     return GDAX_SYMBOL_FORMAT.format(inst=instrument)
+
+
+def parse_time(s):
+    """Parse GDAX timestamp.
+
+    Fast path for GDAX's fixed ``YYYY-MM-DDTHH:MM:SS[.ffffff]Z`` format,
+    falling back to ``dateutil`` for anything else.
+
+    >>> parse_time('2017-09-21T23:22:10.123Z').isoformat()
+    '2017-09-21T23:22:10.123000+00:00'
+    """
+    if len(s) >= 20 and s[-1] == 'Z' and s[10] == 'T' and s[19] in '.Z':
+        try:
+            micros = int(s[20:-1].ljust(6, '0')[:6]) if s[19] == '.' else 0
+            return dt.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                               int(s[11:13]), int(s[14:16]), int(s[17:19]),
+                               micros, _UTC)
+        except ValueError:
+            pass
+    return du_parser.parse(s)
@@ -4,42 +4,134 @@ except ImportError:
     import json
 
 import asyncio
+import collections
+import functools
+import re
+import threading
+import time
 
 import aiohttp
-import dateutil.parser as du_parser
 import logbook
 import websockets
 
 from ..exchange_id import ExchangeID
 
 from ...common import Side, make_price, make_qty
+from ...common.price import PRICE_UNITS, QTY_UNITS
+from ...common.utils import RateCounter, LatencyHistogram
 from ...common.instrument import make_btc_usd, make_ltc_usd, make_eth_usd
 from ... import market_data
 
-from .common import make_symbol as make_gdax_symbol
+from .common import make_symbol as make_gdax_symbol, parse_time
+from .snapshot import SnapshotLoader, dump_snapshot, snapshot_sequence
 
 log = logbook.Logger('GDAX')
 
+_TYPE_RE = re.compile(r'"type"\s*:\s*"([a-z_]+)"')
+_SEQUENCE_RE = re.compile(r'"sequence"\s*:\s*(\d+)')
+_PRODUCT_RE = re.compile(r'"product_id"\s*:\s*"([A-Z-]+)"')
+
+
+class _Product:
+    """Feed state for a single GDAX product."""
+    __slots__ = ('instrument', 'product_id', 'sequence', 'book',
+                 'recovering', 'has_update', 'buffer', 'recovery_start',
+                 'recoveries', 'last_recovery_time', 'last_replayed',
+                 'buffer_overflows', 'recovery_overflows')
+
+    def __init__(self, instrument, buffer_size):
+        self.instrument = instrument
+        self.product_id = make_gdax_symbol(instrument)
+        self.sequence = -1
+        self.book = None
+        self.recovering = False
+        self.has_update = False
+        # Raw or decoded messages received while recovering.
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.recovery_start = 0.0
+        self.recoveries = 0
+        self.last_recovery_time = 0.0
+        self.last_replayed = 0
+        self.buffer_overflows = 0  # Messages evicted from a full buffer.
+        self.recovery_overflows = 0  # buffer_overflows at recovery start
+
 
 class MDGateway(market_data.Gateway):
     ENDPOINT = 'https://api.gdax.com'
     WS_ENDPOINT = 'wss://ws-feed.gdax.com'
+    # Message types which only advance the sequence number.
+    SKIPPED_TYPES = frozenset(['received'])
 
     def __init__(self,
                  endpoint=ENDPOINT,
                  ws_endpoint=WS_ENDPOINT,
-                 loop=None):
-        market_data.Gateway.__init__(self, loop)
+                 loop=None,
+                 fixed_point=False,
+                 lazy_timestamps=False,
+                 stats_interval=60,
+                 threaded=False,
+                 ring_size=1024,
+                 backpressure='latest',
+                 recovery_buffer_size=200000,
+                 snapshot_chunk_size=5000,
+                 capture=None,
+                 **kwargs):
+        """
+        Args:
+            fixed_point (bool): Keep book prices and sizes as integer units,
+                converting to ``Decimal`` only when books are published.
+            lazy_timestamps (bool): Only parse message timestamps when a
+                consumer reads ``Update.timestamp``.
+            stats_interval (float): Seconds between logging message stats.
+            threaded (bool): Receive, decode and apply messages on a worker
+                thread with its own event loop. Updates (always ``Level``
+                snapshots) are handed to ``loop`` through an ``UpdateRing``.
+            ring_size (int): Capacity of the update ring in threaded mode.
+            backpressure (str): Full ring policy, ``'latest'`` or ``'block'``.
+            recovery_buffer_size (int): Messages buffered per product while
+                its snapshot is fetched, replayed once the snapshot lands.
+            snapshot_chunk_size (int): Snapshot orders loaded between yields
+                to the event loop.
+            capture (market_data.capture.CaptureWriter): Record raw
+                websocket frames and the snapshots books are rebuilt from,
+                see ``start_capture``.
+        """
+        if threaded:
+            kwargs['snapshot_books'] = True  # Books change on the worker.
+        market_data.Gateway.__init__(self, loop, **kwargs)
+        self._io_loop = self.loop  # Loop running the feed.
+        self._ring = (market_data.UpdateRing(ring_size, backpressure)
+                      if threaded else None)
+        self._delivery_latency = LatencyHistogram()
+        self._lazy_timestamps = lazy_timestamps
+        if fixed_point:
+            self._price_units, self._qty_units = PRICE_UNITS, QTY_UNITS
+            # Only a few hundred distinct prices are live at any time.
+            self._parse_price = functools.lru_cache(maxsize=4096)(
+                    PRICE_UNITS.to_units)
+            self._parse_qty = QTY_UNITS.to_units
+        else:
+            self._price_units = self._qty_units = None
+            self._parse_price, self._parse_qty = make_price, make_qty
         self._endpoint = endpoint
         self._ws_endpoint = ws_endpoint
-        self._sequence = -1
+        self._products = {}  # GDAX product ID -> _Product
+        self._recovery_buffer_size = recovery_buffer_size
+        self._snapshot_chunk_size = snapshot_chunk_size
         self._message_queue = asyncio.Queue(loop=self.loop)
+        self._stats_interval = stats_interval
+        self._stats_handle = None
+        self._decoded = RateCounter()
+        self._skipped = RateCounter()
+        self._buffered = RateCounter()
+        self._capture = capture
+        self._product_captures = {}  # GDAX product ID -> CaptureWriter
         self._dispatch_map = {
             'open': self._handle_open_message,
             'change': self._handle_change_message,
             'done': self._handle_done_message,
             'match': self._handle_match_message,
-            'received': lambda m: False
+            'received': lambda p, m: False
         }
 
     def subscribe(self, instrument):
@@ -47,30 +139,180 @@ class MDGateway(market_data.Gateway):
                 and instrument != make_ltc_usd(ExchangeID.GDAX)
                 and instrument != make_eth_usd(ExchangeID.GDAX)):
             raise ValueError('Unsupported instrument: {}'.format(instrument))
-        self._instrument = instrument
-
-    @property
-    def _product_id(self):
-        return make_gdax_symbol(self._instrument)
+        product = _Product(instrument, self._recovery_buffer_size)
+        self._products.setdefault(product.product_id, product)
 
     @property
     def exchange_id(self):
         """Exchange ID"""
         return ExchangeID.GDAX
 
+    @property
+    def message_stats(self):
+        """Number of fully decoded and skipped websocket messages, and of
+        messages buffered during recoveries."""
+        return {
+            'decoded': self._decoded.count,
+            'skipped': self._skipped.count,
+            'buffered': self._buffered.count,
+        }
+
+    @property
+    def recovery_stats(self):
+        """Per product recovery count, last duration, messages replayed and
+        messages lost to a full recovery buffer.
+        """
+        return {
+            product_id: {
+                'recoveries': p.recoveries,
+                'last_duration': p.last_recovery_time,
+                'last_replayed': p.last_replayed,
+                'buffer_overflows': p.buffer_overflows,
+            } for product_id, p in self._products.items()
+        }
+
+    @property
+    def delivery_latency(self):
+        """``LatencyHistogram`` of worker to event loop hand-off latency."""
+        return self._delivery_latency
+
+    def start_capture(self, capture, instrument=None):
+        """Record raw frames and snapshots to capture from now on.
+
+        With an instrument only its messages go to capture, other products
+        keep their own capture, if any. The capture starts with a snapshot of
+        each current book, or of the book being recovered once it is, so it
+        can be replayed on its own with ``ReplayGateway``. Pass ``None`` to
+        stop.
+
+        Return an ``asyncio.Future`` done once frames go to capture. In
+        threaded mode the switch is made on the worker thread, which may
+        write to the previous capture until then.
+        """
+        return self._call_in_feed(self._start_capture, capture, instrument)
+
+    def _start_capture(self, capture, instrument):
+        if instrument is None:
+            self._capture = capture
+            products = [product for product in self._products.values()
+                        if product.product_id not in self._product_captures]
+        else:
+            product_id = make_gdax_symbol(instrument)
+            if capture is None:
+                self._product_captures.pop(product_id, None)
+            else:
+                self._product_captures[product_id] = capture
+            product = self._products.get(product_id)
+            products = [product] if product is not None else []
+        if capture is None:
+            return
+        for product in products:
+            # Recovering books are written when the snapshot is applied.
+            if product.book is not None and not product.recovering:
+                capture.write_snapshot(product.product_id, dump_snapshot(
+                        product.book, product.sequence))
+
     async def launch(self):
-        if not self._instrument:
+        if not self._products:
             raise ValueError('No subscribed instruments')
 
+        self._log_stats()
+        try:
+            if self._ring is not None:
+                await self._launch_threaded()
+            else:
+                await self._run_feed()
+        finally:
+            self._stats_handle.cancel()
+        log.notice('Shutting down')
+
+    async def _run_feed(self):
         tasks = [
             self._consume_messages(),
             self._poll_endpoint(self._ws_endpoint),
         ]
         try:
-            await asyncio.gather(*tasks, loop=self.loop)
+            await asyncio.gather(*tasks, loop=self._io_loop)
         except asyncio.CancelledError:
             pass
-        log.notice('Shutting down')
+
+    async def _launch_threaded(self):
+        done = self.loop.create_future()
+
+        def set_done():
+            if not done.done():
+                done.set_result(None)
+
+        # Set up before the worker starts, so calls from this thread can
+        # always be handed to the feed loop.
+        io_loop = asyncio.new_event_loop()
+        self._io_loop = io_loop
+        self._message_queue = asyncio.Queue(loop=io_loop)
+        feed_task = io_loop.create_task(self._run_feed())
+
+        def run_worker():
+            asyncio.set_event_loop(io_loop)
+            try:
+                io_loop.run_until_complete(feed_task)
+            finally:
+                self._io_loop = self.loop
+                io_loop.close()
+                self._ring.close()
+                self.loop.call_soon_threadsafe(set_done)
+
+        worker = threading.Thread(target=run_worker,
+                                  name='GDAX-MD',
+                                  daemon=True)
+        worker.start()
+        try:
+            await done
+        except asyncio.CancelledError:
+            log.notice('Stopping market data worker')
+            try:
+                io_loop.call_soon_threadsafe(feed_task.cancel)
+            except RuntimeError:
+                pass  # The worker already finished.
+            self._ring.close()
+
+    def _call_in_feed(self, func, *args):
+        """Call func on the thread running the feed, which owns products,
+        books and captures.
+
+        Return an ``asyncio.Future`` done once func returned.
+        """
+        done = self.loop.create_future()
+        if self._io_loop is self.loop:
+            func(*args)
+            done.set_result(None)
+            return done
+
+        def call():
+            try:
+                func(*args)
+            except Exception as exc:
+                self.loop.call_soon_threadsafe(done.set_exception, exc)
+            else:
+                self.loop.call_soon_threadsafe(done.set_result, None)
+        self._io_loop.call_soon_threadsafe(call)
+        return done
+
+    def _publish_update(self, update, callbacks):
+        if self._ring is None:
+            market_data.Gateway._publish_update(self, update, callbacks)
+            return
+        # Called on the worker thread; hand off to the event loop.
+        key = update.instrument, callbacks is self._aggregated_callbacks
+        if self._ring.push(key, update):
+            self.loop.call_soon_threadsafe(self._drain_ring)
+
+    def _drain_ring(self):
+        """Publish updates handed over by the worker thread."""
+        now = time.monotonic()
+        for (_, aggregated), enqueued, update in self._ring.drain():
+            self._delivery_latency.record(now - enqueued)
+            callbacks = (self._aggregated_callbacks if aggregated
+                         else self._callbacks)
+            market_data.Gateway._publish_update(self, update, callbacks)
 
     def request_shutdown(self):
         log.notice('Shutdown requested')
@@ -82,33 +324,124 @@ class MDGateway(market_data.Gateway):
             messages.append(self._message_queue.get_nowait())
         return messages
 
+    def _log_stats(self):
+        """Log message decode rates periodically."""
+        log.info('Messages/s: decoded={:0.1f}, skipped={:0.1f}, '
+                 'buffered={:0.1f}',
+                 self._decoded.rate(), self._skipped.rate(),
+                 self._buffered.rate())
+        if self._ring is not None:
+            log.info('Update hand-off: {}, dropped={}',
+                     self._delivery_latency.summary(), self._ring.dropped)
+            self._delivery_latency.reset()
+        for instrument, deliveries in self.delivery_stats().items():
+            for stats in deliveries:
+                log.info('[{}] Delivery to {}: {}, conflated={}',
+                         instrument, stats['callback'].__qualname__,
+                         stats['lag'].summary(), stats['conflated'])
+                stats['lag'].reset()
+        self._stats_handle = self.loop.call_later(self._stats_interval,
+                                                  self._log_stats)
+
+    def _prefilter(self, product, raw):
+        """Whether raw message of product can be skipped without decoding
+        it.
+
+        Stale messages and in-sequence messages of ``SKIPPED_TYPES`` are
+        skipped, the latter still advancing the product's expected sequence
+        number.
+        """
+        if product is None:
+            return False
+        match = _SEQUENCE_RE.search(raw)
+        if match is None:
+            return False
+        recv_seq = int(match.group(1))
+        if recv_seq <= product.sequence:
+            return True
+        if recv_seq == product.sequence + 1:
+            match = _TYPE_RE.search(raw)
+            if match is not None and match.group(1) in self.SKIPPED_TYPES:
+                product.sequence = recv_seq
+                return True
+        return False
+
+    def _capture_frame(self, raw):
+        capture = self._capture
+        if self._product_captures:
+            match = _PRODUCT_RE.search(raw)
+            if match is not None:
+                capture = self._product_captures.get(match.group(1), capture)
+        if capture is not None:
+            capture.write_frame(raw)
+
     async def _consume_messages(self):
         try:
             while True:
                 messages = await self._poll_queue()
-                has_update = False
-                for m in map(json.loads, messages):
-                    new_update = await self._on_message(m)
-                    has_update = has_update or new_update
-                if has_update:
-                    self.set_book(self._instrument, self._sequence, self._book)
-                    self.publish()
+                for raw in messages:
+                    self._on_raw_message(raw)
+                self._publish_products()
         except asyncio.CancelledError:
             log.notice('Canceled consume_messages')
             pass
 
+    def _on_raw_message(self, raw):
+        match = _PRODUCT_RE.search(raw)
+        product = self._products.get(match.group(1)) if match else None
+        if product is not None and product.recovering:
+            self._buffer_message(product, raw)  # Decoded when replayed.
+        elif self._prefilter(product, raw):
+            self._skipped.count += 1
+        else:
+            self._decoded.count += 1
+            self._on_message(json.loads(raw))
+
+    def _buffer_message(self, product, message, first=False):
+        """Keep raw or decoded message of a recovering product for replay,
+        ahead of the buffered messages if first is set.
+        """
+        buffer = product.buffer
+        if len(buffer) == buffer.maxlen:
+            # A message is evicted, so the replay will hit a gap.
+            if product.buffer_overflows == product.recovery_overflows:
+                log.warn('[{}] Recovery buffer of {} messages is full',
+                         product.product_id, buffer.maxlen)
+            product.buffer_overflows += 1
+        if first:
+            buffer.appendleft(message)
+        else:
+            buffer.append(message)
+        self._buffered.count += 1
+
+    def _publish_products(self):
+        """Store and publish books of products changed since last call."""
+        has_update = False
+        for product in self._products.values():
+            if product.has_update:
+                product.has_update = False
+                has_update = True
+                self.set_book(product.instrument, product.sequence,
+                              product.book)
+        if has_update:
+            self.publish()
+
     async def _poll_endpoint(self, endpoint):
         async def send_subscribe(sock):
-            message = json.dumps(
-                    {'type': 'subscribe', 'product_id': self._product_id})
+            message = json.dumps({
+                'type': 'subscribe',
+                'product_ids': list(self._products),
+            })
             log.info('Subscribing: {}', message)
             await sock.send(message)
 
-        sock = await websockets.connect(endpoint, loop=self.loop)
+        sock = await websockets.connect(endpoint, loop=self._io_loop)
         try:
             await send_subscribe(sock)
             while True:
                 data = await sock.recv()
+                if self._capture is not None or self._product_captures:
+                    self._capture_frame(data)
                 self._message_queue.put_nowait(data)
         except asyncio.CancelledError:
             log.notice('Canceled poll_endpoint')
@@ -122,104 +455,187 @@ class MDGateway(market_data.Gateway):
             log.notice('Closing websocket...')
             await sock.close()
 
-    async def _on_message(self, message):
-        recv_seq = int(message['sequence'])
-        if recv_seq > self._sequence + 1:
-            log.info('Gap detected received {}, expected {}',
-                     recv_seq, self._sequence + 1)
+    def _on_message(self, message):
+        product = self._products.get(message.get('product_id'))
+        if product is None:
+            if message.get('type') == 'error':
+                log.error('Feed error: {}', message)
+            return False  # e.g. subscription acknowledgements
+        if product.recovering:
+            self._buffer_message(product, message)
+            return False
 
-            self.set_status(self._instrument, market_data.Status.GAPPED)
+        recv_seq = int(message['sequence'])
+        if recv_seq <= product.sequence:
+            return False
+        if self._lazy_timestamps:
+            self.set_timestamp(product.instrument, message['time'],
+                               parser=parse_time)
+        else:
+            self.set_timestamp(product.instrument, parse_time(message['time']))
+        if recv_seq > product.sequence + 1:
+            log.info('[{}] Gap detected received {}, expected {}',
+                     product.product_id, recv_seq, product.sequence + 1)
+            self.set_status(product.instrument, market_data.Status.GAPPED)
             self.publish()
-
-            self._message_queue = asyncio.Queue(loop=self.loop)
-            self._sequence = await self._recover()
-
-            log.info('Recover sequence {}', self._sequence)
-            self.set_status(self._instrument, market_data.Status.OK)
-
-        if recv_seq <= self._sequence:
+            product.recovering = True
+            product.recovery_start = time.monotonic()
+            product.recovery_overflows = product.buffer_overflows
+            # Ahead of anything still waiting in the buffer during a replay.
+            self._buffer_message(product, message, first=True)
+            asyncio.ensure_future(self._recover(product), loop=self._io_loop)
             return False
 
-        self.set_timestamp(du_parser.parse(message['time']))
-        assert recv_seq == self._sequence + 1
-        self._sequence = recv_seq
-        return self._dispatch_message(message)
+        product.sequence = recv_seq
+        if self._dispatch_message(product, message):
+            product.has_update = True
+            return True
+        return False
 
-    def _dispatch_message(self, message):
-        return self._dispatch_map[message['type']](message)
+    def _dispatch_message(self, product, message):
+        return self._dispatch_map[message['type']](product, message)
 
-    def _handle_open_message(self, message):
-        self._book.add_order(
+    def _handle_open_message(self, product, message):
+        product.book.add_order(
                 side=Side.parse(message['side']),
                 order_id=message['order_id'],
-                price=make_price(message['price']),
-                qty=make_qty(message['remaining_size']))
+                price=self._parse_price(message['price']),
+                qty=self._parse_qty(message['remaining_size']))
         return True
 
-    def _handle_match_message(self, message):
-        trade = MDGateway._parse_trade(message)
-        self.add_trade(self._instrument, trade)
-        self._book.match_order(
+    def _handle_match_message(self, product, message):
+        if self._lazy_timestamps:
+            time = parse_time(message['time'])
+        else:
+            # Already parsed in _on_message.
+            time = self._handlers[product.instrument].timestamp
+        trade = MDGateway._parse_trade(message, time)
+        self.add_trade(product.instrument, trade)
+        product.book.match_order(
                 side=trade.aggressor.opposite,
                 order_id=message['maker_order_id'],
-                price=trade.price,
-                trade_qty=trade.qty)
+                price=self._parse_price(message['price']),
+                trade_qty=self._parse_qty(message['size']))
         return True
 
-    def _handle_done_message(self, message):
+    def _handle_done_message(self, product, message):
         price = message.get('price', None)
         if not price:
             return False  # Market orders do not have a price field
-        removed = self._book.remove_order(
+        removed = product.book.remove_order(
                 side=Side.parse(message['side']),
                 order_id=message['order_id'],
-                price=make_price(price))
+                price=self._parse_price(price))
         return removed
 
-    def _handle_change_message(self, message):
+    def _handle_change_message(self, product, message):
         if 'new_funds' in message:
             return  # Changed market orders use "funds" fields.
-        changed = self._book.change_order(
+        changed = product.book.change_order(
                 side=Side.parse(message['side']),
                 order_id=message['order_id'],
-                price=make_price(message['price']),
-                new_qty=make_qty(message['new_size']))
+                price=self._parse_price(message['price']),
+                new_qty=self._parse_qty(message['new_size']))
         return changed
 
     @staticmethod
-    def _parse_trade(message):
+    def _parse_trade(message, time):
         resting_side = Side.parse(message['side'])
         return market_data.Trade(
                 aggressor=resting_side.opposite,
                 price=make_price(message['price']),
                 qty=make_qty(message['size']),
                 sequence=int(message['sequence']),
-                time=du_parser.parse(message['time']),
+                time=time,
                 maker_id=message['maker_order_id'],
                 taker_id=message['taker_order_id'])
 
-    async def _recover(self):
-        with aiohttp.ClientSession(loop=self.loop) as session:
+    async def _recover(self, product):
+        """Rebuild product's book from a level-3 snapshot.
+
+        Other products keep being processed while the snapshot is fetched.
+        Messages for this product received in the meantime are buffered and
+        replayed on top of the snapshot.
+        """
+        try:
+            snapshot = await self._fetch_snapshot(product)
+            sequence = snapshot_sequence(snapshot)
+            loader = self._make_snapshot_loader(product)
+            book = await loader.load_async(snapshot, loop=self._io_loop)
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            log.exception('[{}] Recovery failed, retrying in 1s',
+                          product.product_id)
+            await asyncio.sleep(1, loop=self._io_loop)
+            asyncio.ensure_future(self._recover(product), loop=self._io_loop)
+            return
+
+        capture = self._product_captures.get(product.product_id,
+                                             self._capture)
+        if capture is not None:
+            # Recorded when applied, so it lands in the current capture.
+            capture.write_snapshot(product.product_id, snapshot)
+        self._apply_snapshot(product, book, sequence)
+
+    def _apply_snapshot(self, product, book, sequence):
+        """Replace product's book and apply messages buffered meanwhile."""
+        product.book = book
+        product.sequence = sequence
+        product.recovering = False
+        replayed = self._replay_buffer(product)
+        if product.recovering:
+            return  # Replay hit another gap, a new recovery is under way.
+
+        product.recoveries += 1
+        product.last_recovery_time = time.monotonic() - product.recovery_start
+        product.last_replayed = replayed
+        log.info('[{}] Recovered snapshot sequence {}, replayed {} messages '
+                 'up to {} in {:0.3f}s',
+                 product.product_id, sequence, replayed,
+                 product.sequence, product.last_recovery_time)
+        product.has_update = True
+        self.set_status(product.instrument, market_data.Status.OK)
+        self._publish_products()
+
+    def _replay_buffer(self, product):
+        """Apply messages buffered during recovery.
+
+        Messages at or before the snapshot sequence are dropped by
+        ``_on_message``. Return number of messages applied.
+        """
+        buffer = product.buffer
+        replayed = 0
+        while buffer and not product.recovering:
+            message = buffer.popleft()
+            if isinstance(message, str):
+                self._decoded.count += 1
+                message = json.loads(message)
+            if int(message['sequence']) > product.sequence:
+                replayed += 1
+            self._on_message(message)
+        return replayed
+
+    async def _fetch_snapshot(self, product):
+        """Return raw JSON text of product's level-3 snapshot, decoded by
+        the ``SnapshotLoader`` in chunks."""
+        with aiohttp.ClientSession(loop=self._io_loop) as session:
             order_book_ep_fmt = self._endpoint + '/products/{}/book'
-            endpoint = order_book_ep_fmt.format(self._product_id)
+            endpoint = order_book_ep_fmt.format(product.product_id)
             log.info('Recovering on {}', endpoint)
             async with session.get(endpoint, params={'level': 3}) as res:
-                snapshot = await res.json()
-                self._book = MDGateway._on_snapshot(snapshot)
-                return snapshot['sequence']
-
-    @staticmethod
-    def _on_snapshot(message):
-        book = market_data.OrderBasedBook()
-
-        def add_parsed_order(side, odata):
-            book.add_order(side=side,
-                           order_id=odata[2],
-                           price=make_price(odata[0]),
-                           qty=make_qty(odata[1]))
-
-        for bid_data in message['bids']:
-            add_parsed_order(Side.BID, bid_data)
-        for ask_data in message['asks']:
-            add_parsed_order(Side.ASK, ask_data)
-        return book
+                return await res.text()
+
+    def _make_order_book(self, product):
+        return market_data.OrderBasedBook(
+                track_levels=self.wants_aggregated(product.instrument),
+                price_units=self._price_units,
+                qty_units=self._qty_units,
+                track_deltas=self.book_deltas)
+
+    def _make_snapshot_loader(self, product):
+        return SnapshotLoader(
+                make_book=functools.partial(self._make_order_book, product),
+                parse_price=self._parse_price,
+                parse_qty=self._parse_qty,
+                chunk_size=self._snapshot_chunk_size)
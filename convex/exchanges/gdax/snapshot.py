@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import json
+import re
+
+from ...common import Side, make_price, make_qty
+from ... import market_data
+
+_SEQUENCE_RE = re.compile(r'"sequence"\s*:\s*(\d+)')
+_ARRAY_START_RE = re.compile(r'\s*:\s*\[')
+# [price, size, order_id]
+_ORDER_RE = re.compile(r'\[\s*"([^"]*)"\s*,\s*"([^"]*)"\s*,\s*"([^"]*)"\s*\]')
+
+
+def snapshot_sequence(snapshot):
+    """Return sequence number of a decoded or raw JSON snapshot."""
+    if not isinstance(snapshot, str):
+        return snapshot['sequence']
+    match = _SEQUENCE_RE.search(snapshot)
+    if match is None:
+        raise ValueError('Snapshot has no sequence: {:.100}'.format(snapshot))
+    return int(match.group(1))
+
+
+def dump_snapshot(book, sequence):
+    """Return level-3 snapshot JSON text of an ``OrderBasedBook``, in the
+    layout of the GDAX REST response."""
+    def orders(side):
+        return [[str(price), str(qty), order_id]
+                for price, order_id, qty in book.iter_orders(side)]
+
+    return json.dumps({'sequence': sequence,
+                       'bids': orders(Side.BID),
+                       'asks': orders(Side.ASK)})
+
+
+def _find_array(text, name):
+    """Return offset of the first element of array field name."""
+    start = text.find('"{}"'.format(name))
+    match = (_ARRAY_START_RE.match(text, start + len(name) + 2)
+             if start >= 0 else None)
+    if match is None:
+        raise ValueError('Snapshot has no {}: {:.100}'.format(name, text))
+    return match.end()
+
+
+def _sides(snapshot):
+    """Yield (side, iterable of [price, size, order_id]) of snapshot."""
+    if not isinstance(snapshot, str):
+        yield Side.BID, snapshot['bids']
+        yield Side.ASK, snapshot['asks']
+        return
+    bids, asks = _find_array(snapshot, 'bids'), _find_array(snapshot, 'asks')
+    # Orders are matched lazily, so decoding is spread over the chunks.
+    yield Side.BID, (match.groups() for match in _ORDER_RE.finditer(
+            snapshot, bids, asks if asks > bids else len(snapshot)))
+    yield Side.ASK, (match.groups() for match in _ORDER_RE.finditer(
+            snapshot, asks, bids if bids > asks else len(snapshot)))
+
+
+class SnapshotLoader:
+    """Build an ``OrderBasedBook`` from a GDAX level-3 snapshot in chunks.
+
+    The snapshot is either decoded or the raw JSON text of the REST
+    response. Raw orders are decoded chunk by chunk as well, so a large
+    snapshot never has to be decoded in one go.
+
+    GDAX returns snapshot orders sorted best price first, so consecutive
+    orders at the same price are grouped and each price string is parsed
+    once per level rather than once per order, and each chunk is bulk
+    inserted with ``OrderBasedBook.add_levels``.
+
+    Args:
+        make_book (callable): Return an empty ``OrderBasedBook``.
+        parse_price (callable): Convert price string for the book.
+        parse_qty (callable): Convert size string for the book.
+        chunk_size (int): Orders handled between yields to the event loop.
+    """
+    def __init__(self,
+                 make_book=market_data.OrderBasedBook,
+                 parse_price=make_price,
+                 parse_qty=make_qty,
+                 chunk_size=5000):
+        self._make_book = make_book
+        self._parse_price = parse_price
+        self._parse_qty = parse_qty
+        self._chunk_size = max(int(chunk_size), 1)
+
+    def load(self, snapshot):
+        """Build book from snapshot in one go."""
+        steps = self._build(snapshot)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+
+    async def load_async(self, snapshot, loop=None):
+        """Build book from snapshot, yielding to the event loop between
+        chunks so other feeds keep being processed.
+        """
+        steps = self._build(snapshot)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+            await asyncio.sleep(0, loop=loop)
+
+    def _build(self, snapshot):
+        """Generator adding orders to a new book, yielding after each chunk.
+
+        The finished book is the generator's return value.
+        """
+        book = self._make_book()
+        for side, orders in _sides(snapshot):
+            orders = iter(orders)
+            while True:
+                chunk = list(itertools.islice(orders, self._chunk_size))
+                if not chunk:
+                    break
+                book.add_levels(side, self._group_levels(chunk))
+                yield
+        return book
+
+    def _group_levels(self, orders):
+        """Yield (price, [(order_id, qty)...]) for runs of equal price."""
+        parse_price, parse_qty = self._parse_price, self._parse_qty
+        for price_str, level in itertools.groupby(orders,
+                                                  key=lambda o: o[0]):
+            yield parse_price(price_str), [(o[2], parse_qty(o[1]))
+                                           for o in level]
@@ -1,20 +1,26 @@
-from .book import Book, Level
+from .book import Book, Level, LevelsView
+from .delta import LevelDelta
 from .order_based_book import OrderBasedBook, OrderBasedLevel
+from .price_level_book import PriceLevelBook
 from .trade import Trade
 from .update import Update
 from .status import Status
 from .subscriber import Subscriber
 from .gateway import Gateway
 from .playback import Playback
+from .ring_buffer import UpdateRing
 
 __all__ = [
     # Common-use
-    'Book', 'Level', 'Update', 'Status', 'Trade', 'Gateway',
+    'Book', 'Level', 'LevelsView', 'LevelDelta', 'Update', 'Status', 'Trade',
+    'Gateway',
     # Consumer-use
     'Subscriber',
     # Producer-use
     'OrderBasedBook',
     'OrderBasedLevel',
+    'PriceLevelBook',
+    'UpdateRing',
     # Playback
     'Playback'
 ]
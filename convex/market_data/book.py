@@ -1,3 +1,4 @@
+import collections.abc
 import itertools
 import operator
 
@@ -34,12 +35,69 @@ class Level:
         }
 
 
+def _identity(value):
+    return value
+
+
+def make_level_converter(price_units=None, qty_units=None):
+    """Return function copying a level into a ``Level`` snapshot.
+
+    Prices and quantities held as integer units of ``price_units`` and
+    ``qty_units`` (``common.price.FixedPoint``) are converted to ``Decimal``.
+    """
+    to_price = price_units.to_decimal if price_units else _identity
+    to_qty = qty_units.to_decimal if qty_units else _identity
+
+    def to_level(level):
+        return Level(to_price(level.price), to_qty(level.qty), level.orders)
+    return to_level
+
+
+class LevelsView(collections.abc.Sequence):
+    """Lazy, depth-limited sequence of levels.
+
+    Levels are only pulled from ``source`` the first time the view is read,
+    and at most ``depth`` of them are kept. Consumers that only look at the
+    top of the book never pay for copying the rest of it.
+
+    Args:
+        source (iterable): Levels ordered best first.
+        depth (int): Maximum number of levels to materialise, ``None`` for all.
+    """
+    __slots__ = '_source', '_depth', '_levels'
+
+    def __init__(self, source, depth=None):
+        self._source = source
+        self._depth = depth
+        self._levels = None
+
+    @property
+    def materialised(self):
+        """Whether levels have been pulled from the source."""
+        return self._levels is not None
+
+    def _materialise(self):
+        if self._levels is None:
+            self._levels = list(itertools.islice(self._source, self._depth))
+            self._source = None
+        return self._levels
+
+    def __getitem__(self, index):
+        return self._materialise()[index]
+
+    def __len__(self):
+        return len(self._materialise())
+
+    def __iter__(self):
+        return iter(self._materialise())
+
+
 class Book:
     __slots__ = '_bids', '_asks', '_sequence'
 
     def __init__(self, sequence, bids, asks):
-        self._bids = bids if bids else []
-        self._asks = asks if asks else []
+        self._bids = bids if bids is not None else []
+        self._asks = asks if asks is not None else []
         self._sequence = sequence
 
     @property
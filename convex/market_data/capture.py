@@ -0,0 +1,167 @@
+"""Append-only log of raw exchange feed messages.
+
+A capture holds every websocket frame exactly as received, before any
+decoding, and the snapshots books were rebuilt from, so a feed can be replayed
+message by message through its gateway.
+
+The file starts with a magic followed by the wall-clock and monotonic time
+when it was created. Each record is a little-endian ``(kind: uint8, receive
+time: float64, key length: uint16, data length: uint32)`` header followed by
+the UTF-8 key and data. Receive times are ``time.monotonic()`` values; add
+``CaptureReader.time_offset`` for wall-clock time. Frames have an empty key,
+snapshots are keyed by the exchange's product ID.
+
+Compressed files, e.g. written through
+``common.utils.compression.CompressedWriter``, are decompressed on reading.
+"""
+
+import struct
+import time
+
+import logbook
+
+from ..common.utils.compression import open_compressed
+
+log = logbook.Logger('MD')
+
+FRAME = 1
+SNAPSHOT = 2
+
+_MAGIC = b'CVXCAP01'
+# wall-clock time, monotonic time
+_HEADER = struct.Struct('<8sdd')
+_RECORD = struct.Struct('<BdHI')
+
+
+class CaptureRecord:
+    """Captured frame or snapshot."""
+    __slots__ = ('kind', 'time', 'key', 'data')
+
+    def __init__(self, kind, time, key, data):
+        self.kind = kind
+        self.time = time
+        self.key = key
+        self.data = data
+
+    def __repr__(self):
+        return 'CaptureRecord(kind={}, time={}, key={!r}, {} chars)'.format(
+                self.kind, self.time, self.key, len(self.data))
+
+
+class CaptureWriter:
+    """Append raw frames and snapshots to a capture file.
+
+    Args:
+        path: Capture file, appended to if it exists, or a binary file
+            object such as a ``CompressedWriter``, closed with the writer.
+        clock (callable): Source of receive times.
+    """
+    def __init__(self, path, clock=time.monotonic):
+        self._clock = clock
+        self._file = open(path, 'ab') if isinstance(path, str) else path
+        if self._file.tell() == 0:
+            self._file.write(_HEADER.pack(_MAGIC, time.time(), clock()))
+        self._records = 0
+
+    @property
+    def records(self):
+        """Number of records written."""
+        return self._records
+
+    def write_frame(self, data, time=None):
+        """Append websocket frame (``str`` or ``bytes``) received at time,
+        now if ``None``.
+        """
+        self._write(FRAME, time, b'', data)
+
+    def write_snapshot(self, key, data, time=None):
+        """Append snapshot of product key, serialized as ``str``."""
+        self._write(SNAPSHOT, time, key.encode(), data)
+
+    def _write(self, kind, time, key, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if time is None:
+            time = self._clock()
+        self._file.write(b''.join((
+            _RECORD.pack(kind, time, len(key), len(data)), key, data)))
+        self._records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    """Iterate over the records of a capture file.
+
+    A record cut short at the end of the file, e.g. by a crash of the
+    capturing process, ends the iteration and sets ``truncated``. Records
+    written after the last flush of a compressed file are lost that way.
+
+    Args:
+        path (str): Capture file, optionally compressed.
+    """
+    def __init__(self, path):
+        self._file = open_compressed(path)
+        data = self._file.read(_HEADER.size)
+        if len(data) < _HEADER.size or data[:len(_MAGIC)] != _MAGIC:
+            self._file.close()
+            raise ValueError('{} is not a capture file'.format(path))
+        _, wall_time, monotonic_time = _HEADER.unpack(data)
+        self._time_offset = wall_time - monotonic_time
+        self._truncated = False
+
+    @property
+    def time_offset(self):
+        """Seconds to add to receive times for wall-clock time."""
+        return self._time_offset
+
+    @property
+    def truncated(self):
+        """Whether the file ended in the middle of a record."""
+        return self._truncated
+
+    def __iter__(self):
+        try:
+            yield from self._read_records()
+        except EOFError:
+            # Compressed data ends after the last flush point.
+            self._truncated = True
+            log.warn('Capture ends with an unfinished compressed block')
+
+    def _read_records(self):
+        read = self._file.read
+        header_size = _RECORD.size
+        unpack = _RECORD.unpack
+        while True:
+            header = read(header_size)
+            if len(header) < header_size:
+                break
+            kind, time, key_length, length = unpack(header)
+            body = read(key_length + length)
+            if len(body) < key_length + length:
+                break
+            yield CaptureRecord(kind, time,
+                                str(body[:key_length], 'utf-8'),
+                                str(body[key_length:], 'utf-8'))
+        if header:
+            self._truncated = True
+            log.warn('Capture ends with a partial record')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
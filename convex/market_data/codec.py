@@ -0,0 +1,202 @@
+"""Compact binary encoding of ``Update`` objects.
+
+Used to pass updates between processes instead of ``Update.dump``'s nested
+dicts of strings. Prices and quantities are stored as 64-bit integer units of
+``common.price.PRICE_UNITS`` and ``QTY_UNITS``. An encoded update is laid out
+as, all little-endian:
+
+- header: version, status, flags, book sequence, timestamp and the number of
+  bids, asks, trades and deltas, followed by the instrument name
+- levels: ``(price, qty, orders)`` for each bid, then each ask
+- trades: ``(aggressor, price, qty, sequence, time)``, then maker and taker
+  order ids
+- deltas: ``(side, price, qty, orders)``, only if the deltas flag is set
+
+Levels are fixed-size records unpacked in one go; with
+``decode_update(data, lazy=True)`` they are only converted to ``Level``
+objects when a consumer reads the book.
+"""
+
+import datetime as dt
+import functools
+import itertools
+import math
+import struct
+
+from convex.common.instrument import Instrument
+from convex.common.price import PRICE_UNITS, QTY_UNITS
+from convex.common.side import Side
+
+from .book import Book, Level, LevelsView
+from .delta import LevelDelta
+from .status import Status
+from .trade import Trade
+from .update import Update
+
+VERSION = 1
+
+_HAS_DELTAS = 0x01
+
+# version, status, flags, sequence, timestamp, #bids, #asks, #trades, #deltas
+_HEADER = struct.Struct('<BBBqdHHHH')
+_LEVEL = struct.Struct('<qqI')
+_TRADE = struct.Struct('<Bqqqd')
+_DELTA = struct.Struct('<BqqI')
+_ID_LENGTH = struct.Struct('<H')
+_NO_ID = 0xFFFF
+
+_to_price_units = functools.lru_cache(maxsize=4096)(PRICE_UNITS.to_units)
+_to_price = functools.lru_cache(maxsize=4096)(PRICE_UNITS.to_decimal)
+_to_qty_units = QTY_UNITS.to_units
+_to_qty = QTY_UNITS.to_decimal
+
+
+@functools.lru_cache(maxsize=64)
+def _dump_instrument(instrument):
+    name = str(instrument).encode()
+    return bytes((len(name),)) + name
+
+
+@functools.lru_cache(maxsize=64)
+def _load_instrument(name):
+    return Instrument.from_string(name.decode())
+
+
+@functools.lru_cache(maxsize=64)
+def _levels_struct(count):
+    return struct.Struct('<' + 'qqI' * count)
+
+
+def _dump_time(time):
+    return time.timestamp() if time is not None else math.nan
+
+
+def _load_time(value):
+    if math.isnan(value):
+        return None
+    return dt.datetime.fromtimestamp(value, tz=dt.timezone.utc)
+
+
+def _dump_id(order_id):
+    if order_id is None:
+        return _ID_LENGTH.pack(_NO_ID)
+    data = order_id.encode()
+    return _ID_LENGTH.pack(len(data)) + data
+
+
+def _load_id(view, offset):
+    """Return (order id, offset past it)."""
+    length, = _ID_LENGTH.unpack_from(view, offset)
+    offset += _ID_LENGTH.size
+    if length == _NO_ID:
+        return None, offset
+    return str(view[offset:offset + length], 'utf-8'), offset + length
+
+
+def encode_update(update, depth=None):
+    """Return update encoded as bytes.
+
+    Args:
+        update (Update): Update to encode.
+        depth (int): Levels per side to include, ``None`` for all.
+    """
+    book = update.book
+    bids = list(itertools.islice(book.bids, depth))
+    asks = list(itertools.islice(book.asks, depth))
+    trades = update.trades
+    deltas = update.deltas
+    parts = [
+        _HEADER.pack(VERSION,
+                     update.status.value,
+                     _HAS_DELTAS if deltas is not None else 0,
+                     book.sequence,
+                     _dump_time(update.timestamp),
+                     len(bids),
+                     len(asks),
+                     len(trades),
+                     len(deltas) if deltas is not None else 0),
+        _dump_instrument(update.instrument),
+    ]
+
+    to_price_units, to_qty_units = _to_price_units, _to_qty_units
+    fields = []
+    append = fields.append
+    for lvl in itertools.chain(bids, asks):
+        append(to_price_units(lvl.price))
+        append(to_qty_units(lvl.qty))
+        append(lvl.orders)
+    parts.append(_levels_struct(len(bids) + len(asks)).pack(*fields))
+
+    for t in trades:
+        parts.append(_TRADE.pack(ord(t.aggressor.value),
+                                 _to_price_units(t.price),
+                                 _to_qty_units(t.qty),
+                                 t.sequence,
+                                 _dump_time(t.time)))
+        parts.append(_dump_id(t.maker_id))
+        parts.append(_dump_id(t.taker_id))
+
+    for d in deltas or ():
+        parts.append(_DELTA.pack(ord(d.side.value),
+                                 _to_price_units(d.price),
+                                 _to_qty_units(d.qty),
+                                 d.orders))
+    return b''.join(parts)
+
+
+def _load_levels(fields, start, count, lazy):
+    """Make ``count`` levels from flat (price, qty, orders) fields."""
+    to_price, to_qty = _to_price, _to_qty
+    levels = (Level(to_price(fields[i]), to_qty(fields[i + 1]), fields[i + 2])
+              for i in range(start, start + 3 * count, 3))
+    return LevelsView(levels) if lazy else list(levels)
+
+
+def decode_update(data, lazy=False):
+    """Return ``Update`` from bytes made by ``encode_update``.
+
+    Args:
+        data: Bytes-like encoded update.
+        lazy (bool): Only convert book levels to ``Level`` objects when they
+            are first read.
+    """
+    view = memoryview(data)
+    (version, status, flags, sequence, timestamp, n_bids, n_asks, n_trades,
+     n_deltas) = _HEADER.unpack_from(view, 0)
+    if version != VERSION:
+        raise ValueError('Unsupported update encoding version {}'.format(
+            version))
+    offset = _HEADER.size
+    end = offset + 1 + view[offset]
+    instrument = _load_instrument(bytes(view[offset + 1:end]))
+
+    fields = _levels_struct(n_bids + n_asks).unpack_from(view, end)
+    bids = _load_levels(fields, 0, n_bids, lazy)
+    asks = _load_levels(fields, 3 * n_bids, n_asks, lazy)
+
+    offset = end + (n_bids + n_asks) * _LEVEL.size
+    trades = []
+    for _ in range(n_trades):
+        aggressor, price, qty, trade_sequence, time = \
+            _TRADE.unpack_from(view, offset)
+        maker_id, offset = _load_id(view, offset + _TRADE.size)
+        taker_id, offset = _load_id(view, offset)
+        trades.append(Trade(Side(chr(aggressor)), _to_price(price),
+                            _to_qty(qty), trade_sequence, maker_id, taker_id,
+                            _load_time(time)))
+
+    deltas = None
+    if flags & _HAS_DELTAS:
+        end = offset + n_deltas * _DELTA.size
+        deltas = [LevelDelta(Side(chr(side)), _to_price(price), _to_qty(qty),
+                             orders)
+                  for side, price, qty, orders
+                  in _DELTA.iter_unpack(view[offset:end])]
+
+    return Update(
+            instrument=instrument,
+            book=Book(sequence, bids, asks),
+            trades=trades,
+            status=Status(status),
+            timestamp=_load_time(timestamp),
+            deltas=deltas)
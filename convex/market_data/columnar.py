@@ -0,0 +1,475 @@
+"""Columnar recording format.
+
+A recording holds the updates of one instrument in blocks of up to
+``block_rows`` rows. Each block stores every column separately and, by
+default, zlib-compressed, so readers only decompress the columns they ask
+for. A footer indexes blocks by time and sequence, letting readers skip
+blocks outside a requested time or sequence range.
+
+Layout, all little-endian::
+
+    b'CVXCOL01' | header length: uint32 | JSON header
+    block*      | b'CBLK' | block length: uint32 | rows: uint32
+                | trades: uint32 | column lengths: uint32 * len(COLUMNS)
+                | column data
+    index       | (offset, rows, first time, last time, first sequence,
+                |  last sequence) per block
+    b'CVXIDX01' | index offset: uint64 | blocks: uint32
+
+Book columns (``bid_price``, ``bid_qty``, ...) hold ``depth`` values per row,
+best level first, padded with zeros. Prices and quantities are integer units
+of ``common.price.PRICE_UNITS`` and ``QTY_UNITS``. Trade columns have one
+value per trade, ``trade_row`` being the row of the update carrying it.
+
+A recording without footer, e.g. after a crash, is read by scanning blocks.
+"""
+
+from array import array
+import bisect
+import datetime as dt
+import itertools
+import json
+import math
+import struct
+import sys
+import zlib
+
+from convex.common.instrument import Instrument
+from convex.common.price import PRICE_UNITS, QTY_UNITS
+from convex.common.side import Side
+
+from .book import Book, Level
+from .status import Status
+from .trade import Trade
+from .update import Update
+
+_MAGIC = b'CVXCOL01'
+_INDEX_MAGIC = b'CVXIDX01'
+_BLOCK_MAGIC = b'CBLK'
+
+# name -> array typecode, 's' for newline terminated strings
+COLUMNS = (
+    ('timestamp', 'd'),
+    ('sequence', 'q'),
+    ('status', 'B'),
+    ('bid_price', 'q'),
+    ('bid_qty', 'q'),
+    ('bid_orders', 'I'),
+    ('ask_price', 'q'),
+    ('ask_qty', 'q'),
+    ('ask_orders', 'I'),
+    ('trade_row', 'I'),
+    ('trade_aggressor', 'B'),
+    ('trade_price', 'q'),
+    ('trade_qty', 'q'),
+    ('trade_sequence', 'q'),
+    ('trade_time', 'd'),
+    ('trade_maker_id', 's'),
+    ('trade_taker_id', 's'),
+)
+_TYPECODES = dict(COLUMNS)
+_BOOK_COLUMNS = {'bid_price', 'bid_qty', 'bid_orders',
+                 'ask_price', 'ask_qty', 'ask_orders'}
+
+_HEADER_LENGTH = struct.Struct('<I')
+_BLOCK = struct.Struct('<4sIII' + 'I' * len(COLUMNS))
+_INDEX_ENTRY = struct.Struct('<QIddqq')
+_TRAILER = struct.Struct('<8sQI')
+
+_SWAP = sys.byteorder != 'little'
+
+# range key column -> BlockInfo attributes bounding it
+_BLOCK_BOUNDS = {
+    'timestamp': ('first_time', 'last_time'),
+    'sequence': ('first_sequence', 'last_sequence'),
+}
+
+
+def _to_time(timestamp):
+    return timestamp.timestamp() if timestamp is not None else math.nan
+
+
+def _from_time(value):
+    if math.isnan(value):
+        return None
+    return dt.datetime.fromtimestamp(value, tz=dt.timezone.utc)
+
+
+def _make_range(start, end):
+    """Return (key column, start, end) of a range of times or sequences."""
+    bounds = [value for value in (start, end) if value is not None]
+    if not bounds:
+        return None, -math.inf, math.inf
+    if all(isinstance(value, dt.datetime) for value in bounds):
+        key, convert = 'timestamp', _to_time
+    elif all(isinstance(value, int) for value in bounds):
+        key, convert = 'sequence', int
+    else:
+        raise ValueError('start and end must both be datetimes or '
+                         'both be sequence numbers')
+    return (key,
+            convert(start) if start is not None else -math.inf,
+            convert(end) if end is not None else math.inf)
+
+
+def _pack_column(typecode, values, compress):
+    if typecode == 's':
+        data = ''.join(value + '\n' for value in values).encode()
+    else:
+        column = array(typecode, values)
+        if _SWAP:
+            column.byteswap()
+        data = column.tobytes()
+    return zlib.compress(data, 6) if compress else data
+
+
+def _unpack_column(typecode, data, compress):
+    if compress:
+        data = zlib.decompress(data)
+    if typecode == 's':
+        return data.decode().split('\n')[:-1]
+    column = array(typecode)
+    column.frombytes(data)
+    if _SWAP:
+        column.byteswap()
+    return column
+
+
+class ColumnarWriter:
+    """Write updates of one instrument to a columnar recording.
+
+    A block is indexed only if ``write`` of the file object accepts all of
+    its bytes. ``common.utils.BackgroundWriter`` accepts nothing when its
+    queue is full or after a failed write; such blocks are counted in
+    ``dropped_blocks`` and left out of the index.
+
+    Args:
+        path: Output file, truncated if it exists, or a new binary file
+            object, closed with the writer. Its ``write`` must return the
+            number of bytes accepted.
+        instrument: Recorded instrument.
+        depth (int): Levels per side to record.
+        block_rows (int): Updates per block.
+        compress (bool): zlib-compress columns.
+    """
+    def __init__(self, path, instrument, depth=10, block_rows=1024,
+                 compress=True):
+        self._file = open(path, 'wb') if isinstance(path, str) else path
+        self._depth = depth
+        self._block_rows = max(int(block_rows), 1)
+        self._compress = compress
+        self._index = []
+        self._columns = {name: [] for name, _ in COLUMNS}
+        self._rows = 0
+        self._dropped_blocks = 0
+        self._closed = False
+
+        header = json.dumps({
+            'instrument': str(instrument),
+            'depth': depth,
+            'compress': compress,
+            'columns': [name for name, _ in COLUMNS],
+        }).encode()
+        self._file.write(_MAGIC + _HEADER_LENGTH.pack(len(header)) + header)
+
+    @property
+    def blocks(self):
+        """Number of blocks written."""
+        return len(self._index)
+
+    @property
+    def dropped_blocks(self):
+        """Number of blocks the file did not accept."""
+        return self._dropped_blocks
+
+    def write(self, update):
+        """Append update, writing a block when it is full."""
+        cols = self._columns
+        row = self._rows
+        cols['timestamp'].append(_to_time(update.timestamp))
+        cols['sequence'].append(update.sequence)
+        cols['status'].append(update.status.value)
+        book = update.book
+        for side, levels in (('bid', book.bids), ('ask', book.asks)):
+            prices = cols[side + '_price']
+            qtys = cols[side + '_qty']
+            orders = cols[side + '_orders']
+            n = 0
+            for lvl in itertools.islice(levels, self._depth):
+                prices.append(PRICE_UNITS.to_units(lvl.price))
+                qtys.append(QTY_UNITS.to_units(lvl.qty))
+                orders.append(lvl.orders)
+                n += 1
+            padding = (0,) * (self._depth - n)
+            prices.extend(padding)
+            qtys.extend(padding)
+            orders.extend(padding)
+        for t in update.trades:
+            cols['trade_row'].append(row)
+            cols['trade_aggressor'].append(ord(t.aggressor.value))
+            cols['trade_price'].append(PRICE_UNITS.to_units(t.price))
+            cols['trade_qty'].append(QTY_UNITS.to_units(t.qty))
+            cols['trade_sequence'].append(t.sequence)
+            cols['trade_time'].append(_to_time(t.time))
+            cols['trade_maker_id'].append(t.maker_id or '')
+            cols['trade_taker_id'].append(t.taker_id or '')
+        self._rows += 1
+        if self._rows >= self._block_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered updates as a block."""
+        if not self._rows:
+            return
+        cols = self._columns
+        data = [_pack_column(typecode, cols[name], self._compress)
+                for name, typecode in COLUMNS]
+        block_length = sum(map(len, data)) + _BLOCK.size
+        offset = self._file.tell()
+        header = _BLOCK.pack(_BLOCK_MAGIC, block_length, self._rows,
+                             len(cols['trade_row']), *map(len, data))
+        if self._file.write(header + b''.join(data)) == block_length:
+            self._index.append((offset, self._rows,
+                                cols['timestamp'][0], cols['timestamp'][-1],
+                                cols['sequence'][0], cols['sequence'][-1]))
+        else:
+            self._dropped_blocks += 1
+        self._file.flush()
+        for column in cols.values():
+            column.clear()
+        self._rows = 0
+
+    def close(self):
+        """Flush remaining updates and write the index footer."""
+        if self._closed:
+            return
+        self.flush()
+        index_offset = self._file.tell()
+        footer = [_INDEX_ENTRY.pack(*entry) for entry in self._index]
+        footer.append(_TRAILER.pack(_INDEX_MAGIC, index_offset,
+                                    len(self._index)))
+        self._file.write(b''.join(footer))
+        self._file.close()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BlockInfo:
+    """Index entry of a block."""
+    __slots__ = ('offset', 'rows', 'first_time', 'last_time',
+                 'first_sequence', 'last_sequence')
+
+    def __init__(self, offset, rows, first_time, last_time,
+                 first_sequence, last_sequence):
+        self.offset = offset
+        self.rows = rows
+        self.first_time = first_time
+        self.last_time = last_time
+        self.first_sequence = first_sequence
+        self.last_sequence = last_sequence
+
+
+class ColumnarReader:
+    """Read a columnar recording.
+
+    Args:
+        path (str): Recording written by ``ColumnarWriter``.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        magic = self._file.read(len(_MAGIC))
+        if magic != _MAGIC:
+            raise ValueError('{} is not a columnar recording'.format(path))
+        length, = _HEADER_LENGTH.unpack(self._file.read(_HEADER_LENGTH.size))
+        header = json.loads(self._file.read(length).decode())
+        self._data_start = self._file.tell()
+        self._instrument = Instrument.from_string(header['instrument'])
+        self._depth = header['depth']
+        self._compress = header['compress']
+        self._blocks = self._read_index()
+
+    @property
+    def instrument(self):
+        return self._instrument
+
+    @property
+    def depth(self):
+        """Levels per side recorded."""
+        return self._depth
+
+    @property
+    def blocks(self):
+        """List of ``BlockInfo``."""
+        return self._blocks
+
+    @property
+    def rows(self):
+        """Number of recorded updates."""
+        return sum(block.rows for block in self._blocks)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, columns=None, start=None, end=None):
+        """Return dict of column name to values.
+
+        Book columns hold ``depth`` values per row. ``trade_row`` refers to
+        rows of the returned columns.
+
+        With ``start`` or ``end`` only updates in ``[start, end)`` are read,
+        by timestamp for ``datetime`` bounds or by book sequence for ``int``
+        bounds, as in ``Playback``. Recordings are assumed to be in timestamp
+        and sequence order, so blocks are found by bisecting the index.
+
+        Args:
+            columns: Column names to read, ``None`` for all.
+            start: First timestamp or sequence to read.
+            end: Timestamp or sequence to stop at.
+        """
+        names = [name for name, _ in COLUMNS] if columns is None \
+            else list(columns)
+        for name in names:
+            if name not in _TYPECODES:
+                raise ValueError('Unknown column \'{}\''.format(name))
+        key, lo_key, hi_key = _make_range(start, end)
+        wanted = set(names)
+        blocks = self._blocks
+        if key is not None:
+            wanted.add(key)
+            first, last = _BLOCK_BOUNDS[key]
+            lasts = [getattr(block, last) for block in blocks]
+            blocks = blocks[bisect.bisect_left(lasts, lo_key):]
+        if wanted & {name for name, _ in COLUMNS if name.startswith('trade')}:
+            wanted.add('trade_row')
+
+        result = {name: (array(_TYPECODES[name]) if _TYPECODES[name] != 's'
+                         else []) for name in names}
+        rows_out = 0
+        for block in blocks:
+            if key is not None and getattr(block, first) >= hi_key:
+                break
+            data = self._read_block(block, wanted)
+            lo, hi = 0, block.rows
+            if key is not None:
+                keys = data[key]
+                lo = bisect.bisect_left(keys, lo_key)
+                hi = bisect.bisect_left(keys, hi_key)
+            if 'trade_row' in data:
+                trade_rows = data['trade_row']
+                t_lo = bisect.bisect_left(trade_rows, lo)
+                t_hi = bisect.bisect_left(trade_rows, hi)
+            for name in names:
+                values = data[name]
+                if name in _BOOK_COLUMNS:
+                    values = values[lo * self._depth:hi * self._depth]
+                elif name == 'trade_row':
+                    values = array('I', (r - lo + rows_out
+                                         for r in trade_rows[t_lo:t_hi]))
+                elif name.startswith('trade'):
+                    values = values[t_lo:t_hi]
+                else:
+                    values = values[lo:hi]
+                result[name].extend(values)
+            rows_out += hi - lo
+        return result
+
+    def updates(self, start=None, end=None):
+        """Yield recorded ``Update`` objects, optionally within a time or
+        sequence range (see ``read``).
+        """
+        cols = self.read(start=start, end=end)
+        depth = self._depth
+        to_price, to_qty = PRICE_UNITS.to_decimal, QTY_UNITS.to_decimal
+        trade_idx = 0
+        n_trades = len(cols['trade_row'])
+
+        def levels(side, row):
+            prices = cols[side + '_price']
+            qtys = cols[side + '_qty']
+            orders = cols[side + '_orders']
+            return [Level(to_price(prices[i]), to_qty(qtys[i]), orders[i])
+                    for i in range(row * depth, (row + 1) * depth)
+                    if prices[i]]
+
+        for row in range(len(cols['sequence'])):
+            trades = []
+            while (trade_idx < n_trades
+                   and cols['trade_row'][trade_idx] == row):
+                i = trade_idx
+                trades.append(Trade(
+                        Side(chr(cols['trade_aggressor'][i])),
+                        to_price(cols['trade_price'][i]),
+                        to_qty(cols['trade_qty'][i]),
+                        cols['trade_sequence'][i],
+                        cols['trade_maker_id'][i] or None,
+                        cols['trade_taker_id'][i] or None,
+                        _from_time(cols['trade_time'][i])))
+                trade_idx += 1
+            sequence = cols['sequence'][row]
+            yield Update(
+                    instrument=self._instrument,
+                    book=Book(sequence, levels('bid', row),
+                              levels('ask', row)),
+                    trades=trades,
+                    status=Status(cols['status'][row]),
+                    timestamp=_from_time(cols['timestamp'][row]))
+
+    def _read_block(self, block, names):
+        f = self._file
+        f.seek(block.offset)
+        header = _BLOCK.unpack(f.read(_BLOCK.size))
+        lengths = header[4:]
+        data = {}
+        offset = block.offset + _BLOCK.size
+        for (name, typecode), length in zip(COLUMNS, lengths):
+            if name in names:
+                f.seek(offset)
+                data[name] = _unpack_column(typecode, f.read(length),
+                                            self._compress)
+            offset += length
+        return data
+
+    def _read_index(self):
+        f = self._file
+        f.seek(0, 2)
+        size = f.tell()
+        if size - self._data_start >= _TRAILER.size:
+            f.seek(size - _TRAILER.size)
+            magic, offset, count = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic == _INDEX_MAGIC:
+                f.seek(offset)
+                return [BlockInfo(*_INDEX_ENTRY.unpack(
+                            f.read(_INDEX_ENTRY.size)))
+                        for _ in range(count)]
+        return self._scan_blocks(size)
+
+    def _scan_blocks(self, size):
+        """Rebuild the index of a recording without footer."""
+        blocks = []
+        offset = self._data_start
+        while offset + _BLOCK.size <= size:
+            self._file.seek(offset)
+            header = _BLOCK.unpack(self._file.read(_BLOCK.size))
+            magic, block_length, rows = header[:3]
+            if magic != _BLOCK_MAGIC or offset + block_length > size:
+                break  # Truncated block.
+            info = BlockInfo(offset, rows, 0.0, 0.0, 0, 0)
+            data = self._read_block(info, {'timestamp', 'sequence'})
+            info.first_time, info.last_time = (data['timestamp'][0],
+                                               data['timestamp'][-1])
+            info.first_sequence, info.last_sequence = (data['sequence'][0],
+                                                       data['sequence'][-1])
+            blocks.append(info)
+            offset += block_length
+        return blocks
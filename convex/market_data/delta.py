@@ -0,0 +1,29 @@
+from collections import namedtuple
+
+
+# New state of one price level. A level with no orders has been removed.
+LevelDelta = namedtuple('LevelDelta', ['side', 'price', 'qty', 'orders'])
+
+
+def merge_deltas(older, newer):
+    """Combine two consecutive delta lists into one.
+
+    ``None`` means deltas are unavailable (e.g. the book was rebuilt), which
+    the result inherits from either side.
+    """
+    if older is None or newer is None:
+        return None
+    if not older:
+        return newer
+    merged = {(d.side, d.price): d for d in older}
+    merged.update(((d.side, d.price), d) for d in newer)
+    return list(merged.values())
+
+
+def dump_delta(delta):
+    return {
+        'side': str(delta.side),
+        'price': str(delta.price),
+        'qty': str(delta.qty),
+        'orders': delta.orders,
+    }
@@ -0,0 +1,100 @@
+import asyncio
+
+import logbook
+
+from ..common.utils import LatencyHistogram
+from .update import Update
+
+log = logbook.Logger('MD')
+
+
+class Delivery:
+    """Deliver updates to one subscriber callback.
+
+    Updates are put into a single conflating slot and handed to the callback
+    by one long-lived coroutine, so a slow subscriber holds at most one
+    pending update instead of piling up tasks. When an update replaces a
+    pending one its trades and deltas are carried over, so nothing is lost.
+
+    Lag is the time from the oldest undelivered update being put until the
+    callback is invoked with it.
+
+    Args:
+        callback: Coroutine function accepting a ``market_data.Update``.
+        loop: Event loop running the delivery coroutine.
+    """
+    def __init__(self, callback, loop):
+        self._callback = callback
+        self._loop = loop
+        self._pending = None
+        self._pending_since = 0.0
+        self._waiter = None
+        self._task = None
+        self._delivered = 0
+        self._conflated = 0
+        self._lag = LatencyHistogram()
+
+    @property
+    def callback(self):
+        return self._callback
+
+    @property
+    def delivered(self):
+        """Number of updates handed to the callback."""
+        return self._delivered
+
+    @property
+    def conflated(self):
+        """Number of updates replaced before they were delivered."""
+        return self._conflated
+
+    @property
+    def lag(self):
+        """``LatencyHistogram`` of delivery lag."""
+        return self._lag
+
+    def has_pending(self):
+        """Whether an update is waiting to be delivered."""
+        return self._pending is not None
+
+    def put(self, update):
+        """Queue update for delivery, replacing any pending update."""
+        pending = self._pending
+        if pending is None:
+            self._pending_since = self._loop.time()
+        else:
+            self._conflated += 1
+            update = Update.conflate(pending, update)
+        self._pending = update
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run(), loop=self._loop)
+        elif self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def close(self):
+        """Stop delivery coroutine, dropping any pending update.
+
+        Returns the cancelled task, ``None`` if there was none.
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+        self._pending = None
+        return task
+
+    async def _run(self):
+        while True:
+            if self._pending is None:
+                self._waiter = self._loop.create_future()
+                await self._waiter
+                self._waiter = None
+            update, self._pending = self._pending, None
+            self._lag.record(self._loop.time() - self._pending_since)
+            self._delivered += 1
+            try:
+                await self._callback(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('[{}] Update callback {} failed',
+                              update.instrument, self._callback)
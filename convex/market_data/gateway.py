@@ -1,27 +1,57 @@
 import asyncio
 from collections import defaultdict
+import functools
 
 import logbook
 
 from . import Book, Status, Update
+from .dispatcher import Delivery
 
 log = logbook.Logger('MD')
 
 
 class Gateway:
     class InstrumentHandler:
-        def __init__(self):
+        def __init__(self, book_depth=None, lazy_book=False,
+                     snapshot_books=False, book_deltas=False):
+            self._book_depth = book_depth
+            self._lazy_book = lazy_book
+            self._snapshot_books = snapshot_books
+            self._book_deltas = book_deltas
             self._book = None
+            self._delta_book = None  # book deltas are taken from
             self._sequence = -1
             self._trades = []
             self._status = Status.UNKNOWN
+            self._timestamp = 0
+            self._timestamp_parser = None
+
+        @property
+        def timestamp(self):
+            """Latest timestamp, raw if a parser was given with it."""
+            return self._timestamp
 
         def set_status(self, status):
             self._status = status
 
+        def set_timestamp(self, timestamp, parser=None):
+            self._timestamp = timestamp
+            self._timestamp_parser = parser
+
         def make_book(self):
+            if self._book and self._snapshot_books:
+                return self.make_aggregated_book()
+            elif self._book:
+                return self._book.make_book(self._sequence,
+                                            depth=self._book_depth,
+                                            lazy=self._lazy_book)
+            else:
+                return Book(-1, [], [])
+
+        def make_aggregated_book(self):
             if self._book:
-                return self._book.make_book(self._sequence)
+                return self._book.make_aggregated_book(self._sequence,
+                                                       depth=self._book_depth)
             else:
                 return Book(-1, [], [])
 
@@ -35,20 +65,60 @@ class Gateway:
         def take_update(self):
             trades = self._trades.copy()
             self._trades.clear()
-            return self.make_book(), trades, self._status
-
-    def __init__(self, loop=None):
+            return trades, self._status, self._take_deltas()
+
+        def _take_deltas(self):
+            book = self._book
+            if not self._book_deltas or book is None:
+                return None
+            deltas = book.take_deltas()
+            if book is not self._delta_book:
+                # New book, consumers start over from its full snapshot.
+                self._delta_book = book
+                return None
+            return deltas
+
+    def __init__(self, loop=None, *, book_depth=None, lazy_book=False,
+                 snapshot_books=False, book_deltas=False):
+        """
+        Args:
+            loop: Event loop.
+            book_depth (int): Number of levels per side to publish, ``None``
+                to publish the full book.
+            lazy_book (bool): Publish books whose ``Level`` objects are only
+                built when a consumer first reads them. Prices and
+                quantities are still captured at publish time.
+            snapshot_books (bool): Always publish books of copied ``Level``
+                snapshots, which stay valid while the book keeps changing
+                (e.g. on another thread).
+            book_deltas (bool): Attach ``LevelDelta`` lists of levels changed
+                since the previous publish to updates. Books must be made
+                with ``track_deltas`` set.
+        """
         self._loop = loop if loop else asyncio.get_event_loop()
-        self._callbacks = defaultdict(set)  # instrument -> {callbacks}
-        self._handlers = defaultdict(Gateway.InstrumentHandler)
-        self._updated = set()
-        self._timestamp = 0
+        # instrument -> {callback: Delivery}
+        self._callbacks = defaultdict(dict)
+        # instrument -> {callback: Delivery} for aggregated (level-2) books
+        self._aggregated_callbacks = defaultdict(dict)
+        self._handlers = defaultdict(functools.partial(
+                Gateway.InstrumentHandler,
+                book_depth=book_depth,
+                lazy_book=lazy_book,
+                snapshot_books=snapshot_books,
+                book_deltas=book_deltas))
+        self._book_deltas = book_deltas
+        self._updated = set()  # instruments changed since last publish
 
     @property
     def loop(self):
         """Event loop."""
         return self._loop
 
+    @property
+    def book_deltas(self):
+        """Whether updates carry book deltas."""
+        return self._book_deltas
+
     async def launch(self):
         """Start running gateway."""
         raise NotImplementedError()
@@ -57,20 +127,75 @@ class Gateway:
         """Have gateway subscribe to data for instrument."""
         raise NotImplementedError()
 
-    def register(self, instrument, on_update):
+    def register(self, instrument, on_update, aggregated=False):
         """Register update callback for instrument.
 
         ``on_update`` must be a coroutine accepting a ``market_data.Update`` as
-        the only paramemter.
+        the only paramemter. Each callback is fed by its own delivery
+        coroutine; if it is still busy when new updates are published, they
+        are conflated into the latest one.
+
+        When ``aggregated`` is set, updates carry books of plain price/qty
+        ``Level`` snapshots instead of order-based levels.
         """
-        cbs = self._callbacks[instrument]
-        if not cbs:
+        if not self.is_registered(instrument):
             self.subscribe(instrument)
-        cbs.add(on_update)
-
-    def set_timestamp(self, timestamp):
-        """Update gateway timestamp."""
-        self._timestamp = timestamp
+        callbacks = (self._aggregated_callbacks if aggregated
+                     else self._callbacks)[instrument]
+        if on_update not in callbacks:
+            callbacks[on_update] = Delivery(on_update, self._loop)
+
+    def unregister(self, instrument, on_update):
+        """Remove update callback for instrument."""
+        for callbacks in (self._callbacks, self._aggregated_callbacks):
+            delivery = callbacks.get(instrument, {}).pop(on_update, None)
+            if delivery is not None:
+                delivery.close()
+
+    async def close(self):
+        """Unregister all callbacks and wait for their delivery coroutines
+        to finish. Pending updates are dropped."""
+        tasks = []
+        for callbacks in (self._callbacks, self._aggregated_callbacks):
+            for deliveries in callbacks.values():
+                tasks.extend(delivery.close()
+                             for delivery in deliveries.values())
+            callbacks.clear()
+        tasks = [task for task in tasks if task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True,
+                                 loop=self._loop)
+
+    def delivery_stats(self):
+        """Per instrument list of delivery stats for each callback."""
+        stats = defaultdict(list)
+        for callbacks in (self._callbacks, self._aggregated_callbacks):
+            for instrument, deliveries in callbacks.items():
+                stats[instrument].extend({
+                    'callback': delivery.callback,
+                    'delivered': delivery.delivered,
+                    'conflated': delivery.conflated,
+                    'pending': delivery.has_pending(),
+                    'lag': delivery.lag,
+                } for delivery in deliveries.values())
+        return dict(stats)
+
+    def is_registered(self, instrument):
+        """Whether any callback is registered for instrument."""
+        return bool(self._callbacks.get(instrument)
+                    or self._aggregated_callbacks.get(instrument))
+
+    def wants_aggregated(self, instrument):
+        """Whether any callback wants aggregated books for instrument."""
+        return bool(self._aggregated_callbacks.get(instrument))
+
+    def set_timestamp(self, instrument, timestamp, parser=None):
+        """Update timestamp of instrument's next update.
+
+        If ``parser`` is given, ``timestamp`` is kept raw and only parsed
+        when a consumer reads ``Update.timestamp``.
+        """
+        self._handlers[instrument].set_timestamp(timestamp, parser)
 
     def add_trade(self, instrument, trade):
         """Add trade."""
@@ -89,17 +214,42 @@ class Gateway:
         self._handlers[instrument].set_status(status)
 
     def publish(self):
-        """PUblish updates"""
-        for instrument, handler in self._handlers.items():
-            book, trades, status = handler.take_update()
-            update = Update(instrument=instrument,
-                            book=book,
-                            trades=trades,
-                            status=status,
-                            timestamp=self._timestamp)
-            self._publish_update(update)
-
-    def _publish_update(self, update):
+        """Publish updates of instruments changed since the last publish."""
+        if not self._updated:
+            return
+        updated, self._updated = self._updated, set()
+        for instrument in updated:
+            handler = self._handlers[instrument]
+            trades, status, deltas = handler.take_update()
+            if self._callbacks.get(instrument):
+                update = Update(instrument=instrument,
+                                book=handler.make_book(),
+                                trades=trades,
+                                status=status,
+                                timestamp=handler._timestamp,
+                                timestamp_parser=handler._timestamp_parser,
+                                deltas=deltas)
+                self._publish_update(update, self._callbacks)
+            if self._aggregated_callbacks.get(instrument):
+                update = Update(instrument=instrument,
+                                book=handler.make_aggregated_book(),
+                                trades=trades,
+                                status=status,
+                                timestamp=handler._timestamp,
+                                timestamp_parser=handler._timestamp_parser,
+                                deltas=deltas)
+                self._publish_update(update, self._aggregated_callbacks)
+
+    def _publish_received(self, update):
+        """Publish update received ready-made, e.g. from another process, to
+        all callbacks of its instrument."""
+        instrument = update.instrument
+        if instrument in self._callbacks:
+            self._publish_update(update, self._callbacks)
+        if instrument in self._aggregated_callbacks:
+            self._publish_update(update, self._aggregated_callbacks)
+
+    def _publish_update(self, update, callbacks):
         """Publish update to subscribers."""
-        cbs = [cb(update) for cb in self._callbacks[update.instrument]]
-        asyncio.ensure_future(*cbs, loop=self._loop)
+        for delivery in callbacks[update.instrument].values():
+            delivery.put(update)
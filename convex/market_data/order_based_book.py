@@ -1,18 +1,26 @@
 from collections import OrderedDict
+import itertools
 import operator
 
 from sortedcontainers import SortedDict
 
 from convex.common.side import Side
 
-from .book import Book, Level
+from .book import Book, Level, LevelsView, _identity, make_level_converter
+from .delta import LevelDelta
+from .price_level_book import PriceLevelBook
 
 
 class OrderBasedLevel(Level):
-    __slots__ = '_price', '_orders'
+    __slots__ = '_price', '_qty', '_orders'
+
+    #: Recompute the level quantity on every read and assert that it matches
+    #: the running total. Expensive, intended for tests.
+    check_consistency = False
 
     def __init__(self, price):
         self._price = price
+        self._qty = 0  # Running total of resting quantity.
         # OrderID -> quantity
         self._orders = OrderedDict()
 
@@ -22,7 +30,9 @@ class OrderBasedLevel(Level):
 
     @property
     def qty(self):
-        return sum(self._orders.values())
+        if OrderBasedLevel.check_consistency:
+            self.verify()
+        return self._qty
 
     @property
     def empty(self):
@@ -36,9 +46,22 @@ class OrderBasedLevel(Level):
         """Return list of orders in insertion order."""
         return self._orders
 
+    def verify(self):
+        """Assert that the running quantity matches the resting orders."""
+        total = sum(self._orders.values())
+        assert self._qty == total, \
+            'Level {} qty {} != {}'.format(self._price, self._qty, total)
+
+    def add_orders(self, orders):
+        """Add ``(order_id, qty)`` pairs to level in one step."""
+        self._orders.update(orders)
+        self._qty = sum(self._orders.values())
+
     def add_order(self, order_id, qty):
         """Add order to level."""
+        prev_qty = self._orders.get(order_id, 0)
         self._orders[order_id] = qty
+        self._qty += qty - prev_qty
 
     def match_order(self, order_id, trade_qty):
         """Match resting order.
@@ -46,9 +69,11 @@ class OrderBasedLevel(Level):
         Remove ``trade_qty`` from resting order
         """
         self._orders[order_id] -= trade_qty
+        self._qty -= trade_qty
         resting_qty = self._orders[order_id]
         if resting_qty <= 0:
             del self._orders[order_id]
+            self._qty -= resting_qty
         assert(resting_qty >= 0)
 
     def change_order(self, order_id, new_qty):
@@ -57,6 +82,7 @@ class OrderBasedLevel(Level):
         Return True if order was in level, false otherwise.
         """
         if order_id in self._orders:
+            self._qty += new_qty - self._orders[order_id]
             self._orders[order_id] = new_qty
             return True
         return False
@@ -66,49 +92,272 @@ class OrderBasedLevel(Level):
 
         Return True if order was in level, false otherwise.
         """
-        return self._orders.pop(order_id, None) is not None
+        qty = self._orders.pop(order_id, None)
+        if qty is None:
+            return False
+        self._qty -= qty
+        return True
 
 
 class OrderBasedBook:
-    def __init__(self):
+    """Order-based (level-3) book.
+
+    Args:
+        track_levels (bool): Maintain an aggregated ``PriceLevelBook``
+            alongside the orders.
+        price_units (FixedPoint): When set, prices are integer units of
+            ``price_units`` and are converted to ``Decimal`` in ``make_book``.
+        qty_units (FixedPoint): Same as ``price_units``, for quantities.
+        track_deltas (bool): Record changed levels for ``take_deltas``.
+    """
+    def __init__(self, track_levels=False, price_units=None, qty_units=None,
+                 track_deltas=False):
         self._bids = SortedDict(operator.neg)
         self._asks = SortedDict()
+        self._price_units = price_units
+        self._qty_units = qty_units
+        self._price_levels = (PriceLevelBook(price_units, qty_units)
+                              if track_levels else None)
+        # OrderID -> (side, level)
+        self._order_index = {}
+        self._unknown_order_events = 0
+        # (side, price) -> level changed since last take_deltas
+        self._changed = {} if track_deltas else None
+        self._deltas_reset = False
+
+    @classmethod
+    def from_levels(cls, bids, asks, **kwargs):
+        """Build book from orders grouped by price level.
+
+        ``bids`` and ``asks`` are iterables of
+        ``(price, [(order_id, qty), ...])`` as found in exchange snapshots.
+        Keyword arguments are passed on to ``OrderBasedBook``.
+        """
+        book = cls(**kwargs)
+        book.add_levels(Side.BID, bids)
+        book.add_levels(Side.ASK, asks)
+        return book
+
+    def add_levels(self, side, groups):
+        """Add orders grouped by price level to one side of the book.
+
+        ``groups`` is an iterable of ``(price, [(order_id, qty), ...])``.
+        Repeated prices, and prices already in the book, are merged into one
+        level. New levels go into the book with a single bulk insert rather
+        than one ``add_order`` per order. Orders already resting in the book
+        are moved, as with ``add_order``.
+        """
+        levels = self._choose_side(side)
+        index = self._order_index
+        touched, new = {}, {}
+        for price, orders in groups:
+            for order_id in [order_id for order_id, _ in orders
+                             if order_id in index]:
+                self._detach_order(order_id)
+            lvl = touched.get(price)
+            if lvl is None:
+                lvl = levels.get(price)
+                if lvl is None:
+                    lvl = new[price] = OrderBasedLevel(price=price)
+                touched[price] = lvl
+            lvl.add_orders(orders)
+            entry = side, lvl
+            index.update((order_id, entry) for order_id, _ in orders)
+        levels.update(new)
+        for price, lvl in touched.items():
+            # Detaching a moved order can empty and drop a touched level.
+            if lvl.empty:
+                levels.pop(price, None)
+            elif price not in levels:
+                levels[price] = lvl
+            self._sync_level(side, lvl)
+
+    @property
+    def order_count(self):
+        """Number of resting orders."""
+        return len(self._order_index)
+
+    @property
+    def unknown_order_events(self):
+        """Number of change/match/remove events for orders not in the book."""
+        return self._unknown_order_events
+
+    @property
+    def price_level_book(self):
+        """Aggregated ``PriceLevelBook``.
+
+        ``None`` if levels are not tracked.
+        """
+        return self._price_levels
+
+    def has_order(self, order_id):
+        """Whether order is resting in the book."""
+        return order_id in self._order_index
 
     def add_order(self, side, order_id, price, qty):
+        if order_id in self._order_index:
+            self._detach_order(order_id)
         lvl = self._fetch_level(side, price)
         lvl.add_order(order_id, qty)
+        self._order_index[order_id] = side, lvl
+        self._sync_level(side, lvl)
 
     def change_order(self, side, order_id, price, new_qty):
         """Change quantity for order.
 
         Returns True if order exists in book, false otherwise.
         """
-        lvl = self._fetch_level(side, price)
-        return lvl.change_order(order_id, new_qty)
+        entry = self._lookup_order(order_id)
+        if entry is None:
+            return False
+        side, lvl = entry
+        changed = lvl.change_order(order_id, new_qty)
+        self._sync_level(side, lvl)
+        return changed
 
     def match_order(self, side, order_id, price, trade_qty):
-        lvl = self._fetch_level(side, price)
+        """Match resting order.
+
+        Returns True if order exists in book, false otherwise.
+        """
+        entry = self._lookup_order(order_id)
+        if entry is None:
+            return False
+        side, lvl = entry
         lvl.match_order(order_id, trade_qty)
+        if order_id not in lvl.orders_view():
+            del self._order_index[order_id]
         if lvl.empty:
-            self._remove_level(side, price)
+            self._remove_level(side, lvl.price)
+        self._sync_level(side, lvl)
+        return True
 
     def remove_order(self, side, order_id, price):
-        lvl = self._fetch_level(side, price)
-        removed = lvl.remove_order(order_id)
-        if lvl.empty:
-            self._remove_level(side, price)
-        return removed
+        """Remove order.
+
+        Returns True if order exists in book, false otherwise.
+        """
+        if self._lookup_order(order_id) is None:
+            return False
+        self._detach_order(order_id)
+        return True
 
     def clear(self):
         self._bids.clear()
         self._asks.clear()
+        self._order_index.clear()
+        if self._price_levels is not None:
+            self._price_levels.clear()
+        if self._changed is not None:
+            self._changed.clear()
+            self._deltas_reset = True
+
+    def iter_orders(self, side):
+        """Yield ``(price, order_id, qty)`` of the resting orders on side,
+        best price first, with integer units converted to ``Decimal``."""
+        to_price = (self._price_units.to_decimal if self._price_units
+                    else _identity)
+        to_qty = self._qty_units.to_decimal if self._qty_units else _identity
+        for price, lvl in self._choose_side(side).items():
+            price = to_price(price)
+            for order_id, qty in lvl.orders_view().items():
+                yield price, order_id, to_qty(qty)
+
+    def take_deltas(self):
+        """Return and forget ``LevelDelta`` list of levels changed since the
+        previous call.
+
+        Returns ``None`` if deltas are not tracked or the book was cleared in
+        between, in which case consumers have to start over from a full book.
+        """
+        changed = self._changed
+        if changed is None:
+            return None
+        if self._deltas_reset:
+            self._deltas_reset = False
+            changed.clear()
+            return None
+        to_price = (self._price_units.to_decimal if self._price_units
+                    else _identity)
+        to_qty = self._qty_units.to_decimal if self._qty_units else _identity
+        deltas = [LevelDelta(side, to_price(price), to_qty(lvl.qty),
+                             lvl.orders)
+                  for (side, price), lvl in changed.items()]
+        changed.clear()
+        return deltas
 
-    def make_book(self, sequence):
-        """Return ``market_data.Book`` for OrderBasedBook."""
+    def make_book(self, sequence, depth=None, lazy=False):
+        """Return ``market_data.Book`` for OrderBasedBook.
+
+        Args:
+            sequence (int): Sequence number of the book.
+            depth (int): Maximum number of levels per side, ``None`` for all.
+            lazy (bool): Defer building ``Level`` objects until the book is
+                first read. The top ``depth`` prices and quantities are still
+                captured here, so the book does not change after publishing.
+        """
+        if lazy:
+            return Book(sequence=sequence,
+                        bids=self._capture_levels(self._bids, depth),
+                        asks=self._capture_levels(self._asks, depth))
+        bids, asks = self._bids.values(), self._asks.values()
+        if self._price_units or self._qty_units:
+            # Integer units are converted here, at the API edge.
+            to_level = make_level_converter(self._price_units,
+                                            self._qty_units)
+            bids, asks = map(to_level, bids), map(to_level, asks)
         return Book(
                 sequence=sequence,
-                bids=list(self._bids.values()),
-                asks=list(self._asks.values()))
+                bids=list(itertools.islice(bids, depth)),
+                asks=list(itertools.islice(asks, depth)))
+
+    def make_aggregated_book(self, sequence, depth=None):
+        """Return ``market_data.Book`` of aggregated ``Level`` snapshots.
+
+        Uses the tracked ``PriceLevelBook`` when available.
+        """
+        if self._price_levels is not None:
+            return self._price_levels.make_book(sequence, depth=depth)
+
+        to_level = make_level_converter(self._price_units, self._qty_units)
+
+        def snapshot(levels):
+            return list(map(to_level,
+                            itertools.islice(levels.values(), depth)))
+        return Book(sequence=sequence,
+                    bids=snapshot(self._bids),
+                    asks=snapshot(self._asks))
+
+    def _capture_levels(self, levels, depth):
+        """Return ``LevelsView`` over a copy of the top ``depth`` levels."""
+        captured = [(lvl.price, lvl.qty, lvl.orders)
+                    for lvl in itertools.islice(levels.values(), depth)]
+        to_price = (self._price_units.to_decimal if self._price_units
+                    else _identity)
+        to_qty = self._qty_units.to_decimal if self._qty_units else _identity
+        return LevelsView(Level(to_price(price), to_qty(qty), orders)
+                          for price, qty, orders in captured)
+
+    def _sync_level(self, side, lvl):
+        """Mirror level into the aggregated book and recorded deltas."""
+        if self._price_levels is not None:
+            self._price_levels.set_level(side, lvl.price, lvl.qty, lvl.orders)
+        if self._changed is not None:
+            self._changed[side, lvl.price] = lvl
+
+    def _lookup_order(self, order_id):
+        """Return (side, level) for order, counting misses."""
+        entry = self._order_index.get(order_id)
+        if entry is None:
+            self._unknown_order_events += 1
+        return entry
+
+    def _detach_order(self, order_id):
+        side, lvl = self._order_index.pop(order_id)
+        lvl.remove_order(order_id)
+        if lvl.empty:
+            self._remove_level(side, lvl.price)
+        self._sync_level(side, lvl)
 
     def _fetch_level(self, side, price):
         levels = self._choose_side(side)
@@ -1,16 +1,47 @@
 import json
 import collections
+import datetime as dt
 import itertools as it
+import math
 
 import msgpack
 
+from ..common.utils.compression import EXTENSIONS, open_compressed
+from . import recording_index
+
 
 class StopPlayback(StopIteration):
     """Raised when playback of a file is finished."""
 
 
+def _to_posix(time):
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=dt.timezone.utc)
+    return time.timestamp()
+
+
 class Playback:
-    def __init__(self, path_or_buff, fmt=None, *, chunksize=256):
+    """Iterate over update dicts recorded by ``services/recorder.py``.
+
+    With ``start`` or ``end`` only updates in ``[start, end)`` are played,
+    either by timestamp, for ``datetime`` bounds (naive ones are UTC), or by
+    book sequence, for ``int`` bounds. Recordings are assumed to be in
+    timestamp and sequence order: playback stops at the first update at or
+    after ``end``, and a path with a sidecar index (see
+    ``recording_index``) is read from the last indexed offset before
+    ``start``.
+
+    Args:
+        path_or_buff: Recording, optionally compressed, or an open file.
+        fmt (str): ``'json'`` or ``'msgpack'``, deduced from a path if
+            ``None``.
+        chunksize (int): Updates read from the file at once.
+        start: First timestamp or sequence to play.
+        end: Timestamp or sequence to stop at.
+    """
+    def __init__(self, path_or_buff, fmt=None, *, chunksize=256,
+                 start=None, end=None):
+        self._key, self._start, self._end = Playback._make_range(start, end)
         if not isinstance(path_or_buff, str):
             if fmt is None:
                 raise ValueError('Stream input must specify format')
@@ -19,33 +50,37 @@ class Playback:
             self._file = path_or_buff
             self._close_file = lambda: None  # Don't close others' files
         else:
-            self._file = None
+            offset = 0
+            if start is not None:
+                offset = Playback._find_offset(path_or_buff, self._key,
+                                               self._start)
+            self._file = open_compressed(path_or_buff, offset)
             self._close_file = lambda: self._file.close()
             if fmt is None:
                 fmt = self._deduce_format(path_or_buff)
 
         if fmt == 'json':
             self._read_next = self._read_json
-            if self._file is None:
-                self._file = open(path_or_buff)
         elif fmt == 'msgpack':
             self._read_next = self._read_msgpack
-            if self._file is None:
-                self._file = open(path_or_buff, 'rb')
-            self._unpacker = msgpack.Unpacker(self._file, encoding='utf-8')
+            self._unpacker = msgpack.Unpacker(self._file, raw=False)
         else:
+            self._close_file()
             raise ValueError('Unknown format \'{}\''.format(fmt))
 
         chunksize = int(chunksize) if chunksize and chunksize > 0 else None
         self._chunksize = chunksize
         self._updates = collections.deque(maxlen=chunksize)
+        self._finished = False
 
     def next_update(self) -> dict:
         """Get next update."""
-        if not self._updates and not self._read_next():
-            self._read_next = Playback._read_finished
-            self._close_file()
-            raise StopPlayback()
+        while not self._updates:
+            if self._finished:
+                self._close_file()
+                self._close_file = lambda: None
+                raise StopPlayback()
+            self._finished = not self._read_next()
         return self._updates.popleft()
 
     def __iter__(self):
@@ -54,27 +89,79 @@ class Playback:
     __next__ = next_update
 
     def _read_next(self):
-        """Read next chunk of updates from file."""
+        """Read next chunk of updates from file.
+
+        Return False once there are no more updates to read.
+        """
         raise RuntimeError('Should be replaced by '
                            '_read_json or _read_msgpack')
 
     def _read_json(self):
-        for line in it.islice(self._file, self._chunksize):
-            update = json.loads(line)
-            self._updates.append(update)
-        return self._updates
+        return self._read_chunk(json.loads(line) for line in self._file)
 
     def _read_msgpack(self):
-        for data in it.islice(self._unpacker, self._chunksize):
-            self._updates.append(data)
-        return self._updates
+        return self._read_chunk(self._unpacker)
+
+    def _read_chunk(self, updates):
+        count = 0
+        try:
+            for update in it.islice(updates, self._chunksize):
+                count += 1
+                if not self._add(update):
+                    return False
+        except EOFError:
+            return False  # Compressed file ends after its last flush point.
+        return count > 0
+
+    def _add(self, update):
+        """Queue update if in range, return False once past the range."""
+        if self._key is not None:
+            value = recording_index.update_keys(update)[self._key]
+            if value is None or value < self._start:
+                return True
+            if value >= self._end:
+                return False
+        self._updates.append(update)
+        return True
+
+    @staticmethod
+    def _make_range(start, end):
+        """Return (update key index, start, end) of the range to play."""
+        bounds = [value for value in (start, end) if value is not None]
+        if not bounds:
+            return None, -math.inf, math.inf
+        if all(isinstance(value, dt.datetime) for value in bounds):
+            key, convert = 0, _to_posix
+        elif all(isinstance(value, int) for value in bounds):
+            key, convert = 1, int
+        else:
+            raise ValueError('start and end must both be datetimes or '
+                             'both be sequence numbers')
+        return (key,
+                convert(start) if start is not None else -math.inf,
+                convert(end) if end is not None else math.inf)
 
     @staticmethod
-    def _read_finished():
-        raise StopPlayback()
+    def _find_offset(path, key, start):
+        """Return offset of the last index entry before start, 0 if the
+        recording has no index.
+        """
+        offset = 0
+        for entry in recording_index.load_index(path) or ():
+            value = entry[1 + key]
+            if value is None:
+                continue
+            if value >= start:
+                break
+            offset = entry[0]
+        return offset
 
     @staticmethod
     def _deduce_format(filename: str) -> str:
+        for ext in EXTENSIONS.values():
+            if filename.endswith(ext):
+                filename = filename[:-len(ext)]  # Compressed recording.
+                break
         file_ext = filename.rsplit('.', maxsplit=1)[-1]
         if file_ext in ('json', 'js'):
             return 'json'
@@ -0,0 +1,84 @@
+import itertools
+import operator
+
+from sortedcontainers import SortedDict
+
+from convex.common.side import Side
+
+from .book import Book, Level, _identity
+
+
+class PriceLevelBook:
+    """Aggregated (level-2) book.
+
+    Keeps only total quantity and order count per price. Books made from it
+    contain plain ``Level`` snapshots, so consumers never see order-level
+    detail and published books do not change underneath them.
+
+    Args:
+        price_units (FixedPoint): When set, prices are stored as integer units
+            and converted to ``Decimal`` in ``make_book``.
+        qty_units (FixedPoint): Same as ``price_units``, for quantities.
+    """
+    def __init__(self, price_units=None, qty_units=None):
+        self._to_price = price_units.to_decimal if price_units else _identity
+        self._to_qty = qty_units.to_decimal if qty_units else _identity
+        # Price -> [qty, orders]
+        self._bids = SortedDict(operator.neg)
+        self._asks = SortedDict()
+
+    @property
+    def bid_depth(self):
+        """Number of bid levels."""
+        return len(self._bids)
+
+    @property
+    def ask_depth(self):
+        """Number of ask levels."""
+        return len(self._asks)
+
+    def set_level(self, side, price, qty, orders):
+        """Set aggregated quantity and order count for price.
+
+        The level is removed when ``orders`` is zero.
+        """
+        levels = self._choose_side(side)
+        if orders <= 0:
+            levels.pop(price, None)
+            return
+        entry = levels.get(price)
+        if entry is None:
+            levels[price] = [qty, orders]
+        else:
+            entry[0] = qty
+            entry[1] = orders
+
+    def get_level(self, side, price):
+        """Return (qty, orders) at price, or ``None`` if there is no level."""
+        entry = self._choose_side(side).get(price)
+        return tuple(entry) if entry is not None else None
+
+    def clear(self):
+        self._bids.clear()
+        self._asks.clear()
+
+    def make_book(self, sequence, depth=None):
+        """Return ``market_data.Book`` of ``Level`` snapshots.
+
+        Args:
+            sequence (int): Sequence number of the book.
+            depth (int): Maximum number of levels per side, ``None`` for all.
+        """
+        return Book(
+                sequence=sequence,
+                bids=self._make_levels(self._bids, depth),
+                asks=self._make_levels(self._asks, depth))
+
+    def _choose_side(self, side):
+        return self._bids if side == Side.BID else self._asks
+
+    def _make_levels(self, levels, depth):
+        to_price, to_qty = self._to_price, self._to_qty
+        return [Level(to_price(price), to_qty(qty), orders)
+                for price, (qty, orders)
+                in itertools.islice(levels.items(), depth)]
@@ -0,0 +1,190 @@
+"""Sidecar index of recorded update files.
+
+The index of ``rec.json.gz`` is stored next to it as ``rec.json.gz.idx``, a
+JSON document listing ``[offset, time, sequence]`` entries: reading the
+recording may start at byte ``offset``, whose first update has POSIX
+timestamp ``time`` and book sequence ``sequence``. ``Playback`` uses it to
+seek to a time or sequence range instead of reading the file from the start.
+
+Compressed recordings can only be read from the start of a gzip member, xz
+stream or zstd frame, which the recorder begins at every flush point, so
+they get one entry per member. Uncompressed JSON recordings get an entry
+every ``spacing`` bytes. Uncompressed msgpack recordings can not be seeked.
+
+Recordings are append-only, so the index of a file still being written stays
+valid for the part it covers.
+"""
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import datetime as dt
+import lzma
+import os
+import zlib
+
+import msgpack
+
+from ..common.utils.compression import compression_of, zstandard
+
+VERSION = 1
+
+_UTC = dt.timezone.utc
+
+
+def index_path(path):
+    """Return path of the index of recording path."""
+    return path + '.idx'
+
+
+def parse_timestamp(text):
+    """Return POSIX time of a recorded ``str(datetime)`` timestamp, ``None``
+    if it has none.
+    """
+    if not text or text == 'None':
+        return None
+    time = dt.datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                       int(text[11:13]), int(text[14:16]), int(text[17:19]),
+                       tzinfo=_UTC)
+    rest = text[19:]
+    seconds = time.timestamp()
+    if rest.startswith('.'):
+        digits = rest[1:7]
+        seconds += int(digits) / 10 ** len(digits)
+        rest = rest[7:]
+    if rest:
+        offset = int(rest[1:3]) * 3600 + int(rest[4:6]) * 60
+        seconds -= offset if rest[0] == '+' else -offset
+    return seconds
+
+
+def update_keys(update):
+    """Return (POSIX time, book sequence) of a recorded update dict."""
+    return (parse_timestamp(update.get('timestamp')),
+            update['book']['sequence'])
+
+
+def load_index(path):
+    """Return index entries of recording path, ``None`` if it has no usable
+    index.
+    """
+    try:
+        with open(index_path(path)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (index.get('version') != VERSION
+            or index.get('size', 0) > os.path.getsize(path)):
+        return None  # Recording was replaced.
+    return index['entries']
+
+
+def build_index(path, fmt, spacing=1024 * 1024):
+    """Index recording path and write its sidecar index.
+
+    Args:
+        path (str): Recording, optionally compressed.
+        fmt (str): ``'json'`` or ``'msgpack'``.
+        spacing (int): Bytes between entries of uncompressed JSON files.
+
+    Return number of entries.
+    """
+    size = os.path.getsize(path)
+    if compression_of(path) is not None:
+        entries = _index_members(path, fmt)
+    elif fmt == 'json':
+        entries = _index_lines(path, spacing)
+    else:
+        entries = _index_start(path, fmt)
+
+    with open(index_path(path), 'w') as f:
+        json.dump({'version': VERSION, 'size': size, 'entries': entries}, f)
+    return len(entries)
+
+
+def _first_update(data, fmt):
+    """Return the first update decoded from data, ``None`` if incomplete."""
+    if fmt == 'json':
+        line, sep, _ = data.partition(b'\n')
+        return json.loads(line) if sep else None
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(data)
+    for update in unpacker:
+        return update
+    return None
+
+
+def _entry(offset, update):
+    time, sequence = update_keys(update)
+    return [offset, time, sequence]
+
+
+def _index_lines(path, spacing):
+    entries = []
+    offset = 0
+    next_entry = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if offset >= next_entry and line.endswith(b'\n'):
+                entries.append(_entry(offset, json.loads(line)))
+                next_entry = offset + spacing
+            offset += len(line)
+    return entries
+
+
+def _index_start(path, fmt):
+    with open(path, 'rb') as f:
+        update = _first_update(f.read(1024 * 1024), fmt)
+    return [_entry(0, update)] if update is not None else []
+
+
+def _make_decompressor(codec):
+    if codec == 'gzip':
+        return zlib.decompressobj(31)
+    if codec == 'lzma':
+        return lzma.LZMADecompressor()
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd compression needs the zstandard package')
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError('Unsupported compression: {}'.format(codec))
+
+
+def _index_members(path, fmt, chunk_size=1024 * 1024):
+    """Index the first update of each member of a compressed recording."""
+    codec = compression_of(path)
+    entries = []
+    member_start = 0  # File offset of the current member.
+    consumed = 0  # File offset of the start of ``pending``.
+    decompressor = None
+    head = b''  # Decompressed start of the current member.
+    update = None
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            if not pending:
+                pending = f.read(chunk_size)
+                if not pending:
+                    break
+            if decompressor is None:
+                decompressor = _make_decompressor(codec)
+                member_start = consumed
+                head, update = b'', None
+            data = decompressor.decompress(pending)
+            if update is None and data:
+                head += data
+                update = _first_update(head, fmt)
+                if update is not None:
+                    entries.append(_entry(member_start, update))
+                    head = b''
+            if decompressor.eof:
+                unused = decompressor.unused_data
+                consumed += len(pending) - len(unused)
+                pending = unused
+                decompressor = None
+            else:
+                consumed += len(pending)
+                pending = b''
+    return entries
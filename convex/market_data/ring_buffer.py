@@ -0,0 +1,99 @@
+import collections
+import threading
+import time
+
+from .update import Update
+
+
+class UpdateRing:
+    """Bounded, thread-safe hand-off of updates from a producer thread.
+
+    Entries are ``(key, update)`` pairs. When the ring is full the
+    ``backpressure`` policy decides what happens:
+
+    - ``'latest'``: drop the oldest entry. Its trades and deltas are
+      carried over to the next update with the same key, in the ring or
+      pushed later, or handed out by the next ``drain`` if there is none by
+      then, so none are lost.
+    - ``'block'``: block the producer until the consumer makes room.
+    """
+    POLICIES = 'latest', 'block'
+
+    def __init__(self, maxlen=1024, backpressure='latest'):
+        if maxlen < 1:
+            raise ValueError('maxlen must be at least 1')
+        if backpressure not in UpdateRing.POLICIES:
+            raise ValueError('Unknown backpressure policy \'{}\', '
+                             'expected one of {}'.format(
+                                 backpressure, UpdateRing.POLICIES))
+        self._maxlen = maxlen
+        self._backpressure = backpressure
+        self._entries = collections.deque()
+        self._carried = {}  # key -> (enqueue time, dropped update)
+        self._not_full = threading.Condition(threading.Lock())
+        self._closed = False
+        self._dropped = 0
+
+    @property
+    def dropped(self):
+        """Number of updates dropped to make room."""
+        return self._dropped
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, key, update):
+        """Add update, applying the backpressure policy.
+
+        Return True if the ring was empty before the push, so the producer
+        knows it has to wake the consumer.
+        """
+        with self._not_full:
+            if len(self._entries) >= self._maxlen:
+                if self._backpressure == 'block':
+                    while (len(self._entries) >= self._maxlen
+                           and not self._closed):
+                        self._not_full.wait()
+                else:
+                    self._drop_oldest()
+            enqueued = time.monotonic()
+            carried = self._carried.pop(key, None)
+            if carried is not None:
+                enqueued = carried[0]
+                update = Update.conflate(carried[1], update)
+            was_empty = not self._entries
+            self._entries.append((key, enqueued, update))
+            return was_empty
+
+    def _drop_oldest(self):
+        """Drop the oldest entry, merging it into the next entry with the
+        same key or carrying it over if there is none."""
+        entries = self._entries
+        key, enqueued, update = entries.popleft()
+        self._dropped += 1
+        for i, (other_key, _, other_update) in enumerate(entries):
+            if other_key == key:
+                entries[i] = (key, enqueued,
+                              Update.conflate(update, other_update))
+                return
+        self._carried[key] = enqueued, update
+
+    def drain(self):
+        """Remove and return all entries as ``(key, enqueue_time, update)``.
+
+        Dropped updates whose key was not pushed again come first.
+        """
+        with self._not_full:
+            entries = [(key, enqueued, update) for key, (enqueued, update)
+                       in self._carried.items()]
+            entries.extend(self._entries)
+            self._carried.clear()
+            self._entries.clear()
+            self._not_full.notify_all()
+        return entries
+
+    def close(self):
+        """Release any blocked producer."""
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
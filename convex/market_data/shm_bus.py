@@ -0,0 +1,295 @@
+"""Shared-memory market data bus.
+
+One feed-handler process owns the exchange gateway and writes encoded updates
+into a ring of fixed-size slots in a memory-mapped file. Any number of
+processes read the ring through ``ShmGateway`` without touching the exchange.
+
+Slots are guarded by a sequence lock: the writer makes a slot's sequence odd
+while writing it, then sets it to ``2 * (n + 1)`` for the ``n``-th write.
+Readers copy the payload and check the sequence before and after; a mismatch
+means the writer lapped them and the entry is counted as lost.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+
+import logbook
+
+from .codec import decode_update, encode_update
+from .gateway import Gateway
+from .update import Update
+
+log = logbook.Logger('MD')
+
+DEFAULT_PATH = '/dev/shm/convex-md'
+
+_MAGIC = b'CVXMDBUS'
+# magic, slot count, slot size, number of writes
+_HEADER = struct.Struct('<8sIIQ')
+_WRITES = struct.Struct('<Q')
+_WRITES_OFFSET = 16
+_SLOTS_OFFSET = 64
+# sequence, payload length
+_SLOT_HEADER = struct.Struct('<QI')
+
+
+class ShmWriter:
+    """Single writer of the shared-memory ring.
+
+    An existing ring file of the same geometry is reused, and writing resumes
+    after its last entry, so readers survive a restart of the feed handler.
+
+    Args:
+        path (str): Ring file, preferably on a tmpfs such as ``/dev/shm``.
+        slots (int): Number of slots.
+        slot_size (int): Bytes per slot, including a 12 byte slot header.
+    """
+    def __init__(self, path=DEFAULT_PATH, slots=4096, slot_size=4096):
+        if slots < 1:
+            raise ValueError('slots must be at least 1')
+        if slot_size <= _SLOT_HEADER.size:
+            raise ValueError('slot_size must be larger than {}'.format(
+                _SLOT_HEADER.size))
+        self._slots = slots
+        self._slot_size = slot_size
+        size = _SLOTS_OFFSET + slots * slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            resume = os.fstat(fd).st_size == size
+            if not resume:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, n_slots, n_size, writes = _HEADER.unpack_from(self._mm, 0)
+        if resume and (magic, n_slots, n_size) == (_MAGIC, slots, slot_size):
+            self._writes = writes
+        else:
+            self._mm[:size] = bytes(size)
+            _HEADER.pack_into(self._mm, 0, _MAGIC, slots, slot_size, 0)
+            self._writes = 0
+
+    @property
+    def writes(self):
+        """Number of entries written."""
+        return self._writes
+
+    @property
+    def max_payload(self):
+        """Largest payload fitting a slot, in bytes."""
+        return self._slot_size - _SLOT_HEADER.size
+
+    def write(self, payload):
+        """Write payload into the next slot."""
+        length = len(payload)
+        if length > self.max_payload:
+            raise ValueError('Payload of {} bytes does not fit slot of {}'
+                             .format(length, self._slot_size))
+        mm, n = self._mm, self._writes
+        offset = _SLOTS_OFFSET + (n % self._slots) * self._slot_size
+        start = offset + _SLOT_HEADER.size
+        _SLOT_HEADER.pack_into(mm, offset, 2 * n + 1, length)
+        mm[start:start + length] = payload
+        _WRITES.pack_into(mm, offset, 2 * n + 2)
+        self._writes = n + 1
+        _WRITES.pack_into(mm, _WRITES_OFFSET, n + 1)
+
+    def close(self):
+        self._mm.close()
+
+
+class ShmReader:
+    """Reader of the shared-memory ring.
+
+    Reading starts with the next entry written after the reader is created.
+
+    Args:
+        path (str): Ring file created by ``ShmWriter``.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._slots, self._slot_size, writes = \
+            _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError('{} is not a market data bus'.format(path))
+        self._next = writes
+        self._lost = 0
+
+    @property
+    def lost(self):
+        """Number of entries overwritten before they were read."""
+        return self._lost
+
+    def read(self):
+        """Return list of payloads written since the previous call."""
+        mm = self._mm
+        writes, = _WRITES.unpack_from(mm, _WRITES_OFFSET)
+        if writes < self._next:
+            # Ring was reset by a new writer.
+            self._next = writes
+        if writes - self._next > self._slots:
+            self._lost += writes - self._next - self._slots
+            self._next = writes - self._slots
+
+        payloads = []
+        while self._next < writes:
+            n = self._next
+            self._next += 1
+            offset = _SLOTS_OFFSET + (n % self._slots) * self._slot_size
+            start = offset + _SLOT_HEADER.size
+            seq, length = _SLOT_HEADER.unpack_from(mm, offset)
+            payload = mm[start:start + length]
+            if seq != 2 * n + 2 or _WRITES.unpack_from(mm, offset)[0] != seq:
+                self._lost += 1
+                continue
+            payloads.append(payload)
+        return payloads
+
+    def close(self):
+        self._mm.close()
+
+
+class ShmPublisher:
+    """Write updates of a gateway into the shared-memory ring.
+
+    An update too large for one slot is split into several updates of the
+    same book, each carrying part of the trades; readers conflate them back
+    like any other updates of one book. If the book and its deltas alone do
+    not fit, the deltas are dropped and published as unavailable, and if
+    the book still does not fit, the update is dropped.
+
+    Args:
+        gateway (Gateway): Gateway providing updates.
+        instruments: Instruments to publish.
+        writer (ShmWriter): Ring to write to.
+        depth (int): Levels per side to publish.
+    """
+    def __init__(self, gateway, instruments, writer, depth=10):
+        self._writer = writer
+        self._depth = depth
+        self._split_updates = 0
+        self._dropped_updates = 0
+        self._dropped_trades = 0
+        for instrument in instruments:
+            gateway.register(instrument, self._on_update, aggregated=True)
+
+    @property
+    def split_updates(self):
+        """Number of updates written across several slots."""
+        return self._split_updates
+
+    @property
+    def dropped_updates(self):
+        """Number of updates whose book did not fit a slot."""
+        return self._dropped_updates
+
+    @property
+    def dropped_trades(self):
+        """Number of trades that could not be published."""
+        return self._dropped_trades
+
+    async def _on_update(self, update):
+        payload = encode_update(update, depth=self._depth)
+        if len(payload) <= self._writer.max_payload:
+            self._writer.write(payload)
+        else:
+            self._write_split(update)
+
+    def _encode(self, update, trades):
+        """Return update encoded with trades, None if it does not fit."""
+        payload = encode_update(Update.replace_trades(update, trades),
+                                depth=self._depth)
+        return payload if len(payload) <= self._writer.max_payload else None
+
+    def _write_split(self, update):
+        """Write update too large for a slot as several updates."""
+        trades = list(update.trades)
+        head = update
+        if self._encode(head, []) is None:
+            head = Update.replace_deltas(head, None)
+        if self._encode(head, []) is None:
+            self._dropped_updates += 1
+            self._dropped_trades += len(trades)
+            log.error('[{}] Book of sequence {} does not fit a slot of {} '
+                      'bytes, dropping update', update.instrument,
+                      update.sequence, self._writer.max_payload)
+            return
+
+        self._split_updates += 1
+        parts = 0
+        while True:
+            # Halve the chunk until it fits, the book alone always does.
+            count = len(trades)
+            payload = self._encode(head, trades)
+            while payload is None:
+                count //= 2
+                payload = self._encode(head, trades[:count])
+            if count == 0 and trades and not head.deltas:
+                self._dropped_trades += len(trades)
+                log.error('[{}] Trades do not fit a slot of {} bytes, '
+                          'dropping {}', update.instrument,
+                          self._writer.max_payload, len(trades))
+                if parts:
+                    return
+                trades = []
+            self._writer.write(payload)
+            parts += 1
+            del trades[:count]
+            if not trades:
+                return
+            # The book is unchanged since the previous part.
+            if head.deltas:
+                head = Update.replace_deltas(head, [])
+
+
+class ShmGateway(Gateway):
+    """Gateway reading updates published by a feed handler to the
+    shared-memory ring.
+
+    The published books are already aggregated, so normal and aggregated
+    callbacks receive the same updates.
+
+    Args:
+        path (str): Ring file.
+        poll_interval (float): Seconds to wait when the ring has no entries.
+    """
+    def __init__(self, path=DEFAULT_PATH, loop=None, *, poll_interval=0.001):
+        Gateway.__init__(self, loop)
+        self._path = path
+        self._poll_interval = poll_interval
+        self._reader = None
+
+    @property
+    def lost(self):
+        """Number of updates lapped by the writer."""
+        return self._reader.lost if self._reader is not None else 0
+
+    def subscribe(self, instrument):
+        log.info('[{}] Reading from market data bus {}',
+                 instrument, self._path)
+
+    def request_shutdown(self):
+        log.notice('Shutdown requested')
+
+    async def launch(self):
+        self._reader = ShmReader(self._path)
+        lost = 0
+        try:
+            while True:
+                payloads = self._reader.read()
+                for payload in payloads:
+                    self._publish_received(decode_update(payload))
+                if self._reader.lost != lost:
+                    log.warn('Lost {} updates from market data bus',
+                             self._reader.lost - lost)
+                    lost = self._reader.lost
+                await asyncio.sleep(0 if payloads else self._poll_interval,
+                                    loop=self.loop)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._reader.close()
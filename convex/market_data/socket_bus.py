@@ -0,0 +1,221 @@
+"""Market data distribution over Unix or TCP sockets.
+
+``SocketPublisher`` streams encoded updates to every connected client,
+``SocketGateway`` is the client side. Each frame is a little-endian
+``(payload length: uint32, sequence: uint64)`` header followed by an update
+encoded with ``market_data.codec``. Sequences increase by one per frame, so
+clients can tell when frames were missed, e.g. across a reconnect.
+
+Addresses are either a path, for a Unix socket, or a ``(host, port)`` tuple.
+"""
+
+import asyncio
+import functools
+import struct
+
+import logbook
+
+from .codec import decode_update, encode_update
+from .gateway import Gateway
+
+log = logbook.Logger('MD')
+
+_FRAME = struct.Struct('<IQ')
+
+
+def parse_address(address):
+    """Parse ``host:port`` into a tuple, anything else is a socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host, int(port)
+    return address
+
+
+class _PublisherProtocol(asyncio.Protocol):
+    def __init__(self, publisher):
+        self._publisher = publisher
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._publisher._add_client(transport)
+
+    def connection_lost(self, exc):
+        self._publisher._remove_client(self._transport)
+
+    def data_received(self, data):
+        pass  # Clients do not send anything.
+
+
+class SocketPublisher:
+    """Serve updates to socket clients.
+
+    Updates are either taken from a gateway with ``attach``, or passed to
+    ``publish`` directly, e.g. by a stand-in server.
+
+    Args:
+        loop: Event loop.
+        depth (int): Levels per side to publish.
+        max_buffer (int): Bytes a client may fall behind before it is
+            disconnected.
+    """
+    def __init__(self, loop=None, *, depth=10, max_buffer=4 * 1024 * 1024):
+        self._loop = loop if loop else asyncio.get_event_loop()
+        self._depth = depth
+        self._max_buffer = max_buffer
+        self._clients = set()
+        self._sequence = 0
+        self._server = None
+
+    @property
+    def clients(self):
+        """Number of connected clients."""
+        return len(self._clients)
+
+    async def start(self, address):
+        """Start listening on Unix socket path or ``(host, port)``."""
+        factory = functools.partial(_PublisherProtocol, self)
+        if isinstance(address, str):
+            self._server = await self._loop.create_unix_server(factory,
+                                                               address)
+        else:
+            host, port = address
+            self._server = await self._loop.create_server(factory,
+                                                          host, port)
+        log.info('Publishing market data on {}', address)
+
+    def close(self):
+        """Stop listening and disconnect clients."""
+        if self._server is not None:
+            self._server.close()
+        for transport in list(self._clients):
+            transport.close()
+
+    def attach(self, gateway, instruments):
+        """Publish updates of instruments from gateway."""
+        for instrument in instruments:
+            gateway.register(instrument, self._on_update, aggregated=True)
+
+    def publish(self, update):
+        """Send update to all clients."""
+        if not self._clients:
+            return
+        payload = encode_update(update, depth=self._depth)
+        self._sequence += 1
+        frame = _FRAME.pack(len(payload), self._sequence) + payload
+        for transport in list(self._clients):
+            if transport.get_write_buffer_size() > self._max_buffer:
+                log.warn('Disconnecting slow market data client {}',
+                         transport.get_extra_info('peername'))
+                self._clients.discard(transport)
+                transport.abort()
+            else:
+                transport.write(frame)
+
+    async def _on_update(self, update):
+        self.publish(update)
+
+    def _add_client(self, transport):
+        log.info('Market data client connected {}',
+                 transport.get_extra_info('peername'))
+        self._clients.add(transport)
+
+    def _remove_client(self, transport):
+        self._clients.discard(transport)
+
+
+class _ClientProtocol(asyncio.Protocol):
+    def __init__(self, gateway, closed):
+        self._gateway = gateway
+        self._closed = closed
+        self._buffer = bytearray()
+
+    def data_received(self, data):
+        buf = self._buffer
+        buf += data
+        start = 0
+        while len(buf) - start >= _FRAME.size:
+            length, sequence = _FRAME.unpack_from(buf, start)
+            end = start + _FRAME.size + length
+            if len(buf) < end:
+                break
+            self._gateway._on_frame(sequence,
+                                    bytes(buf[start + _FRAME.size:end]))
+            start = end
+        del buf[:start]
+
+    def connection_lost(self, exc):
+        if not self._closed.done():
+            self._closed.set_result(exc)
+
+
+class SocketGateway(Gateway):
+    """Gateway receiving updates from a ``SocketPublisher``.
+
+    Published books are already aggregated, so normal and aggregated
+    callbacks receive the same updates.
+
+    Args:
+        address: Unix socket path or ``(host, port)`` of the publisher.
+        reconnect_interval (float): Seconds between connection attempts.
+    """
+    def __init__(self, address, loop=None, *, reconnect_interval=1.0):
+        Gateway.__init__(self, loop)
+        self._address = address
+        self._reconnect_interval = reconnect_interval
+        self._sequence = None
+        self._missed = 0
+
+    @property
+    def missed(self):
+        """Number of frames missed according to frame sequences."""
+        return self._missed
+
+    def subscribe(self, instrument):
+        log.info('[{}] Reading from market data publisher {}',
+                 instrument, self._address)
+
+    def request_shutdown(self):
+        log.notice('Shutdown requested')
+
+    async def launch(self):
+        transport = None
+        try:
+            while True:
+                closed = self.loop.create_future()
+                try:
+                    transport = await self._connect(closed)
+                except OSError as e:
+                    log.warn('Cannot connect to {}: {}', self._address, e)
+                else:
+                    log.info('Connected to market data publisher {}',
+                             self._address)
+                    await closed
+                    log.warn('Disconnected from market data publisher {}',
+                             self._address)
+                await asyncio.sleep(self._reconnect_interval, loop=self.loop)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if transport is not None:
+                transport.close()
+
+    async def _connect(self, closed):
+        factory = functools.partial(_ClientProtocol, self, closed)
+        if isinstance(self._address, str):
+            transport, _ = await self.loop.create_unix_connection(
+                    factory, self._address)
+        else:
+            host, port = self._address
+            transport, _ = await self.loop.create_connection(factory,
+                                                             host, port)
+        return transport
+
+    def _on_frame(self, sequence, payload):
+        if self._sequence is not None and sequence != self._sequence + 1:
+            missed = max(sequence - self._sequence - 1, 0)
+            self._missed += missed
+            log.warn('Market data frame sequence gap, expected {}, got {}',
+                     self._sequence + 1, sequence)
+        self._sequence = sequence
+        self._publish_received(decode_update(payload))
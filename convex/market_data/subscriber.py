@@ -3,6 +3,7 @@ import collections
 
 import logbook
 
+from .book import Book, Level
 from .update import Update
 
 log = logbook.Logger('MD')
@@ -12,15 +13,55 @@ class Subscriber:
     """Handle registration and conflate updates.
 
     ``update_cache_size`` (int): Number of updates to keep cached.
+    ``aggregated`` (bool): Receive aggregated price/qty books instead of
+    order-based books.
+    ``policy`` (str): How updates are handed to the consumer:
+
+    - ``'latest'``: ``fetch`` returns the latest update, carrying trades and
+      deltas of the updates it replaced.
+    - ``'every'``: ``fetch`` returns every update in order from a ring of
+      ``ring_size``. When the ring is full the two oldest updates are
+      conflated and ``dropped`` is incremented. Unless ``aggregated`` is
+      set, book levels are copied as they enter the ring, because
+      order-based levels keep changing after publishing.
+    - ``'sampled'``: like ``'latest'``, but an update becomes available at
+      most once every ``sample_interval`` seconds.
+
+    ``max_cached_trades`` (int): Maximum number of trades carried over to the
+    next fetched update, ``None`` for no limit. The oldest trades beyond it
+    are discarded and counted in ``trades_overflow``.
     """
-    def __init__(self, instrument, gateway, update_cache_size=2):
+    POLICIES = 'latest', 'every', 'sampled'
+
+    def __init__(self, instrument, gateway, update_cache_size=2,
+                 aggregated=False, policy='latest', ring_size=1024,
+                 sample_interval=0.1, max_cached_trades=None):
+        if policy not in Subscriber.POLICIES:
+            raise ValueError('Unknown policy \'{}\', expected one of {}'
+                             .format(policy, Subscriber.POLICIES))
+        assert(update_cache_size >= 1)
+        assert(ring_size >= 1)
         self._instrument = instrument
+        self._loop = gateway.loop
         self._update_event = asyncio.Event(loop=gateway.loop)
-        gateway.register(instrument, self._on_update)
-        assert(update_cache_size >= 1)
+        self._policy = policy
+        self._copy_levels = policy == 'every' and not aggregated
         self._updates = collections.deque(maxlen=update_cache_size)
         self._update_sequence = 0
         self._cached_trades = []
+        self._max_cached_trades = max_cached_trades
+        self._trades_overflow = 0
+        # (side, price) -> LevelDelta, None once deltas are unavailable
+        self._cached_deltas = {}
+        # Pending updates for the 'every' policy
+        self._queue = collections.deque()
+        self._ring_size = ring_size
+        self._dropped = 0
+        # Release of the next sample for the 'sampled' policy
+        self._sample_interval = sample_interval
+        self._sample_handle = None
+        self._last_sample = float('-inf')
+        gateway.register(instrument, self._on_update, aggregated=aggregated)
 
     @property
     def cached_updates(self):
@@ -37,6 +78,21 @@ class Subscriber:
         """Subscribed instrument."""
         return self._instrument
 
+    @property
+    def policy(self):
+        """Update policy."""
+        return self._policy
+
+    @property
+    def dropped(self):
+        """Number of updates conflated because the ring was full."""
+        return self._dropped
+
+    @property
+    def trades_overflow(self):
+        """Number of cached trades discarded due to ``max_cached_trades``."""
+        return self._trades_overflow
+
     def has_update(self):
         """Whether subscriber has pending update."""
         return self._update_event.is_set()
@@ -62,12 +118,22 @@ class Subscriber:
 
     def _fetch_pending_update(self):
         assert(self.has_update())
+        if self._policy == 'every':
+            update = self._queue.popleft()
+            if not self._queue:
+                self._update_event.clear()
+            return update
         self._update_event.clear()
         latest_update = self._updates[-1]
         full_update = Update.replace_trades(latest_update,
                                             trades=self._cached_trades.copy())
         self._cached_trades.clear()
-        return full_update
+        if self._cached_deltas is None or latest_update.deltas is None:
+            deltas = None
+        else:
+            deltas = list(self._cached_deltas.values())
+        self._cached_deltas = {}
+        return Update.replace_deltas(full_update, deltas)
 
     def _check_ordering(self, update):
         if not self._updates:
@@ -79,10 +145,77 @@ class Subscriber:
                  prev_sequence, update.sequence)
         return False
 
+    def _cap_trades(self, trades):
+        """Discard oldest trades in place beyond ``max_cached_trades``."""
+        limit = self._max_cached_trades
+        if limit is not None and len(trades) > limit:
+            excess = len(trades) - limit
+            del trades[:excess]
+            self._trades_overflow += excess
+
+    def _cache_update(self, update):
+        self._cached_trades.extend(update.trades)
+        self._cap_trades(self._cached_trades)
+        if update.deltas is None:
+            self._cached_deltas = None
+        elif self._cached_deltas is not None:
+            self._cached_deltas.update(((d.side, d.price), d)
+                                       for d in update.deltas)
+
+    def _queue_update(self, update):
+        queue = self._queue
+        if len(queue) >= self._ring_size:
+            oldest = queue.popleft()
+            self._dropped += 1
+            if queue:
+                queue[0] = self._conflate(oldest, queue[0])
+            else:
+                update = self._conflate(oldest, update)
+        queue.append(update)
+
+    def _conflate(self, older, newer):
+        update = Update.conflate(older, newer)
+        if (self._max_cached_trades is not None
+                and len(update.trades) > self._max_cached_trades):
+            trades = list(update.trades)
+            self._cap_trades(trades)
+            update = Update.replace_trades(update, trades)
+        return update
+
+    def _release_sample(self):
+        self._sample_handle = None
+        self._last_sample = self._loop.time()
+        self._update_event.set()
+
+    def _schedule_sample(self):
+        if self._sample_handle is not None or self._update_event.is_set():
+            return
+        delay = self._last_sample + self._sample_interval - self._loop.time()
+        if delay <= 0:
+            self._release_sample()
+        else:
+            self._sample_handle = self._loop.call_later(delay,
+                                                        self._release_sample)
+
     async def _on_update(self, update):
         if not self._check_ordering(update):
             return
-        self._cached_trades.extend(update.trades)
         self._update_sequence += 1
         self._updates.append(update)
+        if self._policy == 'every':
+            if self._copy_levels:
+                update = Update.replace_book(update, _copy_book(update.book))
+            self._queue_update(update)
+        else:
+            self._cache_update(update)
+            if self._policy == 'sampled':
+                self._schedule_sample()
+                return
         self._update_event.set()
+
+
+def _copy_book(book):
+    """Return book with ``Level`` copies of the levels of book."""
+    def copy(levels):
+        return [Level(lvl.price, lvl.qty, lvl.orders) for lvl in levels]
+    return Book(book.sequence, copy(book.bids), copy(book.asks))
@@ -1,10 +1,12 @@
 import datetime as dt
 
+from .delta import merge_deltas
 from .status import Status
 from .trade import dump_trade
 
 class Update:
-    __slots__ = '_instrument', '_book', '_trades', '_status', '_timestamp'
+    __slots__ = ('_instrument', '_book', '_trades', '_status', '_timestamp',
+                 '_timestamp_parser', '_deltas')
 
     @staticmethod
     def replace_trades(update, trades):
@@ -13,22 +15,77 @@ class Update:
                 book=update.book,
                 trades=trades,
                 status=update.status,
-                timestamp=update.timestamp)
+                timestamp=update._timestamp,
+                timestamp_parser=update._timestamp_parser,
+                deltas=update._deltas)
+
+    @staticmethod
+    def replace_book(update, book):
+        return Update(
+                instrument=update.instrument,
+                book=book,
+                trades=update._trades,
+                status=update.status,
+                timestamp=update._timestamp,
+                timestamp_parser=update._timestamp_parser,
+                deltas=update._deltas)
+
+    @staticmethod
+    def replace_deltas(update, deltas):
+        return Update(
+                instrument=update.instrument,
+                book=update.book,
+                trades=update._trades,
+                status=update.status,
+                timestamp=update._timestamp,
+                timestamp_parser=update._timestamp_parser,
+                deltas=deltas)
+
+    @staticmethod
+    def conflate(older, newer):
+        """Replace ``older`` with ``newer``, keeping trades and deltas of
+        both."""
+        # Unavailable (None) older deltas must not be replaced by newer ones.
+        if not older.trades and not older.deltas and (
+                older.deltas is not None or newer.deltas is None):
+            return newer
+        return Update(
+                instrument=newer.instrument,
+                book=newer.book,
+                trades=older.trades + newer.trades,
+                status=newer.status,
+                timestamp=newer._timestamp,
+                timestamp_parser=newer._timestamp_parser,
+                deltas=merge_deltas(older.deltas, newer.deltas))
 
     def __init__(self,
                  instrument,
                  book,
                  trades=None,
                  status=None,
-                 timestamp=None):
+                 timestamp=None,
+                 timestamp_parser=None,
+                 deltas=None):
+        """
+        If ``timestamp_parser`` is given, ``timestamp`` is a raw value which
+        is only parsed the first time ``Update.timestamp`` is read.
+
+        ``deltas`` lists the ``LevelDelta`` changes since the previous update,
+        or is ``None`` when they are not available.
+        """
         self._instrument = instrument
         self._book = book
         self._trades = trades if trades else []
         self._status = status if status else Status.UNKNOWN
         self._timestamp = timestamp if timestamp else dt.datetime.now()
+        self._timestamp_parser = timestamp_parser if timestamp else None
+        self._deltas = deltas
 
     @property
     def timestamp(self):
+        if self._timestamp_parser is not None:
+            self._timestamp = self._timestamp_parser(self._timestamp)
+            self._timestamp_parser = None
         return self._timestamp
 
     @property
@@ -61,11 +118,20 @@ class Update:
     def status(self):
         return self._status
 
+    @property
+    def deltas(self):
+        """``LevelDelta`` list of levels changed since the previous update.
+
+        ``None`` if the gateway does not track deltas or the book was rebuilt;
+        start over from ``book`` then.
+        """
+        return self._deltas
+
     def _dump_update(self, book, trades):
         return {
             'instrument': str(self._instrument),
             'status': self._status.name,
-            'timestamp': str(self._timestamp),
+            'timestamp': str(self.timestamp),
             'book': book,
             'trades': trades
         }
@@ -85,7 +151,7 @@ class Update:
         res = '{}: {} - {}\n'.format(
                 self._instrument,
                 self._status,
-                self._timestamp)
+                self.timestamp)
         trades_before = self.trades_before_book()
         trades_after = self.trades_after_book()
         res += self._book.show(max_depth)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""GDAX Market Data Feed Handler
+
+Runs one GDAX gateway for all given instruments and writes top-of-book
+updates and trades into a shared-memory ring. Other services read it with
+``convex.market_data.shm_bus.ShmGateway`` instead of each decoding the GDAX
+feed themselves. With ``--listen`` updates are also served to
+``convex.market_data.socket_bus.SocketGateway`` clients on other hosts.
+
+Usage:
+    ./md_feed.py [options] <instrument>...
+
+Options:
+    -p --path <path>        Shared-memory ring file
+                            [default: /dev/shm/convex-md].
+    -d --depth <depth>      Number of levels to publish [default: 10].
+    -s --slots <count>      Number of ring slots [default: 4096].
+    -z --slot-size <size>   Bytes per ring slot [default: 4096].
+    -t --threaded           Run the GDAX feed on a worker thread.
+    -l --listen <address>   Also publish on host:port or Unix socket path.
+
+Arguments:
+    instrument  BTC, ETH or LTC.
+"""
+
+import asyncio
+import datetime as dt
+
+import docopt
+import logbook
+
+from convex.common.instrument import instruments_lookup
+from convex.exchanges import gdax
+from convex.market_data.shm_bus import ShmPublisher, ShmWriter
+from convex.market_data.socket_bus import SocketPublisher, parse_address
+
+log = logbook.Logger('MDFeed')
+
+
+def main(args):
+    instruments = [instruments_lookup[name] for name in args['<instrument>']]
+    depth = int(args['--depth'])
+    log.info('Starting Market Data Feed for {}', instruments)
+
+    loop = asyncio.get_event_loop()
+    writer = ShmWriter(args['--path'],
+                       slots=int(args['--slots']),
+                       slot_size=int(args['--slot-size']))
+    gateway = gdax.MDGateway(loop=loop,
+                             threaded=args['--threaded'],
+                             book_depth=depth)
+    ShmPublisher(gateway, instruments, writer, depth=depth)
+    if args['--listen']:
+        publisher = SocketPublisher(loop, depth=depth)
+        publisher.attach(gateway, instruments)
+        loop.run_until_complete(
+                publisher.start(parse_address(args['--listen'])))
+
+    task = asyncio.ensure_future(gateway.launch(), loop=loop)
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, return_exceptions=True,
+                                               loop=loop))
+    finally:
+        loop.run_until_complete(gateway.close())
+        writer.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    with logbook.FileHandler(
+            'logs/md_feed_{:%Y%m%d_%H:%M:%S}.log'.format(dt.datetime.today()),
+            level=logbook.INFO).applicationbound():
+        args = docopt.docopt(__doc__)
+        main(args)
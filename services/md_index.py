@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Market Data Recording Indexer
+
+Writes the sidecar index of recorder files, e.g. of files recorded before
+indexes existed or still being written, so Playback can seek to a time or
+sequence range.
+
+Usage:
+    ./md_index.py [options] <file>...
+
+Options:
+    -f --format <format>    Recording format (json, msgpack), deduced from
+                            the file name if not given.
+    -s --spacing <size>     Bytes between index entries of uncompressed
+                            json files [default: 1MB].
+
+Arguments:
+    file  Recording, optionally compressed.
+"""
+
+import docopt
+import logbook
+
+from convex.common.utils import dehumanize_bytes
+from convex.market_data.playback import Playback
+from convex.market_data.recording_index import build_index, index_path
+
+log = logbook.Logger('MDIndex')
+
+
+def main(args):
+    spacing = dehumanize_bytes(args['--spacing'])
+    for path in args['<file>']:
+        fmt = args['--format'] or Playback._deduce_format(path)
+        entries = build_index(path, fmt, spacing)
+        log.info('Indexed {}: {} entries in {}', path, entries,
+                 index_path(path))
+
+
+if __name__ == '__main__':
+    with logbook.StderrHandler(level=logbook.INFO).applicationbound():
+        main(docopt.docopt(__doc__))
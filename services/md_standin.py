@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Stand-in Market Data Server
+
+Serves synthetic random-walk books and trades to
+``convex.market_data.socket_bus.SocketGateway`` clients, for testing
+strategies and services offline without a GDAX connection.
+
+Usage:
+    ./md_standin.py [options] <address> <instrument>...
+
+Options:
+    -r --rate <count>       Updates per second per instrument [default: 10].
+    -d --depth <depth>      Number of levels per side [default: 10].
+    -p --price <price>      Initial mid price [default: 4000].
+    -s --seed <seed>        Random seed [default: 7].
+
+Arguments:
+    address     host:port or Unix socket path to listen on.
+    instrument  BTC, ETH or LTC.
+"""
+
+import asyncio
+import datetime as dt
+from decimal import Decimal
+import random
+
+import docopt
+import logbook
+
+from convex.common import Side
+from convex.common.instrument import instruments_lookup
+from convex.market_data import Book, Level, Status, Trade, Update
+from convex.market_data.socket_bus import SocketPublisher, parse_address
+
+log = logbook.Logger('MDStandIn')
+
+TICK = Decimal('0.01')
+
+
+class RandomBook:
+    """Random walk of a book around a mid price."""
+    def __init__(self, instrument, mid, depth, rng):
+        self._instrument = instrument
+        self._mid = Decimal(mid)
+        self._depth = depth
+        self._rng = rng
+        self._sequence = 0
+
+    def next_update(self):
+        rng = self._rng
+        self._sequence += 1
+        self._mid += rng.randint(-3, 3) * TICK
+        bids = [self._level(self._mid - (i + 1) * TICK)
+                for i in range(self._depth)]
+        asks = [self._level(self._mid + (i + 1) * TICK)
+                for i in range(self._depth)]
+        trades = []
+        if rng.random() < 0.3:
+            aggressor = rng.choice((Side.BID, Side.ASK))
+            price = asks[0].price if aggressor == Side.BID else bids[0].price
+            trades.append(Trade(aggressor, price, self._qty(),
+                                self._sequence, 'maker', 'taker',
+                                dt.datetime.now(dt.timezone.utc)))
+        return Update(instrument=self._instrument,
+                      book=Book(self._sequence, bids, asks),
+                      trades=trades,
+                      status=Status.OK,
+                      timestamp=dt.datetime.now(dt.timezone.utc))
+
+    def _level(self, price):
+        return Level(price, self._qty(), self._rng.randint(1, 5))
+
+    def _qty(self):
+        return Decimal(self._rng.randint(1, 10 ** 6)) / 10 ** 4
+
+
+async def run(publisher, books, interval):
+    while True:
+        for book in books:
+            publisher.publish(book.next_update())
+        await asyncio.sleep(interval)
+
+
+def main(args):
+    loop = asyncio.get_event_loop()
+    rng = random.Random(int(args['--seed']))
+    books = [RandomBook(instruments_lookup[name],
+                        args['--price'],
+                        int(args['--depth']),
+                        rng)
+             for name in args['<instrument>']]
+
+    publisher = SocketPublisher(loop, depth=int(args['--depth']))
+    loop.run_until_complete(publisher.start(parse_address(args['<address>'])))
+    task = asyncio.ensure_future(
+            run(publisher, books, 1 / float(args['--rate'])), loop=loop)
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        log.notice('Shutting down')
+    finally:
+        publisher.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """GDAX Market Data Recorder
 
+Records all given instruments from one shared gateway, each into its own
+files with independent rollover.
+
 Usage:
-    ./recorder.py [options] <instrument>
+    ./recorder.py [options] <instrument>...
 
 Options:
     -f --format <format>            Output format [default: json].
@@ -10,18 +13,34 @@ Options:
     -o --output <path>              Output directory [default: ./].
     -d --depth <depth>              Number of levels to record [default: 10].
     -m --maxsize <filesize>         File size before rolloer [default: 512MB].
+    -b --bus <path>                 Read market data from the shared-memory
+                                    ring of md_feed.py instead of GDAX.
+    -c --compression <codec>        Compress output while writing: gzip,
+                                    lzma, zstd or none [default: gzip].
+    -l --level <level>              Compression level, codec default if
+                                    not given.
+    -t --flush-interval <seconds>   Seconds between flush points, up to
+                                    which a file being written can be read
+                                    [default: 10].
+    -q --queue-size <records>       Records waiting for the writer thread
+                                    before new ones are dropped
+                                    [default: 10000].
 
 Arguments:
-    format  File format (json, msgpack).
+    instrument  BTC, ETH or LTC.
+    format  File format (json, msgpack, columnar, l3). l3 captures raw GDAX
+            websocket messages for replay with gdax.ReplayGateway.
+            Columnar files are neither compressed further nor flushed
+            before a block is full. Closed json and msgpack files get a
+            sidecar index for seeking with Playback(start=..., end=...);
+            index files still being written with md_index.py.
 """
 
 import asyncio
 import datetime as dt
-import gzip
+import functools
 import json
 import os
-import shutil
-import time
 
 import docopt
 import logbook
@@ -29,83 +48,156 @@ import msgpack
 
 from convex.common.instrument import instruments_lookup
 from convex.common.utils import humanize_bytes, dehumanize_bytes
+from convex.common.utils.background_writer import BackgroundWriter
+from convex.common.utils.compression import CompressedWriter, EXTENSIONS
 from convex.market_data import Subscriber as MDSubscriber
+from convex.market_data.capture import CaptureWriter
+from convex.market_data.columnar import ColumnarWriter
+from convex.market_data.recording_index import build_index
+from convex.market_data.shm_bus import ShmGateway
 from convex.exchanges import gdax
 
 log = logbook.Logger('MD')
 
 
 class Recorder:
+    """Record instruments from one shared gateway.
+
+    Keyword arguments are passed to each instrument's ``InstrumentRecorder``.
+    """
+    def __init__(self, instruments, *, bus_path=None, loop=None, **kwargs):
+        self._loop = (loop if loop is not None
+                      else asyncio.get_event_loop())
+        if bus_path is not None:
+            if kwargs.get('fmt') == 'l3':
+                raise ValueError('l3 capture needs the GDAX feed')
+            self._gateway = ShmGateway(bus_path, loop=self._loop)
+        else:
+            self._gateway = gdax.MDGateway(loop=self._loop)
+        self._recorders = [
+            InstrumentRecorder(instrument, self._gateway, loop=self._loop,
+                               **kwargs)
+            for instrument in instruments]
+
+    async def run(self):
+        coros = [self._gateway.launch()]
+        coros.extend(recorder.run() for recorder in self._recorders)
+        try:
+            await asyncio.gather(*coros, loop=self._loop)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._gateway.request_shutdown()
+            await self._gateway.close()
+
+
+class InstrumentRecorder:
+    """Write one instrument's updates from a shared gateway to files."""
     def __init__(self,
                  instrument,
+                 gateway,
                  depth: int,
                  output_dir: str,
                  interval: float,
                  fmt: str,
                  maxfilesize: int, *,
+                 compression='gzip',
+                 compression_level=None,
+                 flush_interval=10.0,
+                 queue_size=10000,
                  loop=None):
         if maxfilesize <= 1024:
             raise ValueError('maxsize must be greater than 1KB')
 
         self._loop = (loop if loop is not None
                       else asyncio.get_event_loop())
-        self._gateway = gdax.MDGateway(loop=self._loop)
-        self._subscriber = MDSubscriber(instrument, gateway=self._gateway)
+        self._interval = max(interval, 0.001)
+        self._gateway = gateway
+        self._subscriber = MDSubscriber(instrument,
+                                        gateway=self._gateway,
+                                        policy='sampled',
+                                        sample_interval=self._interval)
         self._tasks = []
 
-        self._interval = max(interval, 0.001)
         self._depth = max(depth, 1)
         self._maxfilesize = maxfilesize
+        self._fmt = fmt
         if fmt == 'json':
             self._write_update = self._write_json
         elif fmt == 'msgpack':
             self._write_update = self._write_msgpack
+        elif fmt == 'columnar':
+            self._write_update = self._write_columnar
+        elif fmt == 'l3':
+            self._write_update = self._write_l3
         else:
             raise ValueError('Unsupported format: {}'.format(fmt))
+        if compression == 'none' or fmt == 'columnar':
+            compression = None
+        elif compression not in EXTENSIONS:
+            raise ValueError('Unsupported compression: {}'.format(
+                compression))
+        self._compression = compression
+        self._compression_level = compression_level
+        self._compressed = None  # CompressedWriter of the current file
+        self._flush_interval = flush_interval
+        self._queue_size = queue_size
+        self._writer = None  # BackgroundWriter of the current file
+        # BackgroundWriters of rolled over files, possibly still writing
+        self._retired_writers = []
+        self._watch_handle = None
+        self._flush_handle = None
 
         self._output_dir = os.path.expanduser(output_dir)
         self._rollover_file()
 
     async def run(self):
-        coros = [
-            self._gateway.launch(),
-            self._poll_subscriber(),
-        ]
         try:
-            await asyncio.gather(*coros, loop=self._loop)
-        except asyncio.CancelledError:
-            pass
+            await self._poll_subscriber()
         finally:
-            await self._gateway.request_shutdown()
-            self.cleanup()
-
-    def _cleanup(self):
-        self._file.close()
-        filename, proc_time = self._gzip_file(self._filename)
-        log.info('gzipped file {} took {:0.2f}s', filename, proc_time)
+            await self._cleanup()
+
+    async def _cleanup(self):
+        for handle in (self._watch_handle, self._flush_handle):
+            if handle is not None:
+                handle.cancel()
+        self._close_file()
+        # Writer threads finish writing and index their files.
+        for writer in self._retired_writers + [self._writer]:
+            await self._loop.run_in_executor(None, writer.join)
+        self._retired_writers.clear()
+        if self._compressed is not None:
+            self._log_compression()
 
     async def _poll_subscriber(self):
         self._watch_file()
+        if self._write_update != self._write_columnar:
+            self._flush_file()  # Columnar blocks are written when full.
         try:
             while True:
                 update = await self._subscriber.fetch()
                 self._write_update(update)
-                await asyncio.sleep(self._interval)
         except asyncio.CancelledError:
             pass
 
     def _write_msgpack(self, update):
         data = update.dump(depth=self._depth)
-        msgpack.pack(data, self._file)
+        self._file.write(msgpack.packb(data))
 
     def _write_json(self, update):
-        json.dump(update.dump(depth=self._depth), self._file)
-        self._file.write('\n')
+        data = json.dumps(update.dump(depth=self._depth)) + '\n'
+        self._file.write(data.encode())
+
+    def _write_columnar(self, update):
+        self._file.write(update)
+
+    def _write_l3(self, update):
+        pass  # Raw messages are written by the gateway.
 
     def _write_update(self, update):
         """Write update to file"""
-        raise RuntimeError('Should be replaced by '
-                           '_write_json or _write_msgpack')
+        raise RuntimeError('Should be replaced by _write_json, '
+                           '_write_msgpack, _write_columnar or _write_l3')
 
     def _watch_file(self, interval=60):
         """Log file size periodically."""
@@ -113,69 +205,111 @@ class Recorder:
         log.info('Output file size: {}, {}',
                  humanize_bytes(file_size),
                  self._filename)
+        if self._compressed is not None:
+            self._log_compression()
+        self._log_writer()
         if file_size >= self._maxfilesize:
             self._rollover_file()
-        self._loop.call_later(interval, self._watch_file)
-
-    def _rollover_file(self):
+        self._watch_handle = self._loop.call_later(interval,
+                                                   self._watch_file)
+
+    def _flush_file(self):
+        """Flush file periodically, so it is readable up to this point."""
+        self._file.flush()
+        self._flush_handle = self._loop.call_later(self._flush_interval,
+                                                   self._flush_file)
+
+    def _log_compression(self):
+        compressed = self._compressed
+        log.info('Compression {}: {} to {}, ratio {:0.1f}, {}/s',
+                 compressed.codec,
+                 humanize_bytes(compressed.bytes_in),
+                 humanize_bytes(compressed.bytes_out),
+                 compressed.ratio,
+                 humanize_bytes(compressed.throughput))
+
+    def _log_writer(self):
+        stats = self._writer.stats
+        log.info('Writer: {} queued, max {}, dropped {} ({}), {} in {} '
+                 'writes, failed {} ({})',
+                 stats['queued'], stats['max_queued'], stats['dropped'],
+                 humanize_bytes(stats['dropped_bytes']),
+                 humanize_bytes(stats['written']), stats['batches'],
+                 stats['failed'], humanize_bytes(stats['failed_bytes']))
+
+    def _close_file(self):
         try:
-            self._file.close()  # Close file if one is open.
+            # Closed by the writer thread once queued records are written.
+            self._file.close()
         except AttributeError:
-            pass
-        else:
-            self._sched_gzip()  # gzip file on seperate thread.
+            return  # No file open yet.
+        self._log_writer()
+
+    def _rollover_file(self):
+        self._close_file()
 
         today = dt.datetime.utcnow()
         instrument = self._subscriber.instrument
-        file_ext, flags = {
-            self._write_json: ('json', 'a'),
-            self._write_msgpack: ('mp', 'ab'),
+        file_ext = {
+            self._write_json: 'json',
+            self._write_msgpack: 'mp',
+            self._write_columnar: 'cvx',
+            self._write_l3: 'l3',
         }[self._write_update]
 
         filename = '{:%Y%m%d_%H%M%S}_{}.{}'.format(today, instrument, file_ext)
+        if self._compression is not None:
+            filename += EXTENSIONS[self._compression]
         self._filename = os.path.join(self._output_dir, filename)
-        self._file = open(self._filename, flags)
+        if self._compression is not None:
+            self._compressed = CompressedWriter(self._filename,
+                                                self._compression,
+                                                self._compression_level)
+            file = self._compressed
+        else:
+            file = open(self._filename, 'wb')
+        on_close = None
+        if self._fmt in ('json', 'msgpack'):
+            on_close = functools.partial(build_index, self._filename,
+                                         self._fmt)
+        # Files are written on a thread, so a slow disk never holds up
+        # the event loop.
+        if self._writer is not None:
+            self._retired_writers.append(self._writer)
+        self._writer = BackgroundWriter(file,
+                                        max_queued=self._queue_size,
+                                        name='Recorder-writer',
+                                        on_close=on_close)
+        if self._write_update == self._write_columnar:
+            self._file = ColumnarWriter(self._writer, instrument,
+                                        depth=self._depth)
+        elif self._write_update == self._write_l3:
+            self._file = CaptureWriter(self._writer)
+            self._gateway.start_capture(self._file, instrument)
+        else:
+            self._file = self._writer
         log.info('Writing output to {}', self._filename)
 
-    def _sched_gzip(self):
-        def _on_done(fut):
-            filename, proc_time = fut.result()
-            log.info('gzipped file {} took {:0.2f}s', filename, proc_time)
-
-        coro = self._loop.run_in_executor(None,
-                                          Recorder._gzip_file,
-                                          self._filename)
-        coro.add_done_callback(_on_done)
-        coro = asyncio.shield(coro, loop=self._loop)
-        asyncio.ensure_future(coro, loop=self._loop)
-
-    @staticmethod
-    def _gzip_file(filename):
-        """Compress file with gzip.
-
-        Return (filename, processing time)
-        """
-        t0 = time.process_time()
-        with open(filename, 'rb') as f_in:
-            with gzip.open(filename + '.gz', 'wb', compresslevel=9) as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        t1 = time.process_time()
-        return filename + '.gz', (t1 - t0)
-
 
 def main(args):
     log.info('Starting Market Data Recorder for {}', args['<instrument>'])
 
     loop = asyncio.get_event_loop()
 
-    instrument = instruments_lookup[args['<instrument>']]
+    instruments = [instruments_lookup[name] for name in args['<instrument>']]
+    level = int(args['--level']) if args['--level'] else None
 
-    recorder = Recorder(instrument,
+    recorder = Recorder(instruments,
                         depth=int(args['--depth']),
                         interval=float(args['--interval']),
                         fmt=args['--format'],
                         output_dir=args['--output'],
                         maxfilesize=dehumanize_bytes(args['--maxsize']),
+                        bus_path=args['--bus'],
+                        compression=args['--compression'],
+                        compression_level=level,
+                        flush_interval=float(args['--flush-interval']),
+                        queue_size=int(args['--queue-size']),
                         loop=loop)
 
     task = asyncio.ensure_future(recorder.run(), loop=loop)
@@ -174,22 +174,16 @@ class SmartMD:
                                     params['web']['ip'],
                                     params['web']['port'])
 
-        # Start Market Data
-        md_gateways = set()
+        # Start Market Data, all instruments share one feed connection.
+        md_gw = gdax.MDGateway(loop=self._loop)
         subscribers = set()
         for instrument in self._instruments:
-            md_gw = gdax.MDGateway(loop=self._loop)
-            md_gateways.add(md_gw)
-
             subscribers.add(
                 MDSubscriber(instrument, gateway=md_gw))
 
             await self._web_server.add_handler(str(instrument), 'weighted_mid')
 
-        tasks = []
-        for md_gw in md_gateways:
-            tasks.append(
-                asyncio.ensure_future(self._launch_market_data(md_gw)))
+        tasks = [asyncio.ensure_future(self._launch_market_data(md_gw))]
 
         for sub in subscribers:
             tasks.append(
@@ -0,0 +1,4 @@
+import os
+
+# convex.exchanges.gdax opens its order entry audit log in ./audit on import.
+os.makedirs('audit', exist_ok=True)
@@ -0,0 +1,108 @@
+import io
+import threading
+
+import pytest
+
+from convex.common.utils.background_writer import BackgroundWriter
+
+
+class BlockingFile(io.BytesIO):
+    """In-memory file whose writes wait until released."""
+    def __init__(self):
+        io.BytesIO.__init__(self)
+        self.release = threading.Event()
+        self.writes = []
+        self.flushes = 0
+        self.contents = None
+
+    def write(self, data):
+        self.release.wait()
+        self.writes.append(bytes(data))
+        return io.BytesIO.write(self, data)
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.contents = self.getvalue()
+        io.BytesIO.close(self)
+
+
+def test_writes_batched_in_order():
+    file = BlockingFile()
+    writer = BackgroundWriter(file, batch_size=8)
+    for i in range(6):
+        assert writer.write(b'%d...' % i) == 4
+    assert writer.tell() == 24
+    writer.flush()
+    file.release.set()
+    writer.close()
+    writer.join(5)
+
+    assert file.contents == b'0...1...2...3...4...5...'
+    assert all(len(w) <= 8 for w in file.writes)
+    assert file.flushes >= 1
+    stats = writer.stats
+    assert stats['written'] == 24
+    assert stats['batches'] == len(file.writes)
+    assert stats['dropped'] == 0
+    with pytest.raises(ValueError):
+        writer.write(b'late')
+
+
+def test_drops_when_queue_full():
+    file = BlockingFile()
+    writer = BackgroundWriter(file, max_queued=2)
+    accepted = sum(writer.write(b'x') for _ in range(10))
+
+    # The thread holds at most one chunk in a blocked write.
+    assert 2 <= accepted <= 3
+    assert writer.tell() == accepted
+    stats = writer.stats
+    assert stats['dropped'] == 10 - accepted
+    assert stats['dropped_bytes'] == 10 - accepted
+    assert stats['max_queued'] == 2
+
+    file.release.set()
+    writer.close()
+    writer.join(5)
+    assert file.contents == b'x' * accepted
+
+
+def test_on_close_after_file_closed():
+    file = BlockingFile()
+    closed = []
+    writer = BackgroundWriter(file,
+                              on_close=lambda: closed.append(file.contents))
+    writer.write(b'data')
+    file.release.set()
+    writer.close()
+    writer.join(5)
+    assert closed == [b'data']
+
+
+class FailingFile(BlockingFile):
+    """File failing writes that contain b'!'."""
+    def write(self, data):
+        if b'!' in data:
+            raise OSError('disk full')
+        return BlockingFile.write(self, data)
+
+
+def test_stops_after_failed_write():
+    file = FailingFile()
+    writer = BackgroundWriter(file, batch_size=1)
+    for data in (b'ok', b'bad!', b'lost'):
+        assert writer.write(data) == len(data)
+    file.release.set()
+    while not writer.failed:
+        writer.join(0.001)
+    assert writer.write(b'late') == 0
+    writer.close()
+    writer.join(5)
+
+    assert file.contents == b'ok'
+    stats = writer.stats
+    assert (stats['failed'], stats['failed_bytes']) == (1, 8)
+    assert (stats['written'], stats['batches']) == (2, 1)
+    assert (stats['dropped'], stats['dropped_bytes']) == (1, 4)
@@ -0,0 +1,57 @@
+import gzip
+import shutil
+
+import pytest
+
+from convex.market_data.capture import (
+    CaptureReader, CaptureWriter, FRAME, SNAPSHOT)
+
+
+def test_capture_round_trip(tmpdir):
+    path = str(tmpdir.join('feed.l3'))
+    times = iter([0.0, 1.0, 2.0])  # Creation, then two records.
+    with CaptureWriter(path, clock=lambda: next(times)) as writer:
+        writer.write_frame('{"type":"open","sequence":11}')
+        writer.write_snapshot('BTC-USD', '{"sequence":10}')
+        writer.write_frame(b'{"type":"done"}', time=3.5)
+        assert writer.records == 3
+
+    # Appending keeps the original header.
+    with CaptureWriter(path, clock=lambda: 4.0) as writer:
+        writer.write_frame('{"type":"match"}')
+
+    with CaptureReader(path) as reader:
+        records = [(r.kind, r.time, r.key, r.data) for r in reader]
+        assert not reader.truncated
+    assert records == [
+        (FRAME, 1.0, '', '{"type":"open","sequence":11}'),
+        (SNAPSHOT, 2.0, 'BTC-USD', '{"sequence":10}'),
+        (FRAME, 3.5, '', '{"type":"done"}'),
+        (FRAME, 4.0, '', '{"type":"match"}'),
+    ]
+
+
+def test_capture_truncated_and_gzipped(tmpdir):
+    path = str(tmpdir.join('feed.l3'))
+    with CaptureWriter(path) as writer:
+        writer.write_frame('first')
+        writer.write_frame('second')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-3])  # Crash in the middle of the last record.
+    with open(path, 'rb') as f_in:
+        with gzip.open(path + '.gz', 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+
+    for name in (path, path + '.gz'):
+        with CaptureReader(name) as reader:
+            assert [r.data for r in reader] == ['first']
+            assert reader.truncated
+
+
+def test_capture_rejects_other_files(tmpdir):
+    path = tmpdir.join('other')
+    path.write('{"type":"open"}\n')
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
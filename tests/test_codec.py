@@ -0,0 +1,45 @@
+import datetime as dt
+from decimal import Decimal
+
+from convex.common import Side
+from convex.common.instrument import make_btc_usd
+from convex.exchanges import ExchangeID
+from convex.market_data import (Book, Level, LevelDelta, LevelsView, Status,
+                                Trade, Update)
+from convex.market_data.codec import decode_update, encode_update
+
+INSTRUMENT = make_btc_usd(ExchangeID.GDAX)
+TIME = dt.datetime(2017, 9, 21, 23, 22, 10, tzinfo=dt.timezone.utc)
+
+
+def make_update(sequence):
+    book = Book(sequence,
+                [Level(Decimal('100.01'), Decimal('1.5'), 2)],
+                [Level(Decimal('100.02'), Decimal('0.25'), 1)])
+    trade = Trade(Side.BID, Decimal('100.02'), Decimal('0.1'), sequence,
+                  'maker', 'taker', TIME)
+    return Update(INSTRUMENT, book, trades=[trade], status=Status.OK,
+                  timestamp=TIME)
+
+
+def test_codec_round_trip():
+    update = decode_update(encode_update(make_update(7)))
+    assert update.instrument == INSTRUMENT
+    assert update.status == Status.OK
+    assert update.timestamp == TIME
+    assert update.sequence == 7
+    assert update.book.best_bid.price == Decimal('100.01')
+    assert update.book.best_bid.orders == 2
+    assert update.book.best_ask.qty == Decimal('0.25')
+    assert update.trades == make_update(7).trades
+    assert update.deltas is None
+
+
+def test_codec_lazy_levels_and_deltas():
+    update = Update.replace_deltas(
+            make_update(8), [LevelDelta(Side.ASK, Decimal('100.03'), 0, 0)])
+    decoded = decode_update(encode_update(update, depth=1), lazy=True)
+    assert isinstance(decoded.book.bids, LevelsView)
+    assert [(lvl.price, lvl.qty) for lvl in decoded.book.bids] == [
+        (Decimal('100.01'), Decimal('1.5'))]
+    assert decoded.deltas == [LevelDelta(Side.ASK, Decimal('100.03'), 0, 0)]
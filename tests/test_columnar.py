@@ -0,0 +1,114 @@
+import datetime as dt
+from decimal import Decimal
+import io
+
+import pytest
+
+from convex.common import Side
+from convex.common.instrument import make_btc_usd
+from convex.exchanges import ExchangeID
+from convex.market_data import Book, Level, Status, Trade, Update
+from convex.market_data.columnar import ColumnarReader, ColumnarWriter
+
+INSTRUMENT = make_btc_usd(ExchangeID.GDAX)
+START = dt.datetime(2017, 9, 21, tzinfo=dt.timezone.utc)
+
+
+def make_update(i):
+    time = START + dt.timedelta(seconds=i)
+    book = Book(i,
+                [Level(Decimal('100') - i, Decimal('1.5'), 2)],
+                [Level(Decimal('101') + i, Decimal('0.25'), 1),
+                 Level(Decimal('102') + i, Decimal('3'), 4)])
+    trades = [Trade(Side.BID, Decimal('101'), Decimal('0.1'), i, 'm', 't',
+                    time)] if i % 3 == 0 else []
+    return Update(INSTRUMENT, book, trades=trades, status=Status.OK,
+                  timestamp=time)
+
+
+def write_recording(path, count, **kwargs):
+    with ColumnarWriter(path, INSTRUMENT, depth=2, block_rows=4,
+                        **kwargs) as writer:
+        for i in range(count):
+            writer.write(make_update(i))
+
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('rec.cvx'))
+    write_recording(path, 10)
+    with ColumnarReader(path) as reader:
+        assert reader.instrument == INSTRUMENT
+        assert len(reader.blocks) == 3
+        assert reader.rows == 10
+        updates = list(reader.updates())
+    assert [u.sequence for u in updates] == list(range(10))
+    u = updates[3]
+    assert u.timestamp == START + dt.timedelta(seconds=3)
+    assert [(lvl.price, lvl.qty, lvl.orders) for lvl in u.book.bids] == [
+        (Decimal('97'), Decimal('1.5'), 2)]
+    assert len(u.book.asks) == 2
+    assert u.trades == make_update(3).trades
+    assert updates[4].trades == []
+
+
+def test_read_columns_in_time_range(tmpdir):
+    path = str(tmpdir.join('rec.cvx'))
+    write_recording(path, 10, compress=False)
+    with ColumnarReader(path) as reader:
+        cols = reader.read(['sequence', 'ask_price', 'trade_sequence',
+                            'trade_row'],
+                           start=START + dt.timedelta(seconds=2),
+                           end=START + dt.timedelta(seconds=7))
+    assert list(cols['sequence']) == [2, 3, 4, 5, 6]
+    assert len(cols['ask_price']) == 10
+    assert list(cols['trade_sequence']) == [3, 6]
+    assert list(cols['trade_row']) == [1, 4]
+
+
+def test_read_sequence_range(tmpdir):
+    path = str(tmpdir.join('rec.cvx'))
+    write_recording(path, 10)
+    with ColumnarReader(path) as reader:
+        assert list(reader.read(['sequence'], start=5, end=9)['sequence']) \
+            == [5, 6, 7, 8]
+        assert [u.sequence for u in reader.updates(start=8)] == [8, 9]
+        assert [u.sequence for u in reader.updates(end=3)] == [0, 1, 2]
+        with pytest.raises(ValueError):
+            reader.read(start=START, end=3)
+
+
+class DroppingFile(io.BytesIO):
+    """Accepts nothing while ``dropping``, like a full BackgroundWriter."""
+    dropping = False
+
+    def write(self, data):
+        return 0 if self.dropping else super().write(data)
+
+    def close(self):
+        pass
+
+
+def test_dropped_blocks_not_indexed(tmpdir):
+    file = DroppingFile()
+    writer = ColumnarWriter(file, INSTRUMENT, depth=2, block_rows=4)
+    for i in range(12):
+        file.dropping = 4 <= i < 8
+        writer.write(make_update(i))
+    writer.close()
+    assert (writer.blocks, writer.dropped_blocks) == (2, 1)
+
+    path = tmpdir.join('rec.cvx')
+    path.write_binary(file.getvalue())
+    with ColumnarReader(str(path)) as reader:
+        assert [u.sequence for u in reader.updates()] == [0, 1, 2, 3,
+                                                          8, 9, 10, 11]
+
+
+def test_recording_without_footer(tmpdir):
+    path = str(tmpdir.join('rec.cvx'))
+    writer = ColumnarWriter(path, INSTRUMENT, depth=2, block_rows=4)
+    for i in range(9):
+        writer.write(make_update(i))
+    writer._file.close()  # Crash before close, last row is lost.
+    with ColumnarReader(path) as reader:
+        assert [u.sequence for u in reader.updates()] == list(range(8))
@@ -0,0 +1,46 @@
+import pytest
+
+from convex.common.utils import compression
+from convex.common.utils.compression import (
+    CompressedWriter, EXTENSIONS, open_compressed)
+from convex.market_data import Playback
+
+CODECS = ['gzip', 'lzma', pytest.param('zstd', marks=pytest.mark.skipif(
+    compression.zstandard is None, reason='zstandard not installed'))]
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_flush_points_are_readable(tmpdir, codec):
+    path = str(tmpdir.join('out' + EXTENSIONS[codec]))
+    writer = CompressedWriter(path, codec)
+    writer.write(b'first\n')
+    writer.flush()
+    writer.flush()  # Nothing new to flush.
+    writer.write(b'second\n')
+    writer.flush()
+    writer.write(b'unflushed\n')
+
+    # The writer is still open; the file is readable up to the last flush.
+    with open_compressed(path) as f:
+        assert f.read() == b'first\nsecond\n'
+
+    writer.close()
+    with open_compressed(path) as f:
+        assert f.read() == b'first\nsecond\nunflushed\n'
+    assert writer.bytes_in == 23
+    assert writer.bytes_out > 0
+    assert writer.ratio > 0
+    assert writer.throughput > 0
+
+
+def test_playback_reads_compressed_json(tmpdir):
+    path = str(tmpdir.join('rec.json.gz'))
+    with CompressedWriter(path, 'gzip') as writer:
+        writer.write(b'{"sequence": 1}\n')
+        writer.write(b'{"sequence": 2}\n')
+    assert [u['sequence'] for u in Playback(path)] == [1, 2]
+
+
+def test_unsupported_codec(tmpdir):
+    with pytest.raises(ValueError):
+        CompressedWriter(str(tmpdir.join('out')), 'bz2')
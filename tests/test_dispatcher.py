@@ -0,0 +1,59 @@
+import asyncio
+
+from convex.common import Side
+from convex.market_data import Book, LevelDelta, Update
+from convex.market_data.dispatcher import Delivery
+
+
+def make_update(sequence, trades=None, deltas=None):
+    return Update(instrument='BTCUSD@GDAX',
+                  book=Book(sequence, [], []),
+                  trades=trades,
+                  deltas=deltas)
+
+
+def test_conflate():
+    delta = LevelDelta(Side.BID, 5, 1, 1)
+    newer = make_update(2, deltas=[delta])
+    assert Update.conflate(make_update(1, deltas=[]), newer) is newer
+    plain = make_update(2)
+    assert Update.conflate(make_update(1), plain) is plain
+
+    # Unavailable older deltas stay unavailable, older trades are kept.
+    merged = Update.conflate(make_update(1), newer)
+    assert merged.sequence == 2 and merged.deltas is None
+    merged = Update.conflate(make_update(1, ['t1'], deltas=[]), newer)
+    assert merged.trades == ['t1'] and merged.deltas == [delta]
+
+
+def test_conflates_while_busy():
+    loop = asyncio.new_event_loop()
+    received = []
+    release = loop.create_future()
+
+    async def slow(update):
+        received.append((update.sequence, update.trades))
+        if len(received) == 1:
+            await release
+
+    async def scenario():
+        delivery = Delivery(slow, loop)
+        delivery.put(make_update(1, ['t1']))
+        await asyncio.sleep(0)
+        for seq in range(2, 6):
+            delivery.put(make_update(seq, ['t{}'.format(seq)]))
+        assert delivery.has_pending()
+        release.set_result(None)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        delivery.close()
+        return delivery
+
+    try:
+        delivery = loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert received == [(1, ['t1']), (5, ['t2', 't3', 't4', 't5'])]
+    assert delivery.delivered == 2
+    assert delivery.conflated == 3
+    assert delivery.lag.count == 2
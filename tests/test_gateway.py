@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from convex.common import Side
+from convex.market_data import Gateway, LevelDelta, OrderBasedBook
+
+
+class DummyGateway(Gateway):
+    def subscribe(self, instrument):
+        pass
+
+
+def _loop_arguments_supported():
+    try:
+        asyncio.Queue(loop=None)
+    except TypeError:
+        return False
+    return True
+
+
+def test_publish_only_changed_instruments():
+    loop = asyncio.new_event_loop()
+    gateway = DummyGateway(loop=loop)
+    received = []
+
+    async def on_update(update):
+        received.append((update.instrument, update.sequence))
+
+    gateway.register('BTCUSD@GDAX', on_update)
+    gateway.register('ETHUSD@GDAX', on_update)
+
+    async def scenario():
+        gateway.set_book('BTCUSD@GDAX', 1, OrderBasedBook())
+        gateway.publish()
+        await asyncio.sleep(0)
+        gateway.publish()
+        await asyncio.sleep(0)
+        gateway.set_book('ETHUSD@GDAX', 2, OrderBasedBook())
+        gateway.publish()
+        await asyncio.sleep(0)
+        for instrument in ('BTCUSD@GDAX', 'ETHUSD@GDAX'):
+            gateway.unregister(instrument, on_update)
+        await asyncio.sleep(0)
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert received == [('BTCUSD@GDAX', 1), ('ETHUSD@GDAX', 2)]
+
+
+def test_timestamps_per_instrument():
+    loop = asyncio.new_event_loop()
+    gateway = DummyGateway(loop=loop)
+    received = {}
+
+    async def on_update(update):
+        received[update.instrument] = update.timestamp
+
+    gateway.register('BTCUSD@GDAX', on_update)
+    gateway.register('ETHUSD@GDAX', on_update)
+
+    async def scenario():
+        gateway.set_timestamp('BTCUSD@GDAX', '1', parser=int)
+        gateway.set_book('BTCUSD@GDAX', 1, OrderBasedBook())
+        gateway.set_timestamp('ETHUSD@GDAX', 2)
+        gateway.set_book('ETHUSD@GDAX', 2, OrderBasedBook())
+        gateway.publish()
+        await asyncio.sleep(0)
+        for instrument in ('BTCUSD@GDAX', 'ETHUSD@GDAX'):
+            gateway.unregister(instrument, on_update)
+        await asyncio.sleep(0)
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert received == {'BTCUSD@GDAX': 1, 'ETHUSD@GDAX': 2}
+
+
+def test_publish_deltas():
+    loop = asyncio.new_event_loop()
+    gateway = DummyGateway(loop=loop, book_deltas=True)
+    received = []
+
+    async def on_update(update):
+        received.append(update.deltas)
+
+    gateway.register('BTCUSD@GDAX', on_update)
+    book = OrderBasedBook(track_deltas=True)
+
+    async def scenario():
+        book.add_order(side=Side.BID, order_id=1, price=5, qty=2)
+        gateway.set_book('BTCUSD@GDAX', 1, book)
+        gateway.publish()
+        await asyncio.sleep(0)
+        book.add_order(side=Side.BID, order_id=2, price=4, qty=1)
+        gateway.set_book('BTCUSD@GDAX', 2, book)
+        gateway.publish()
+        await asyncio.sleep(0)
+        gateway.unregister('BTCUSD@GDAX', on_update)
+        await asyncio.sleep(0)
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    # The first book is new, so consumers start from its full snapshot.
+    assert received == [None, [LevelDelta(Side.BID, 4, 1, 1)]]
+
+
+@pytest.mark.skipif(not _loop_arguments_supported(),
+                    reason='asyncio loop arguments unsupported')
+def test_close_stops_deliveries():
+    loop = asyncio.new_event_loop()
+    gateway = DummyGateway(loop=loop)
+    received = []
+    release = loop.create_future()
+
+    async def slow(update):
+        received.append(update.sequence)
+        await release
+
+    gateway.register('BTCUSD@GDAX', slow)
+    gateway.register('ETHUSD@GDAX', slow, aggregated=True)
+
+    async def scenario():
+        for instrument in ('BTCUSD@GDAX', 'ETHUSD@GDAX'):
+            gateway.set_book(instrument, 1, OrderBasedBook())
+        gateway.publish()
+        await asyncio.sleep(0, loop=loop)
+        gateway.set_book('BTCUSD@GDAX', 2, OrderBasedBook())
+        gateway.publish()
+        tasks = [delivery._task for deliveries in (
+                     gateway._callbacks['BTCUSD@GDAX'],
+                     gateway._aggregated_callbacks['ETHUSD@GDAX'])
+                 for delivery in deliveries.values()]
+        await gateway.close()
+        return tasks
+
+    try:
+        tasks = loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert received == [1, 1]  # Pending update 2 is dropped.
+    assert len(tasks) == 2 and all(task.cancelled() for task in tasks)
+    assert not gateway.is_registered('BTCUSD@GDAX')
+    assert not gateway.is_registered('ETHUSD@GDAX')
@@ -0,0 +1,377 @@
+import asyncio
+from decimal import Decimal
+import json
+
+import logbook
+import pytest
+
+from convex.common.instrument import make_btc_usd, make_eth_usd
+from convex.exchanges import ExchangeID, gdax
+from convex.exchanges.gdax.snapshot import SnapshotLoader, snapshot_sequence
+from convex.market_data import Status
+from convex.market_data.capture import (FRAME, SNAPSHOT, CaptureReader,
+                                        CaptureWriter)
+
+BTC = make_btc_usd(ExchangeID.GDAX)
+ETH = make_eth_usd(ExchangeID.GDAX)
+TIME = '2017-01-01T00:00:00.000000Z'
+
+
+def message(type, sequence, **fields):
+    fields.update(type=type, sequence=sequence, product_id='BTC-USD',
+                  time=TIME)
+    return json.dumps(fields)
+
+
+def snapshot(sequence, bids, asks):
+    """Level-3 snapshot of (price, size, order_id) bids and asks."""
+    return json.dumps({'sequence': sequence, 'bids': bids, 'asks': asks})
+
+
+# Joins the feed at 11, before the snapshot at 10 lands.
+FEED = [
+    ('frame', message('open', 11, side='buy', order_id='b2', price='99.00',
+                      remaining_size='1.0')),
+    ('snapshot', snapshot(10, [['100.00', '2.0', 'b1']],
+                          [['101.00', '3.0', 'a1']])),
+    ('frame', message('open', 12, side='sell', order_id='a2',
+                      price='102.00', remaining_size='1.5')),
+    ('frame', message('match', 13, side='sell', maker_order_id='a1',
+                      taker_order_id='t1', price='101.00', size='1.0')),
+    ('frame', message('received', 14, side='buy')),
+    ('frame', message('match', 15, side='sell', maker_order_id='a1',
+                      taker_order_id='t2', price='101.00', size='0.5')),
+    ('frame', message('done', 16, side='buy', order_id='b1',
+                      price='100.00', reason='canceled')),
+]
+
+
+def write_capture(path, records):
+    with CaptureWriter(path) as capture:
+        for kind, data in records:
+            if kind == 'snapshot':
+                capture.write_snapshot('BTC-USD', data)
+            else:
+                capture.write_frame(data)
+
+
+def levels(levels):
+    return [(str(lvl.price), str(lvl.qty)) for lvl in levels]
+
+
+def _loop_arguments_supported():
+    try:
+        asyncio.Queue(loop=None)
+    except TypeError:
+        return False
+    return True
+
+
+# The gateways pass ``loop`` to asyncio, which Python 3.10 no longer accepts.
+pytestmark = pytest.mark.skipif(not _loop_arguments_supported(),
+                                reason='asyncio loop arguments unsupported')
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+async def ignore(update):
+    pass
+
+
+def test_stats_logging_stops_with_launch(tmpdir, loop):
+    path = str(tmpdir.join('empty.l3'))
+    CaptureWriter(path).close()
+    gateway = gdax.ReplayGateway(path, loop=loop, stats_interval=0.001)
+    gateway.register(BTC, ignore)
+
+    with logbook.TestHandler() as handler:
+        loop.run_until_complete(gateway.launch())
+        logged = len(handler.records)
+        loop.run_until_complete(asyncio.sleep(0.02, loop=loop))
+    loop.run_until_complete(gateway.close())
+    assert not any('Messages/s' in record.message
+                   for record in handler.records[logged:])
+
+
+def test_threaded_replay(tmpdir, loop):
+    path = str(tmpdir.join('feed.l3'))
+    write_capture(path, FEED)
+    # A one-entry ring drops all but the latest update.
+    gateway = gdax.ReplayGateway(path, loop=loop, threaded=True,
+                                 ring_size=1)
+    updates = []
+
+    async def on_update(update):
+        updates.append(update)
+
+    gateway.register(BTC, on_update)
+    loop.run_until_complete(gateway.launch())
+    loop.run_until_complete(asyncio.sleep(0.01, loop=loop))
+    loop.run_until_complete(gateway.close())
+
+    last = updates[-1]
+    assert last.sequence == 16
+    assert levels(last.book.bids) == [('99.00', '1.0')]
+    assert levels(last.book.asks) == [('101.00', '1.5'), ('102.00', '1.5')]
+    trades = [trade.taker_id for update in updates for trade in update.trades]
+    assert trades == ['t1', 't2']
+
+
+def test_capture_starts_with_book_snapshot(tmpdir, loop):
+    live = gdax.MDGateway(loop=loop)
+    live.register(BTC, ignore)
+    product = live._products['BTC-USD']
+    (_, first), (_, text), *frames = FEED
+    live._apply_snapshot(product, SnapshotLoader().load(text), 10)
+
+    def receive(raw):
+        live._capture_frame(raw)
+        live._on_raw_message(raw)
+
+    receive(first)
+    path = str(tmpdir.join('rollover.l3'))
+    capture = CaptureWriter(path)
+    loop.run_until_complete(live.start_capture(capture, BTC))
+    for _, raw in frames:
+        receive(raw)
+    capture.close()
+    live._publish_products()
+    loop.run_until_complete(live.close())
+    # The capture did not cost a recovery.
+    assert live.recovery_stats['BTC-USD']['recoveries'] == 1
+    assert product.sequence == 16
+
+    replay = gdax.ReplayGateway(path, loop=loop)
+    updates = []
+
+    async def on_update(update):
+        updates.append(update)
+
+    replay.register(BTC, on_update)
+    loop.run_until_complete(replay.launch())
+    loop.run_until_complete(asyncio.sleep(0, loop=loop))
+    loop.run_until_complete(replay.close())
+
+    assert replay.frames == len(frames)
+    expected = product.book.make_book(16)
+    book = replay._products['BTC-USD'].book.make_book(16)
+    assert levels(book.bids) == levels(expected.bids) == [('99.00', '1.0')]
+    assert levels(book.asks) == levels(expected.asks)
+    assert [lvl.orders_view() for lvl in book.asks] == [
+        lvl.orders_view() for lvl in expected.asks]
+    assert updates[-1].sequence == 16
+    trades = [trade.taker_id for update in updates for trade in update.trades]
+    assert trades == ['t1', 't2']
+
+
+def test_capture_routing(tmpdir, loop):
+    gateway = gdax.MDGateway(loop=loop)
+    gateway.register(BTC, ignore)
+    gateway.register(ETH, ignore)
+    btc = gateway._products['BTC-USD']
+    gateway._apply_snapshot(btc, SnapshotLoader().load(FEED[1][1]), 10)
+    eth_snapshot = snapshot(6, [], [])
+
+    async def fetch_snapshot(product):
+        return eth_snapshot
+
+    gateway._fetch_snapshot = fetch_snapshot
+    paths = {name: str(tmpdir.join(name + '.l3'))
+             for name in ('all', 'btc', 'eth')}
+    captures = {name: CaptureWriter(path) for name, path in paths.items()}
+
+    def eth_frame(sequence):
+        return message('received', sequence, side='buy').replace(
+                'BTC-USD', 'ETH-USD')
+
+    async def scenario():
+        await gateway.start_capture(captures['all'])
+        await gateway.start_capture(captures['btc'], BTC)
+        await gateway.start_capture(captures['eth'], ETH)
+        for raw in ('{"type": "subscriptions"}', FEED[0][1], eth_frame(7)):
+            gateway._capture_frame(raw)
+            gateway._on_raw_message(raw)
+        await asyncio.sleep(0, loop=loop)  # ETH recovers from 6.
+        await gateway.start_capture(None, BTC)
+        gateway._capture_frame(FEED[2][1])
+        await gateway.close()
+
+    loop.run_until_complete(scenario())
+    for capture in captures.values():
+        capture.close()
+
+    def records(name):
+        with CaptureReader(paths[name]) as reader:
+            return [(record.kind, record.key, snapshot_sequence(record.data)
+                     if record.kind == SNAPSHOT
+                     else json.loads(record.data).get('sequence'))
+                    for record in reader]
+
+    # Each capture starts with a snapshot of the book, if there is one.
+    assert records('all') == [(SNAPSHOT, 'BTC-USD', 10), (FRAME, '', None),
+                              (FRAME, '', 12)]
+    assert records('btc') == [(SNAPSHOT, 'BTC-USD', 10), (FRAME, '', 11)]
+    assert records('eth') == [(FRAME, '', 7), (SNAPSHOT, 'ETH-USD', 6)]
+    assert gateway._products['ETH-USD'].sequence == 7
+
+
+def test_fixed_point_replay(tmpdir, loop):
+    path = str(tmpdir.join('feed.l3'))
+    write_capture(path, FEED)
+    books = {}
+    for fixed_point in (False, True):
+        gateway = gdax.ReplayGateway(path, loop=loop,
+                                     fixed_point=fixed_point)
+        updates = []
+
+        async def on_update(update):
+            updates.append(update)
+
+        gateway.register(BTC, on_update)
+        loop.run_until_complete(gateway.launch())
+        loop.run_until_complete(asyncio.sleep(0, loop=loop))
+        loop.run_until_complete(gateway.close())
+        book = updates[-1].book
+        books[fixed_point] = [(lvl.price, lvl.qty, lvl.orders)
+                              for lvl in book.bids + book.asks]
+        trades = [(trade.price, trade.qty)
+                  for update in updates for trade in update.trades]
+        assert trades == [(Decimal('101.00'), Decimal('1.0')),
+                          (Decimal('101.00'), Decimal('0.5'))]
+    assert books[True] == books[False]
+    assert all(isinstance(value, Decimal)
+               for level in books[True] for value in level[:2])
+
+
+def open_message(sequence):
+    return message('open', sequence, side='buy', order_id=str(sequence),
+                   price='99.00', remaining_size='1.0')
+
+
+def test_messages_during_recovery_are_replayed(loop):
+    gateway = gdax.MDGateway(loop=loop)
+    gateway.register(BTC, ignore)
+    fetched = loop.create_future()
+
+    async def fetch_snapshot(product):
+        return await fetched
+
+    gateway._fetch_snapshot = fetch_snapshot
+
+    async def scenario():
+        # The first message is a gap, the rest arrive during the fetch.
+        for sequence in range(11, 21):
+            gateway._on_raw_message(open_message(sequence))
+        fetched.set_result(snapshot(12, [], []))
+        for _ in range(3):
+            await asyncio.sleep(0, loop=loop)
+        gateway._on_raw_message(open_message(21))
+        gateway._publish_products()
+        await gateway.close()
+
+    loop.run_until_complete(scenario())
+    stats = gateway.recovery_stats['BTC-USD']
+    assert stats['recoveries'] == 1
+    assert stats['last_replayed'] == 8  # 13 to 20
+    product = gateway._products['BTC-USD']
+    assert not product.recovering
+    assert product.sequence == 21
+    assert product.book.order_count == 9
+
+
+def test_gap_status_carries_product_timestamp(loop):
+    gateway = gdax.MDGateway(loop=loop)
+    updates = []
+
+    async def on_update(update):
+        updates.append(update)
+
+    gateway.register(BTC, on_update)
+    gateway.register(ETH, ignore)
+    gateway._fetch_snapshot = lambda product: loop.create_future()
+    gateway._products['BTC-USD'].sequence = 10
+    gateway._products['ETH-USD'].sequence = 5
+
+    async def scenario():
+        gateway._on_raw_message(json.dumps({
+            'type': 'received', 'sequence': 6, 'product_id': 'ETH-USD',
+            'time': '2017-01-01T00:00:05.000000Z'}))
+        gateway._on_raw_message(open_message(12))  # Gap after 10.
+        await asyncio.sleep(0, loop=loop)
+        await gateway.close()
+
+    loop.run_until_complete(scenario())
+    assert [(update.status, update.timestamp.second)
+            for update in updates] == [(Status.GAPPED, 0)]
+
+
+def change_message(sequence, order_id, new_size):
+    return message('change', sequence, side='buy', order_id=order_id,
+                   price='99.00', new_size=new_size)
+
+
+def test_replay_buffer(loop):
+    gateway = gdax.MDGateway(loop=loop)
+    gateway.register(BTC, ignore)
+    product = gateway._products['BTC-USD']
+    product.recovering = True
+    for raw in (open_message(9), open_message(10), open_message(11),
+                change_message(12, '11', '0.5'),
+                change_message(13, '11', '0.25')):
+        gateway._on_raw_message(raw)
+    assert gateway.message_stats == {
+        'decoded': 0, 'skipped': 0, 'buffered': 5}
+
+    book = SnapshotLoader().load(json.loads(
+        snapshot(10, [['99.00', '1.0', '10']], [])))
+    gateway._apply_snapshot(product, book, 10)
+
+    assert not product.recovering
+    assert product.sequence == 13
+    assert product.last_replayed == 3
+    level, = product.book.make_book(13).bids
+    assert level.orders_view() == {'10': Decimal('1.0'),
+                                   '11': Decimal('0.25')}
+    assert gateway.recovery_stats['BTC-USD']['buffer_overflows'] == 0
+    loop.run_until_complete(gateway.close())
+
+
+def test_recovery_buffer_overflow(loop):
+    gateway = gdax.MDGateway(loop=loop, recovery_buffer_size=3)
+    gateway.register(BTC, ignore)
+    product = gateway._products['BTC-USD']
+    product.recovering = True
+    for sequence in range(11, 16):
+        gateway._on_raw_message(open_message(sequence))
+
+    assert gateway.recovery_stats['BTC-USD']['buffer_overflows'] == 2
+    assert gateway.message_stats['buffered'] == 5
+    assert gateway.message_stats['skipped'] == 0
+    loop.run_until_complete(gateway.close())
+
+
+def test_snapshot_load_yields_between_chunks(loop):
+    text = snapshot(1, [['100.00', '1.0', str(i)] for i in range(10)],
+                    [['101.00', '1.0', str(i)] for i in range(10, 15)])
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0, loop=loop)
+
+    async def scenario():
+        task = asyncio.ensure_future(ticker(), loop=loop)
+        loader = SnapshotLoader(chunk_size=5)
+        book = await loader.load_async(text, loop=loop)
+        task.cancel()
+        return book
+
+    book = loop.run_until_complete(scenario())
+    assert book.order_count == 15
+    assert len(ticks) >= 3  # One per chunk.
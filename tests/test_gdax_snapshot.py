@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from convex.common import Side, make_price, make_qty
+from convex.common.price import PRICE_UNITS, QTY_UNITS
+from convex.exchanges.gdax.snapshot import (SnapshotLoader, dump_snapshot,
+                                            snapshot_sequence)
+from convex.market_data import OrderBasedBook
+
+ASK, BID = Side.ASK, Side.BID
+
+SNAPSHOT = {
+    'sequence': 7,
+    'bids': [['100.00', '1.0', 'b1'], ['100.00', '2.0', 'b2'],
+             ['100.00', '0.5', 'b3'], ['99.50', '1.0', 'b4']],
+    'asks': [['101.00', '1.5', 'a1'], ['101.00', '1.0', 'a2'],
+             ['102.00', '3.0', 'a3']],
+}
+
+
+def load_per_order(snapshot):
+    """Build book one order at a time, as MDGateway._on_snapshot did."""
+    book = OrderBasedBook()
+    for side, orders in ((BID, snapshot['bids']), (ASK, snapshot['asks'])):
+        for price, size, order_id in orders:
+            book.add_order(side=side, order_id=order_id,
+                           price=make_price(price), qty=make_qty(size))
+    return book
+
+
+def contents(book):
+    b = book.make_book(sequence=0)
+    return [(lvl.price, lvl.qty, list(lvl.orders_view().items()))
+            for lvl in b.bids + b.asks]
+
+
+class CountingBook(OrderBasedBook):
+    """Book recording the side and order count of each bulk insert."""
+    def __init__(self):
+        OrderBasedBook.__init__(self)
+        self.inserts = []
+
+    def add_levels(self, side, groups):
+        groups = list(groups)
+        self.inserts.append((side, sum(len(orders) for _, orders in groups)))
+        OrderBasedBook.add_levels(self, side, groups)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5000])
+@pytest.mark.parametrize('raw', [False, True])
+def test_matches_per_order_build(chunk_size, raw):
+    snapshot = json.dumps(SNAPSHOT) if raw else SNAPSHOT
+    book = SnapshotLoader(chunk_size=chunk_size).load(snapshot)
+    assert contents(book) == contents(load_per_order(SNAPSHOT))
+    assert book.order_count == 7
+
+
+@pytest.mark.parametrize('raw', [False, True])
+def test_chunk_boundaries(raw):
+    snapshot = json.dumps(SNAPSHOT) if raw else SNAPSHOT
+    # The second chunk of bids continues the 100.00 level.
+    book = SnapshotLoader(make_book=CountingBook, chunk_size=2).load(snapshot)
+    assert book.inserts == [(BID, 2), (BID, 2), (ASK, 2), (ASK, 1)]
+    level = book.make_book(sequence=0).best_bid
+    assert level.qty == make_qty('3.5')
+    assert list(level.orders_view()) == ['b1', 'b2', 'b3']
+
+
+def test_raw_layout():
+    # Key order and whitespace are not fixed.
+    text = json.dumps({'asks': SNAPSHOT['asks'], 'bids': SNAPSHOT['bids'],
+                       'sequence': 7}, indent=1)
+    book = SnapshotLoader().load(text)
+    assert contents(book) == contents(load_per_order(SNAPSHOT))
+    assert snapshot_sequence(text) == snapshot_sequence(SNAPSHOT) == 7
+
+    empty = SnapshotLoader().load('{"sequence":1,"bids":[],"asks":[]}')
+    assert empty.order_count == 0
+
+
+def test_raw_not_a_snapshot():
+    with pytest.raises(ValueError):
+        SnapshotLoader().load('{"message":"rate limit exceeded"}')
+    with pytest.raises(ValueError):
+        snapshot_sequence('{"message":"rate limit exceeded"}')
+
+
+def test_dump_snapshot():
+    text = dump_snapshot(load_per_order(SNAPSHOT), 7)
+    assert json.loads(text) == SNAPSHOT
+    assert snapshot_sequence(text) == 7
+    assert json.loads(dump_snapshot(OrderBasedBook(), 3)) == {
+        'sequence': 3, 'bids': [], 'asks': []}
+
+
+def test_dump_snapshot_fixed_point():
+    loader = SnapshotLoader(
+            make_book=lambda: OrderBasedBook(price_units=PRICE_UNITS,
+                                             qty_units=QTY_UNITS),
+            parse_price=PRICE_UNITS.to_units, parse_qty=QTY_UNITS.to_units)
+    book = loader.load(SNAPSHOT)
+    assert contents(SnapshotLoader().load(dump_snapshot(book, 7))) == \
+        contents(load_per_order(SNAPSHOT))
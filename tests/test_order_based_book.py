@@ -1,11 +1,19 @@
+from decimal import Decimal
+
 import pytest
 
-from convex.market_data import OrderBasedBook
+from convex.common.price import FixedPoint
+from convex.market_data import LevelDelta, OrderBasedBook, OrderBasedLevel
 from convex.common import Side
 
 ASK, BID = Side.ASK, Side.BID
 
 
+@pytest.fixture(autouse=True)
+def check_consistency(monkeypatch):
+    monkeypatch.setattr(OrderBasedLevel, 'check_consistency', True)
+
+
 @pytest.fixture
 def book():
     return OrderBasedBook()
@@ -95,3 +103,170 @@ def test_side_ordering(book):
     assert bid.orders == 1
     assert bid.price == 5
     assert ask.price == 6
+
+
+def test_make_book_depth(book):
+    for i in range(10):
+        book.add_order(side=ASK, order_id=i, price=10 + i, qty=1)
+        book.add_order(side=BID, order_id=10 + i, price=9 - i, qty=1)
+
+    b = book.make_book(sequence=0, depth=3)
+    assert b.ask_depth == 3
+    assert b.bid_depth == 3
+    assert [lvl.price for lvl in b.asks] == [10, 11, 12]
+    assert [lvl.price for lvl in b.bids] == [9, 8, 7]
+
+
+def test_make_book_lazy(book):
+    book.add_order(side=ASK, order_id=1, price=7, qty=8)
+    book.add_order(side=ASK, order_id=2, price=6, qty=6)
+
+    b = book.make_book(sequence=0, depth=1, lazy=True)
+    assert not b.asks.materialised
+    assert b.best_ask.price == 6
+    assert b.asks.materialised
+    assert b.ask_depth == 1
+    assert b.bid_depth == 0
+
+
+def test_make_book_lazy_captures_at_publish(book):
+    book.add_order(side=ASK, order_id=1, price=6, qty=6)
+    book.add_order(side=BID, order_id=2, price=5, qty=2)
+    b = book.make_book(sequence=0, depth=2, lazy=True)
+
+    book.change_order(side=ASK, order_id=1, price=6, new_qty=1)
+    book.add_order(side=ASK, order_id=3, price=4, qty=9)
+    book.remove_order(side=BID, order_id=2, price=5)
+    assert [(lvl.price, lvl.qty, lvl.orders) for lvl in b.asks] == [(6, 6, 1)]
+    assert [(lvl.price, lvl.qty, lvl.orders) for lvl in b.bids] == [(5, 2, 1)]
+
+
+def test_level_running_qty():
+    level = OrderBasedLevel(price=5)
+    level.add_order(1, 4)
+    level.add_order(2, 6)
+    assert level.qty == 10
+
+    level.match_order(1, 3)
+    assert level.qty == 7
+
+    level.change_order(2, 2)
+    assert level.qty == 3
+
+    assert not level.remove_order(3)
+    level.remove_order(1)
+    assert level.qty == 2
+
+    level.match_order(2, 2)
+    assert level.qty == 0
+    assert level.empty
+
+
+def test_unknown_orders(book):
+    book.add_order(side=ASK, order_id=1, price=7, qty=8)
+
+    assert not book.remove_order(side=ASK, order_id=2, price=6)
+    assert not book.change_order(side=ASK, order_id=2, price=6, new_qty=1)
+    assert not book.match_order(side=ASK, order_id=2, price=6, trade_qty=1)
+    assert book.unknown_order_events == 3
+
+    # No phantom levels are created for unknown orders.
+    b = book.make_book(sequence=0)
+    assert b.ask_depth == 1
+    assert book.order_count == 1
+
+
+def test_order_index(book):
+    book.add_order(side=BID, order_id=1, price=4, qty=5)
+    assert book.has_order(1)
+
+    book.match_order(side=BID, order_id=1, price=4, trade_qty=5)
+    assert not book.has_order(1)
+    assert book.make_book(sequence=0).bid_depth == 0
+    assert book.unknown_order_events == 0
+
+
+def test_fixed_point_units():
+    units = FixedPoint(places=2)
+    book = OrderBasedBook(price_units=units, qty_units=units)
+    book.add_order(side=BID, order_id=1, price=units.to_units('4.25'),
+                   qty=units.to_units('1.5'))
+    book.add_order(side=BID, order_id=2, price=units.to_units('4.25'),
+                   qty=units.to_units('0.5'))
+
+    level = book.make_book(sequence=0).best_bid
+    assert level.price == Decimal('4.25')
+    assert level.qty == Decimal('2')
+    assert level.orders == 2
+
+
+def test_from_levels():
+    bids = [(5, [(1, 2), (2, 3)]), (4, [(3, 1)])]
+    asks = [(6, [(4, 1)]), (7, [(5, 2)]), (7, [(6, 2)])]
+    book = OrderBasedBook.from_levels(bids, asks)
+
+    b = book.make_book(sequence=0)
+    assert [lvl.price for lvl in b.bids] == [5, 4]
+    assert [lvl.price for lvl in b.asks] == [6, 7]
+    assert b.best_bid.qty == 5
+    assert b.asks[1].qty == 4
+    assert b.asks[1].orders == 2
+    assert book.order_count == 6
+
+    book.match_order(side=BID, order_id=2, price=5, trade_qty=3)
+    book.remove_order(side=ASK, order_id=4, price=6)
+    b = book.make_book(sequence=1)
+    assert b.best_bid.qty == 2
+    assert b.best_ask.price == 7
+
+    book.add_levels(BID, [(4, [(7, 1)]), (3, [(8, 1)])])
+    b = book.make_book(sequence=2)
+    assert [(lvl.price, lvl.qty) for lvl in b.bids] == [(5, 2), (4, 2), (3, 1)]
+    assert book.has_order(7)
+
+
+def test_add_levels_moves_resting_orders():
+    book = OrderBasedBook(track_levels=True)
+    book.add_order(side=BID, order_id=1, price=4, qty=5)
+    book.add_order(side=BID, order_id=2, price=3, qty=1)
+
+    # Order 1 moves to a new level, emptying its old one, then order 2 moves
+    # to the asks and back onto the emptied level.
+    book.add_levels(BID, [(5, [(1, 2)]), (3, [(3, 1)])])
+    book.add_levels(ASK, [(6, [(2, 4)])])
+    book.add_levels(BID, [(4, [(2, 1)])])
+    assert book.order_count == 3
+
+    b = book.make_book(sequence=0)
+    assert [(lvl.price, lvl.qty) for lvl in b.bids] == [(5, 2), (4, 1),
+                                                        (3, 1)]
+    assert [(lvl.price, lvl.qty) for lvl in b.asks] == []
+    assert book.price_level_book.make_book(sequence=0).bid_depth == 3
+
+    # Repeated ids within one call end up on the last level given.
+    book.add_levels(ASK, [(7, [(9, 1)]), (8, [(9, 2)]), (7, [(10, 1)])])
+    b = book.make_book(sequence=1)
+    assert [(lvl.price, lvl.qty) for lvl in b.asks] == [(7, 1), (8, 2)]
+
+    assert book.remove_order(side=BID, order_id=1, price=5)
+    assert book.remove_order(side=BID, order_id=2, price=4)
+    assert book.make_book(sequence=2).bid_depth == 1
+    assert book.unknown_order_events == 0
+
+
+def test_take_deltas():
+    book = OrderBasedBook(track_deltas=True)
+    assert book.take_deltas() == []
+    book.add_order(side=BID, order_id=1, price=5, qty=2)
+    book.add_order(side=BID, order_id=2, price=5, qty=1)
+    book.add_order(side=ASK, order_id=3, price=6, qty=4)
+    assert set(book.take_deltas()) == {
+        LevelDelta(BID, 5, 3, 2), LevelDelta(ASK, 6, 4, 1)}
+
+    book.remove_order(side=ASK, order_id=3, price=6)
+    assert book.take_deltas() == [LevelDelta(ASK, 6, 0, 0)]
+    assert book.take_deltas() == []
+
+    book.clear()
+    assert book.take_deltas() is None
+    assert OrderBasedBook().take_deltas() is None
@@ -0,0 +1,27 @@
+import decimal
+
+import pytest
+
+from convex.common.price import FixedPoint
+
+
+def test_to_units():
+    fp = FixedPoint(places=8)
+    assert fp.to_units('4000.12') == 400012000000
+    assert fp.to_units('0.01000000') == 1000000
+    assert fp.to_units('12') == 1200000000
+    assert fp.to_units('-0.5') == -50000000
+    assert fp.to_units(decimal.Decimal('1E-8')) == 1
+
+
+def test_to_units_too_precise():
+    fp = FixedPoint(places=2)
+    assert fp.to_units('1.2300') == 123
+    with pytest.raises(ValueError):
+        fp.to_units('1.234')
+
+
+def test_round_trip():
+    fp = FixedPoint(places=8)
+    for s in ('4000.12', '0.00000001', '12', '0.5'):
+        assert fp.to_decimal(fp.to_units(s)) == decimal.Decimal(s)
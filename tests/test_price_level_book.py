@@ -0,0 +1,60 @@
+import pytest
+
+from convex.market_data import OrderBasedBook, PriceLevelBook
+from convex.common import Side
+
+ASK, BID = Side.ASK, Side.BID
+
+
+@pytest.fixture
+def book():
+    return OrderBasedBook(track_levels=True)
+
+
+def test_set_level():
+    levels = PriceLevelBook()
+    levels.set_level(ASK, price=7, qty=3, orders=2)
+    levels.set_level(ASK, price=6, qty=1, orders=1)
+    levels.set_level(BID, price=5, qty=4, orders=1)
+
+    b = levels.make_book(sequence=3)
+    assert b.sequence == 3
+    assert [lvl.price for lvl in b.asks] == [6, 7]
+    assert b.best_bid.qty == 4
+
+    levels.set_level(ASK, price=6, qty=0, orders=0)
+    assert levels.ask_depth == 1
+    assert levels.get_level(ASK, 6) is None
+
+
+def test_tracks_order_book(book):
+    book.add_order(side=ASK, order_id=1, price=7, qty=8)
+    book.add_order(side=ASK, order_id=2, price=7, qty=2)
+    book.add_order(side=BID, order_id=3, price=5, qty=5)
+    levels = book.price_level_book
+
+    assert levels.get_level(ASK, 7) == (10, 2)
+
+    book.match_order(side=ASK, order_id=1, price=7, trade_qty=3)
+    assert levels.get_level(ASK, 7) == (7, 2)
+
+    book.change_order(side=ASK, order_id=2, price=7, new_qty=1)
+    assert levels.get_level(ASK, 7) == (6, 2)
+
+    book.remove_order(side=BID, order_id=3, price=5)
+    assert levels.bid_depth == 0
+
+    b = book.make_aggregated_book(sequence=0)
+    assert b.best_ask.qty == 6
+    assert b.best_ask.orders == 2
+
+
+def test_aggregated_book_without_tracking():
+    book = OrderBasedBook()
+    book.add_order(side=BID, order_id=1, price=5, qty=5)
+    book.add_order(side=BID, order_id=2, price=4, qty=1)
+    assert book.price_level_book is None
+
+    b = book.make_aggregated_book(sequence=0, depth=1)
+    assert b.bid_depth == 1
+    assert b.best_bid.qty == 5
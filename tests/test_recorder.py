@@ -0,0 +1,182 @@
+import asyncio
+import datetime as dt
+from decimal import Decimal
+import json
+import os
+
+import pytest
+
+from convex.common.instrument import make_btc_usd, make_eth_usd
+from convex.exchanges import ExchangeID, gdax
+from convex.market_data import (Book, Gateway, Level, OrderBasedBook,
+                                Playback, Update)
+from convex.market_data.capture import FRAME, CaptureReader
+from convex.market_data.codec import encode_update
+from convex.market_data.recording_index import load_index
+from convex.market_data.shm_bus import ShmWriter
+from services.recorder import InstrumentRecorder, Recorder
+
+BTC = make_btc_usd(ExchangeID.GDAX)
+ETH = make_eth_usd(ExchangeID.GDAX)
+TIME = dt.datetime(2017, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def _loop_arguments_supported():
+    try:
+        asyncio.Queue(loop=None)
+    except TypeError:
+        return False
+    return True
+
+
+# The recorder passes ``loop`` to asyncio, which Python 3.10 no longer
+# accepts.
+pytestmark = pytest.mark.skipif(not _loop_arguments_supported(),
+                                reason='asyncio loop arguments unsupported')
+
+
+class DummyGateway(Gateway):
+    def subscribe(self, instrument):
+        pass
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_recorder(gateway, tmpdir, instrument=BTC, **kwargs):
+    kwargs.setdefault('fmt', 'json')
+    return InstrumentRecorder(instrument, gateway, depth=5,
+                              output_dir=str(tmpdir), interval=0.001,
+                              maxfilesize=1024 * 1024, loop=gateway.loop,
+                              **kwargs)
+
+
+def run_briefly(loop, *coros):
+    """Run coros for a moment, then cancel them and wait for cleanup."""
+    tasks = [asyncio.ensure_future(coro, loop=loop) for coro in coros]
+    loop.run_until_complete(asyncio.sleep(0.05, loop=loop))
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, loop=loop,
+                                           return_exceptions=True))
+
+
+def test_cleanup_cancels_timers(tmpdir, loop):
+    recorder = make_recorder(DummyGateway(loop=loop), tmpdir,
+                             flush_interval=0.001)
+    run_briefly(loop, recorder.run())
+    assert recorder._watch_handle.cancelled()
+    assert recorder._flush_handle.cancelled()
+    assert recorder._writer.closed
+
+
+def test_cleanup_joins_rolled_over_writers(tmpdir, loop):
+    recorder = make_recorder(DummyGateway(loop=loop), tmpdir)
+    writers = [recorder._writer]
+    for _ in range(2):
+        recorder._rollover_file()
+        writers.append(recorder._writer)
+    run_briefly(loop, recorder.run())
+    assert all(writer.closed and not writer._thread.is_alive()
+               for writer in writers)
+    assert recorder._retired_writers == []
+
+
+def make_update(instrument, sequence):
+    book = Book(sequence, [Level(Decimal('100.00'), Decimal('1.0'), 1)],
+                [Level(Decimal('101.00'), Decimal('2.0'), 1)])
+    return Update(instrument, book, timestamp=TIME)
+
+
+def recorded(tmpdir, fmt):
+    """Return {instrument name: path} of recordings in tmpdir."""
+    paths = {}
+    for name in os.listdir(str(tmpdir)):
+        if name.endswith('.' + fmt):
+            paths[name.split('_')[2].rsplit('.', 1)[0]] = os.path.join(
+                    str(tmpdir), name)
+    return paths
+
+
+def test_shared_gateway_writes_separate_files(tmpdir, loop):
+    bus = str(tmpdir.join('bus'))
+    ring = ShmWriter(bus, slots=64, slot_size=1024)
+    out = tmpdir.mkdir('out')
+    recorder = Recorder([BTC, ETH], bus_path=bus, loop=loop, fmt='json',
+                        compression='none', depth=5, output_dir=str(out),
+                        interval=0.001, maxfilesize=1024 * 1024)
+
+    async def publish():
+        await asyncio.sleep(0.01, loop=loop)  # Reader starts at launch.
+        for sequence in range(1, 4):
+            ring.write(encode_update(make_update(BTC, sequence)))
+            ring.write(encode_update(make_update(ETH, sequence + 100)))
+            await asyncio.sleep(0.005, loop=loop)
+
+    try:
+        run_briefly(loop, recorder.run(), publish())
+    finally:
+        ring.close()
+
+    paths = recorded(out, 'json')
+    assert sorted(paths) == sorted([str(BTC), str(ETH)])
+    for instrument, first in ((BTC, 1), (ETH, 101)):
+        sequences = [update['book']['sequence']
+                     for update in Playback(paths[str(instrument)])]
+        assert sequences[-1] == first + 2
+        assert set(sequences) <= set(range(first, first + 3))
+
+
+def test_l3_captures_per_instrument(tmpdir, loop):
+    gateway = gdax.MDGateway(loop=loop)
+    recorders = [make_recorder(gateway, tmpdir, instrument, fmt='l3',
+                               compression='none')
+                 for instrument in (BTC, ETH)]
+
+    def frame(product_id, sequence):
+        return json.dumps({'type': 'received', 'sequence': sequence,
+                           'product_id': product_id})
+
+    async def receive():
+        await asyncio.sleep(0, loop=loop)
+        for sequence in range(1, 3):
+            gateway._capture_frame(frame('BTC-USD', sequence))
+            gateway._capture_frame(frame('ETH-USD', sequence + 100))
+
+    run_briefly(loop, receive(), *(recorder.run() for recorder in recorders))
+    loop.run_until_complete(gateway.close())
+
+    paths = recorded(tmpdir, 'l3')
+    assert sorted(paths) == sorted([str(BTC), str(ETH)])
+    for instrument, product_id, first in ((BTC, 'BTC-USD', 1),
+                                          (ETH, 'ETH-USD', 101)):
+        with CaptureReader(paths[str(instrument)]) as reader:
+            records = [(record.kind, json.loads(record.data))
+                       for record in reader]
+        assert [(kind, data['product_id'], data['sequence'])
+                for kind, data in records] == [
+            (FRAME, product_id, first), (FRAME, product_id, first + 1)]
+
+
+def test_msgpack_recording_indexed_on_close(tmpdir, loop):
+    gateway = DummyGateway(loop=loop)
+    recorder = make_recorder(gateway, tmpdir, fmt='msgpack',
+                             compression='none')
+
+    async def publish():
+        for sequence in range(1, 4):
+            gateway.set_book(BTC, sequence, OrderBasedBook())
+            gateway.publish()
+            await asyncio.sleep(0.005, loop=loop)
+
+    run_briefly(loop, recorder.run(), publish())
+    loop.run_until_complete(gateway.close())
+
+    path = recorded(tmpdir, 'mp')[str(BTC)]
+    assert load_index(path) is not None
+    assert [update['book']['sequence']
+            for update in Playback(path)][-1] == 3
@@ -0,0 +1,144 @@
+import datetime as dt
+import json
+
+import msgpack
+import pytest
+
+from convex.common.utils.compression import CompressedWriter
+from convex.market_data import Playback
+from convex.market_data import recording_index
+from convex.market_data.recording_index import build_index, load_index
+
+START = dt.datetime(2017, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def make_update(sequence):
+    time = START + dt.timedelta(seconds=sequence)
+    return {'timestamp': str(time), 'book': {'sequence': sequence}}
+
+
+def write_json(file, sequences):
+    for sequence in sequences:
+        file.write((json.dumps(make_update(sequence)) + '\n').encode())
+
+
+def write_msgpack(file, sequences):
+    for sequence in sequences:
+        file.write(msgpack.packb(make_update(sequence)))
+
+
+@pytest.fixture
+def plain(tmpdir):
+    path = str(tmpdir.join('rec.json'))
+    with open(path, 'wb') as f:
+        write_json(f, range(100))
+    return path
+
+
+@pytest.fixture
+def gzipped(tmpdir):
+    path = str(tmpdir.join('rec.json.gz'))
+    with CompressedWriter(path, 'gzip') as writer:
+        for first in range(0, 100, 10):
+            write_json(writer, range(first, first + 10))
+            writer.flush()  # One gzip member per 10 updates.
+    return path
+
+
+@pytest.fixture
+def packed(tmpdir):
+    path = str(tmpdir.join('rec.mp'))
+    with open(path, 'wb') as f:
+        write_msgpack(f, range(100))
+    return path
+
+
+@pytest.fixture
+def packed_gzipped(tmpdir):
+    path = str(tmpdir.join('rec.mp.gz'))
+    with CompressedWriter(path, 'gzip') as writer:
+        for first in range(0, 100, 10):
+            write_msgpack(writer, range(first, first + 10))
+            writer.flush()
+    return path
+
+
+def sequences(playback):
+    return [update['book']['sequence'] for update in playback]
+
+
+def test_parse_timestamp():
+    time = dt.datetime(2017, 3, 4, 5, 6, 7, 123000, tzinfo=dt.timezone.utc)
+    assert recording_index.parse_timestamp(str(time)) == time.timestamp()
+    later = time.astimezone(dt.timezone(dt.timedelta(hours=2)))
+    assert recording_index.parse_timestamp(str(later)) == time.timestamp()
+    assert recording_index.parse_timestamp('None') is None
+
+
+def test_index_plain_json(plain):
+    assert build_index(plain, 'json', spacing=1000) > 1
+    entries = load_index(plain)
+    assert entries[0][0] == 0
+    with open(plain, 'rb') as f:
+        for offset, time, sequence in entries:
+            f.seek(offset)
+            update = json.loads(f.readline())
+            assert update['book']['sequence'] == sequence
+            assert recording_index.update_keys(update)[0] == time
+
+
+@pytest.mark.parametrize('fixture,fmt', [('gzipped', 'json'),
+                                         ('packed_gzipped', 'msgpack')])
+def test_index_gzip_members(request, fixture, fmt):
+    path = request.getfixturevalue(fixture)
+    assert build_index(path, fmt) == 10
+    assert [entry[2] for entry in load_index(path)] == list(
+        range(0, 100, 10))
+
+
+def test_index_plain_msgpack(packed):
+    assert build_index(packed, 'msgpack') == 1
+    (offset, time, sequence), = load_index(packed)
+    assert (offset, sequence) == (0, 0)
+    assert time == START.timestamp()
+
+
+@pytest.mark.parametrize('fixture,fmt', [('plain', 'json'),
+                                         ('gzipped', 'json'),
+                                         ('packed', 'msgpack'),
+                                         ('packed_gzipped', 'msgpack')])
+def test_seek_by_sequence(request, fixture, fmt):
+    path = request.getfixturevalue(fixture)
+    build_index(path, fmt, spacing=500)
+    assert sequences(Playback(path, start=42, end=57)) == list(range(42, 57))
+    assert sequences(Playback(path, start=95)) == list(range(95, 100))
+    assert sequences(Playback(path, end=3)) == [0, 1, 2]
+
+
+@pytest.mark.parametrize('fixture,fmt', [('plain', 'json'),
+                                         ('gzipped', 'json'),
+                                         ('packed', 'msgpack'),
+                                         ('packed_gzipped', 'msgpack')])
+def test_seek_by_time(request, fixture, fmt):
+    path = request.getfixturevalue(fixture)
+    build_index(path, fmt, spacing=500)
+    start = START + dt.timedelta(seconds=30.5)
+    end = (START + dt.timedelta(seconds=33)).replace(tzinfo=None)  # UTC
+    assert sequences(Playback(path, start=start, end=end)) == [31, 32]
+
+
+def test_seek_without_index(plain):
+    assert sequences(Playback(plain, start=98)) == [98, 99]
+
+
+def test_stale_index_ignored(plain):
+    build_index(plain, 'json', spacing=500)
+    with open(plain, 'wb') as f:
+        write_json(f, range(10))
+    assert load_index(plain) is None
+    assert sequences(Playback(plain, start=5)) == list(range(5, 10))
+
+
+def test_mixed_bounds(plain):
+    with pytest.raises(ValueError):
+        Playback(plain, start=START, end=10)
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from convex.common import Side
+from convex.market_data import Book, LevelDelta, Update, UpdateRing
+
+
+def make_update(sequence, trades=None):
+    return Update(instrument='BTCUSD@GDAX',
+                  book=Book(sequence, [], []),
+                  trades=trades)
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        UpdateRing(backpressure='unknown')
+
+
+def test_push_and_drain():
+    ring = UpdateRing(maxlen=4)
+    assert ring.push('a', make_update(1))
+    assert not ring.push('a', make_update(2))
+
+    entries = ring.drain()
+    assert [u.sequence for _, _, u in entries] == [1, 2]
+    assert len(ring) == 0
+    assert ring.push('a', make_update(3))
+
+
+def test_latest_carries_trades():
+    ring = UpdateRing(maxlen=2, backpressure='latest')
+    ring.push('a', make_update(1, trades=['t1']))
+    ring.push('b', make_update(2))
+    ring.push('b', make_update(3))  # Drops update 1
+    ring.push('a', make_update(4, trades=['t4']))  # Drops update 2
+
+    assert ring.dropped == 2
+    updates = [u for _, _, u in ring.drain()]
+    assert [u.sequence for u in updates] == [3, 4]
+    assert updates[-1].trades == ['t1', 't4']
+
+
+def test_block_waits_for_drain():
+    ring = UpdateRing(maxlen=1, backpressure='block')
+    ring.push('a', make_update(1))
+
+    pushed = threading.Event()
+
+    def produce():
+        ring.push('a', make_update(2))
+        pushed.set()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    assert not pushed.wait(0.05)
+
+    assert [u.sequence for _, _, u in ring.drain()] == [1]
+    assert pushed.wait(1)
+    producer.join()
+    assert ring.dropped == 0
+
+
+def test_dropped_deltas_carried_over():
+    ring = UpdateRing(maxlen=1)
+    ring.push('a', Update(instrument='a', book=Book(1, [], []),
+                          deltas=[LevelDelta(Side.BID, 5, 1, 1)]))
+    ring.push('a', Update(instrument='a', book=Book(2, [], []),
+                          deltas=[LevelDelta(Side.BID, 5, 0, 0),
+                                  LevelDelta(Side.ASK, 6, 1, 1)]))
+    (_, _, update), = ring.drain()
+    assert update.sequence == 2
+    assert update.deltas == [LevelDelta(Side.BID, 5, 0, 0),
+                             LevelDelta(Side.ASK, 6, 1, 1)]
+
+
+def test_drain_flushes_carried_updates():
+    ring = UpdateRing(maxlen=1)
+    ring.push('a', make_update(1, trades=['t1']))
+    ring.push('b', make_update(2))  # Drops update 1, 'a' is not pushed again
+
+    updates = [(key, u.sequence, u.trades) for key, _, u in ring.drain()]
+    assert updates == [('a', 1, ['t1']), ('b', 2, [])]
+    assert ring.drain() == []
@@ -0,0 +1,116 @@
+import asyncio
+import datetime as dt
+from decimal import Decimal
+
+from convex.common import Side
+from convex.market_data import Book, Level, LevelDelta, Trade, Update
+from convex.market_data.codec import decode_update, encode_update
+from convex.market_data.shm_bus import ShmPublisher, ShmReader, ShmWriter
+
+TIME = dt.datetime(2017, 9, 21, 23, 22, 10, tzinfo=dt.timezone.utc)
+
+
+class StubGateway:
+    def register(self, instrument, on_update, aggregated=False):
+        self.on_update = on_update
+
+
+def make_update(trades, deltas=None):
+    book = Book(7, [Level(Decimal('100.01'), Decimal('1.5'), 2)],
+                [Level(Decimal('100.02'), Decimal('0.25'), 1)])
+    trades = [Trade(Side.BID, Decimal('100.02'), Decimal('0.1'), i,
+                    'maker', 'taker', TIME) for i in range(trades)]
+    return Update('BTCUSD@GDAX', book, trades=trades, timestamp=TIME,
+                  deltas=deltas)
+
+
+def publish(path, update, slot_size):
+    """Publish update through a ShmPublisher, return decoded entries."""
+    gateway = StubGateway()
+    writer = ShmWriter(path, slots=16, slot_size=slot_size)
+    reader = ShmReader(path)
+    publisher = ShmPublisher(gateway, ['BTCUSD@GDAX'], writer)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(gateway.on_update(update))
+    finally:
+        loop.close()
+    updates = [decode_update(payload) for payload in reader.read()]
+    writer.close()
+    reader.close()
+    return publisher, updates
+
+
+def slot_for(update):
+    """Return slot size just fitting update."""
+    return len(encode_update(update, depth=10)) + 12
+
+
+def test_ring_read_and_lap(tmpdir):
+    path = str(tmpdir.join('bus'))
+    writer = ShmWriter(path, slots=4, slot_size=256)
+    reader = ShmReader(path)
+    writer.write(b'a')
+    writer.write(b'b')
+    assert reader.read() == [b'a', b'b']
+    assert reader.read() == []
+
+    for i in range(6):
+        writer.write(str(i).encode())
+    assert reader.read() == [b'2', b'3', b'4', b'5']
+    assert reader.lost == 2
+
+    # A restarted writer resumes after the last entry.
+    writer.close()
+    writer = ShmWriter(path, slots=4, slot_size=256)
+    writer.write(b'c')
+    assert reader.read() == [b'c']
+    writer.close()
+    reader.close()
+
+
+def test_publish_splits_oversize_trades(tmpdir):
+    deltas = [LevelDelta(Side.BID, Decimal('100.01'), Decimal('1.5'), 2)]
+    update = make_update(10, deltas)
+    publisher, updates = publish(str(tmpdir.join('bus')), update,
+                                 slot_for(make_update(3, deltas)))
+    assert publisher.split_updates == 1
+    assert publisher.dropped_trades == 0
+    assert all(part.sequence == 7 for part in updates)
+    assert [trade for part in updates for trade in part.trades] == \
+        update.trades
+    assert updates[0].deltas == deltas
+    assert all(part.deltas == [] for part in updates[1:])
+
+
+def test_publish_oversize_book(tmpdir):
+    deltas = [LevelDelta(Side.BID, Decimal('100.01'), Decimal('1.5'), 2)]
+    path = str(tmpdir.join('bus'))
+
+    # Deltas that do not fit are published as unavailable, trades that do
+    # not fit next to the book are dropped.
+    publisher, updates = publish(path, make_update(2, deltas),
+                                 slot_for(make_update(0)))
+    assert [(part.sequence, part.trades, part.deltas)
+            for part in updates] == [(7, [], None)]
+    assert publisher.dropped_trades == 2
+    assert publisher.dropped_updates == 0
+
+    # Deltas are sent in a part of their own if need be.
+    publisher, updates = publish(path, make_update(1, deltas),
+                                 slot_for(make_update(1)))
+    assert [(len(part.trades), part.deltas) for part in updates] == [
+        (0, deltas), (1, [])]
+
+    # Trades not fitting after the deltas part are dropped.
+    publisher, updates = publish(path, make_update(1, deltas),
+                                 slot_for(make_update(0, deltas)))
+    assert [(len(part.trades), part.deltas) for part in updates] == [
+        (0, deltas)]
+    assert publisher.dropped_trades == 1
+
+    publisher, updates = publish(path, make_update(2),
+                                 slot_for(make_update(0)) - 1)
+    assert updates == []
+    assert publisher.dropped_updates == 1
+    assert publisher.dropped_trades == 2
@@ -0,0 +1,50 @@
+import asyncio
+from decimal import Decimal
+
+from convex.common.instrument import make_btc_usd, make_eth_usd
+from convex.exchanges import ExchangeID
+from convex.market_data import Book, Level, Status, Update
+from convex.market_data.socket_bus import SocketGateway, SocketPublisher
+
+BTC = make_btc_usd(ExchangeID.GDAX)
+ETH = make_eth_usd(ExchangeID.GDAX)
+
+
+def make_update(instrument, sequence):
+    book = Book(sequence, [Level(Decimal('10.5'), Decimal('1'), 1)], [])
+    return Update(instrument, book, status=Status.OK)
+
+
+def test_publish_to_client(tmpdir):
+    path = str(tmpdir.join('md.sock'))
+    loop = asyncio.new_event_loop()
+    publisher = SocketPublisher(loop)
+    gateway = SocketGateway(path, loop)
+    received = []
+
+    async def on_update(update):
+        received.append((update.instrument, update.sequence))
+
+    gateway.register(BTC, on_update)
+
+    async def scenario():
+        await publisher.start(path)
+        task = loop.create_task(gateway.launch())
+        while not publisher.clients:
+            await asyncio.sleep(0.001)
+        for sequence in range(1, 4):
+            publisher.publish(make_update(BTC, sequence))
+            publisher.publish(make_update(ETH, sequence))
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+        gateway.unregister(BTC, on_update)
+        publisher.close()
+        await asyncio.sleep(0)
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert received == [(BTC, 1), (BTC, 2), (BTC, 3)]
+    assert gateway.missed == 0
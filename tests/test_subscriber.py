@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+
+from convex.common import Side
+from convex.market_data import Book, LevelDelta, OrderBasedBook, Update
+from convex.market_data.subscriber import Subscriber
+
+BTC = 'BTCUSD@GDAX'
+
+
+def _loop_arguments_supported():
+    try:
+        asyncio.Queue(loop=None)
+    except TypeError:
+        return False
+    return True
+
+
+# Subscriber passes ``loop`` to asyncio, which Python 3.10 no longer accepts.
+pytestmark = pytest.mark.skipif(not _loop_arguments_supported(),
+                                reason='asyncio loop arguments unsupported')
+
+
+class StubGateway:
+    def __init__(self, loop):
+        self.loop = loop
+        self.registered = []
+
+    def register(self, instrument, on_update, aggregated=False):
+        self.registered.append((instrument, aggregated))
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_update(sequence, trades=(), deltas=None):
+    return Update(instrument=BTC, book=Book(sequence, [], []),
+                  trades=list(trades), deltas=deltas)
+
+
+def feed(loop, subscriber, *updates):
+    for update in updates:
+        loop.run_until_complete(subscriber._on_update(update))
+
+
+def fetch_all(subscriber):
+    fetched = []
+    while subscriber.has_update():
+        update = subscriber.fetch_nowait()
+        fetched.append((update.sequence, update.trades))
+    return fetched
+
+
+def test_unknown_policy(loop):
+    with pytest.raises(ValueError):
+        Subscriber(BTC, StubGateway(loop), policy='newest')
+
+
+def test_latest_carries_trades_and_deltas(loop):
+    gateway = StubGateway(loop)
+    subscriber = Subscriber(BTC, gateway, aggregated=True)
+    assert gateway.registered == [(BTC, True)]
+    bid, ask = LevelDelta(Side.BID, 5, 1, 1), LevelDelta(Side.ASK, 6, 2, 1)
+    feed(loop, subscriber,
+         make_update(1, ['t1'], [bid]),
+         make_update(2, ['t2'], [ask]),
+         make_update(3, [], []))
+
+    update = subscriber.fetch_nowait()
+    assert (update.sequence, update.trades) == (3, ['t1', 't2'])
+    assert update.deltas == [bid, ask]
+    assert not subscriber.has_update()
+    with pytest.raises(RuntimeError):
+        subscriber.fetch_nowait()
+
+    # Missing deltas in between make the next fetch unavailable too.
+    feed(loop, subscriber, make_update(4, deltas=None),
+         make_update(5, deltas=[bid]))
+    assert subscriber.fetch_nowait().deltas is None
+
+
+def test_latest_caps_cached_trades(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), max_cached_trades=3)
+    feed(loop, subscriber,
+         make_update(1, ['t1', 't2']),
+         make_update(2, ['t3', 't4', 't5']))
+    assert fetch_all(subscriber) == [(2, ['t3', 't4', 't5'])]
+    assert subscriber.trades_overflow == 2
+
+    feed(loop, subscriber, make_update(3, ['t6']))
+    assert fetch_all(subscriber) == [(3, ['t6'])]
+    assert subscriber.trades_overflow == 2
+
+
+def test_out_of_order_updates_ignored(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop))
+    feed(loop, subscriber, make_update(2, ['t2']), make_update(1, ['t1']))
+    assert fetch_all(subscriber) == [(2, ['t2'])]
+
+
+def test_every_returns_updates_in_order(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every')
+    feed(loop, subscriber, *(make_update(seq, ['t{}'.format(seq)])
+                             for seq in range(1, 4)))
+    assert fetch_all(subscriber) == [(1, ['t1']), (2, ['t2']), (3, ['t3'])]
+    assert subscriber.dropped == 0
+
+
+def test_every_copies_order_based_levels(loop):
+    book = OrderBasedBook()
+    book.add_order(side=Side.BID, order_id=1, price=5, qty=2)
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every')
+    feed(loop, subscriber, Update(instrument=BTC, book=book.make_book(1)))
+
+    book.change_order(side=Side.BID, order_id=1, price=5, new_qty=1)
+    book.add_order(side=Side.BID, order_id=2, price=5, qty=4)
+    bids = subscriber.fetch_nowait().book.bids
+    assert [(lvl.price, lvl.qty, lvl.orders) for lvl in bids] == [(5, 2, 1)]
+
+
+def test_every_conflates_oldest_when_ring_full(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every',
+                            ring_size=2)
+    feed(loop, subscriber, *(make_update(seq, ['t{}'.format(seq)])
+                             for seq in range(1, 5)))
+    assert subscriber.dropped == 2
+    assert fetch_all(subscriber) == [(3, ['t1', 't2', 't3']), (4, ['t4'])]
+
+    # A ring of one conflates into the incoming update.
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every',
+                            ring_size=1)
+    feed(loop, subscriber, make_update(1, ['t1']), make_update(2, ['t2']))
+    assert subscriber.dropped == 1
+    assert fetch_all(subscriber) == [(2, ['t1', 't2'])]
+
+
+def test_every_caps_conflated_trades(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every',
+                            ring_size=1, max_cached_trades=2)
+    feed(loop, subscriber, make_update(1, ['t1', 't2']),
+         make_update(2, ['t3']))
+    assert fetch_all(subscriber) == [(2, ['t2', 't3'])]
+    assert subscriber.trades_overflow == 1
+
+
+def test_fetch_waits_for_update(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='every')
+
+    async def scenario():
+        task = asyncio.ensure_future(subscriber.fetch(), loop=loop)
+        await asyncio.sleep(0, loop=loop)
+        assert not task.done()
+        await subscriber._on_update(make_update(1))
+        return await task
+
+    assert loop.run_until_complete(scenario()).sequence == 1
+
+
+def test_sampled_releases_once_per_interval(loop):
+    subscriber = Subscriber(BTC, StubGateway(loop), policy='sampled',
+                            sample_interval=0.05)
+
+    async def scenario():
+        # The first update is released at once, starting the interval.
+        await subscriber._on_update(make_update(1, ['t1']))
+        first = subscriber.fetch_nowait()
+        await subscriber._on_update(make_update(2, ['t2']))
+        await subscriber._on_update(make_update(3, ['t3']))
+        held = subscriber.has_update()
+        second = await asyncio.wait_for(subscriber.fetch(), 1, loop=loop)
+        return first, held, second
+
+    start = loop.time()
+    first, held, second = loop.run_until_complete(scenario())
+    assert (first.sequence, first.trades) == (1, ['t1'])
+    assert not held
+    assert (second.sequence, second.trades) == (3, ['t2', 't3'])
+    # Timers may fire up to the loop's clock resolution early.
+    assert loop.time() - start >= 0.049
+    assert subscriber._sample_handle is None